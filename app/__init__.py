@@ -1,9 +1,10 @@
-from flask import Flask, send_from_directory, session, redirect, url_for
+from flask import Flask, session, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
 import os
+from app.database import RoutingSession
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 def create_app(config_class='config.Config'):
@@ -12,29 +13,37 @@ def create_app(config_class='config.Config'):
 
     db.init_app(app)
 
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    os.makedirs(app.config['GENERATED_DOCS_FOLDER'], exist_ok=True)
     os.makedirs(os.path.join(app.static_folder, 'uploads'), exist_ok=True)
 
-    from app import auth, crew, admin
+    from app import (assets, auth, compression, conflicts, crew, admin, counters, database, photo_ingest,
+                     storage)
+
+    database.init_app(app)
+    storage.init_app(app)
+    photo_ingest.init_app(app)
+    assets.init_app(app)
+    compression.init_app(app)
+    conflicts.init_app(app)
 
     app.register_blueprint(auth.bp)
     app.register_blueprint(crew.bp)
     app.register_blueprint(admin.bp)
 
     # Shared upload endpoint for both admin and crew
-    @app.route('/uploads/<filename>')
+    @app.route('/uploads/<path:filename>')
     def serve_upload(filename):
         """Serve uploaded photos (accessible to both admin and crew).
         
-        Note: Photos are protected by UUID filenames (not guessable).
+        Note: Photos are protected by content-hash filenames (not guessable).
         The real security is at the work item level - users must be 
         authenticated to view work items, but once they can see a work
         item, the photos should load without authentication issues.
         """
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        return storage.get_upload_storage().send(filename)
 
     with app.app_context():
         db.create_all()
 
+    counters.init_app(app)
+
     return app
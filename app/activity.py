@@ -0,0 +1,93 @@
+"""Paged comment and status-history feeds for the item views.
+
+The item pages show the newest ITEM_ACTIVITY_PAGE_SIZE entries of each feed
+and fetch older ones on demand ("Load more") from a JSON endpoint, instead
+of loading the whole ``comments`` / ``history`` relationship. Pages are
+keyset-paginated on (timestamp, id): each page is a range scan of the
+(work_item_id, timestamp) index, so the cost of a page does not grow with
+the item's age. The cursor is the last entry's ``<timestamp>_<id>``.
+"""
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models import Comment, StatusHistory
+from app.utils import format_datetime
+
+
+FEEDS = {
+    'comments': (Comment, Comment.created_at),
+    'history': (StatusHistory, StatusHistory.changed_at),
+}
+
+
+def _make_cursor(timestamp, entry_id):
+    return f'{timestamp.isoformat()}_{entry_id}'
+
+
+def _parse_cursor(cursor):
+    timestamp, _, entry_id = cursor.rpartition('_')
+    return datetime.fromisoformat(timestamp), int(entry_id)
+
+
+def get_page(item_id, feed, before=None, limit=None):
+    """Return ``(entries, next_cursor)`` for a feed, newest first.
+
+    ``before`` is the cursor returned with the previous page; next_cursor
+    is None on the last page. Raises ValueError for a malformed cursor.
+    """
+    model, timestamp = FEEDS[feed]
+    limit = limit or current_app.config['ITEM_ACTIVITY_PAGE_SIZE']
+
+    query = db.select(model).where(model.work_item_id == item_id)
+    if before:
+        before_timestamp, before_id = _parse_cursor(before)
+        query = query.where(db.or_(
+            timestamp < before_timestamp,
+            db.and_(timestamp == before_timestamp, model.id < before_id)
+        ))
+
+    # One extra row tells whether another page exists
+    entries = db.session.execute(
+        query.order_by(timestamp.desc(), model.id.desc()).limit(limit + 1)
+    ).scalars().all()
+
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        last = entries[-1]
+        last_timestamp = getattr(last, timestamp.key)
+        if last_timestamp is not None:
+            next_cursor = _make_cursor(last_timestamp, last.id)
+    return entries, next_cursor
+
+
+def get_activity(item_id):
+    """First page of every feed, keyed by feed name."""
+    return {feed: get_page(item_id, feed) for feed in FEEDS}
+
+
+def entry_to_dict(feed, entry):
+    """JSON form of a feed entry, as rendered by the "Load more" script."""
+    if feed == 'comments':
+        return {
+            'id': entry.id,
+            'author': entry.author_name,
+            'text': entry.comment_text,
+            'is_admin': bool(entry.is_admin),
+            'at': format_datetime(entry.created_at),
+        }
+    return {
+        'id': entry.id,
+        'old_status': entry.old_status,
+        'new_status': entry.new_status,
+        'author': entry.changed_by,
+        'text': entry.notes,
+        'at': format_datetime(entry.changed_at),
+    }
+
+
+def page_to_json(feed, entries, next_cursor):
+    return {
+        'entries': [entry_to_dict(feed, entry) for entry in entries],
+        'next': next_cursor,
+    }
@@ -1,13 +1,23 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file, send_from_directory, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, current_app, \
+    Response, abort, stream_with_context
 from app import db
-from app.models import WorkItem, StatusHistory, Comment
-from app.docx_generator import generate_docx, generate_multiple_docx
-from app.utils import format_datetime, allowed_file, generate_unique_filename, resize_image
+from app.models import WorkItem, Photo, StatusHistory, Comment, ExportJob
+from app.activity import FEEDS, get_activity, get_page, page_to_json
+from app.conflicts import CONFLICT_ERRORS, check_version, conflict_response
+from app.counters import get_summary
+from app.data_export import FORMATS, STREAMED_FORMATS, export_filename, stream_export
+from app.database import use_replica
+from app.export_jobs import enqueue_export
+from app.importer import IMPORT_COLUMNS, REQUIRED_COLUMNS, ImportFileError, import_items
+from app.reports import DEFAULT_WEEKS, get_reports
+from app.blob_store import release_blob
+from app.photo_index import MAX_DUPLICATE_GROUPS, find_duplicate_groups
+from app.photo_ingest import collect_photo_uploads, ingest_photos
+from app.storage import get_docs_storage, get_upload_storage
+from app.utils import format_datetime, stream_page
 from app.notifications import send_assignment_notification
 from datetime import datetime
 import os
-import zipfile
-from io import BytesIO
 
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -24,11 +34,81 @@ def admin_required(f):
     return decorated_function
 
 
-@bp.route('/uploads/<filename>')
+# Work item fields on the admin item form (edit, assign and save-notes all post them)
+ITEM_FORM_FIELDS = ('item_number', 'location', 'description', 'detail', 'references')
+
+
+def _form_values(names):
+    """The submitted values of the given form fields, skipping absent ones."""
+    return {name: request.form[name] for name in names if name in request.form}
+
+
+def _set_changed(obj, values):
+    """Assign the values that differ from the object's; return the names changed.
+
+    None and '' count as equal, so resubmitting an unchanged form (where an
+    empty input posts '') writes nothing.
+    """
+    changed = []
+    for name, value in values.items():
+        current = getattr(obj, name)
+        if current != value and not (current in (None, '') and value in (None, '')):
+            setattr(obj, name, value)
+            changed.append(name)
+    return changed
+
+
+def _update_photo_captions(work_item_id, photo_ids, captions):
+    """Write the captions that changed with one UPDATE; return how many.
+
+    The current captions are read in one query and the changed ones set in
+    a single ``UPDATE ... SET caption = CASE id ...``, instead of loading
+    each Photo separately. Ids of other items' photos are ignored.
+    """
+    submitted = {int(photo_id): caption for photo_id, caption in zip(photo_ids, captions)}
+    if not submitted:
+        return 0
+
+    current = dict(db.session.execute(
+        db.select(Photo.id, Photo.caption)
+        .where(Photo.work_item_id == work_item_id, Photo.id.in_(submitted))
+    ).all())
+    changed = {photo_id: caption for photo_id, caption in submitted.items()
+               if photo_id in current and current[photo_id] != caption}
+    if changed:
+        db.session.execute(
+            db.update(Photo)
+            .where(Photo.id.in_(changed))
+            .values(caption=db.case(changed, value=Photo.id)),
+            execution_options={'synchronize_session': False}
+        )
+    return len(changed)
+
+
+def _save_item_form(work_item):
+    """Apply the item fields, photo captions and new photos from the form.
+
+    Returns True if anything changed.
+    """
+    # Photos first: their queries would autoflush item changes made before
+    # them, costing a second versioned UPDATE of the work item
+    captions_changed = _update_photo_captions(work_item.id,
+                                              request.form.getlist('photo_ids[]'),
+                                              request.form.getlist('photo_captions[]'))
+
+    uploads = collect_photo_uploads(request.files.getlist('new_photos[]'),
+                                    request.form.getlist('new_photo_captions[]'))
+    ingest_photos(work_item.id, uploads)
+
+    changed = _set_changed(work_item, _form_values(ITEM_FORM_FIELDS))
+    return bool(changed or captions_changed or uploads)
+
+
+@bp.route('/uploads/<path:filename>')
 @admin_required
 def serve_upload(filename):
     """Serve uploaded photos."""
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+    return get_upload_storage().send(filename)
 
 
 @bp.route('/download-photo/<int:item_id>/<int:photo_id>')
@@ -43,11 +123,10 @@ def download_photo(item_id, photo_id):
         flash('Invalid photo', 'danger')
         return redirect(url_for('admin.view_item', item_id=item_id))
     
-    return send_from_directory(
-        current_app.config['UPLOAD_FOLDER'], 
+    return get_upload_storage().send(
         photo.filename,
         as_attachment=True,
-        download_name=f"photo_{photo_id}_{photo.filename}"
+        download_name=f"photo_{photo_id}_{os.path.basename(photo.filename)}"
     )
 
 
@@ -64,14 +143,11 @@ def delete_photo(item_id, photo_id):
         return redirect(url_for('admin.view_item', item_id=item_id))
     
     try:
-        # Delete file from disk
-        photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], photo.filename)
-        if os.path.exists(photo_path):
-            os.remove(photo_path)
-        
-        # Delete from database
+        # Delete from database, then the file once nothing references it
+        filename = photo.filename
         db.session.delete(photo)
         db.session.commit()
+        release_blob(filename)
         flash('Photo deleted successfully', 'success')
     except Exception as e:
         db.session.rollback()
@@ -82,6 +158,7 @@ def delete_photo(item_id, photo_id):
 
 @bp.route('/dashboard')
 @admin_required
+@use_replica
 def dashboard():
     """Admin dashboard showing all work items."""
     # Get filter parameters
@@ -121,24 +198,63 @@ def dashboard():
 
     work_items = query.all()
 
-    return render_template('admin_dashboard.html',
-                         work_items=work_items,
-                         status_filter=status_filter,
-                         sort_by=sort_by,
-                         search_query=search_query,
+    return stream_page('admin_dashboard.html',
+                       work_items=work_items,
+                       summary=get_summary(),
+                       status_filter=status_filter,
+                       sort_by=sort_by,
+                       search_query=search_query,
+                       format_datetime=format_datetime)
+
+
+@bp.route('/api/summary')
+@admin_required
+@use_replica
+def api_summary():
+    """Work item counts by status, assignee and submitter."""
+    return jsonify(get_summary())
+
+
+@bp.route('/reports')
+@admin_required
+@use_replica
+def reports():
+    """Turnaround and throughput reports from the status history."""
+    weeks = min(max(request.args.get('weeks', DEFAULT_WEEKS, type=int), 1), 52)
+    data = get_reports(weeks, refresh=bool(request.args.get('refresh')))
+    return render_template('admin_reports.html',
+                         reports=data,
+                         weeks=weeks,
                          format_datetime=format_datetime)
 
 
 @bp.route('/view/<int:item_id>')
 @admin_required
+@use_replica
 def view_item(item_id):
     """View full details of a work item."""
     work_item = WorkItem.query.get_or_404(item_id)
     return render_template('admin_view_item.html', 
                          work_item=work_item,
+                         activity=get_activity(item_id),
+                         activity_endpoint='admin.item_activity',
                          format_datetime=format_datetime)
 
 
+@bp.route('/view/<int:item_id>/activity/<feed>')
+@admin_required
+@use_replica
+def item_activity(item_id, feed):
+    """Older comments or status history of a work item (JSON, "Load more")."""
+    if feed not in FEEDS:
+        return jsonify({'error': 'Unknown feed'}), 404
+    try:
+        entries, next_cursor = get_page(item_id, feed, before=request.args.get('before'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify(page_to_json(feed, entries, next_cursor))
+
+
 @bp.route('/edit/<int:item_id>', methods=['POST'])
 @admin_required
 def edit_item(item_id):
@@ -146,45 +262,14 @@ def edit_item(item_id):
     work_item = WorkItem.query.get_or_404(item_id)
     
     try:
-        # Update basic fields
-        work_item.item_number = request.form.get('item_number')
-        work_item.location = request.form.get('location')
-        work_item.description = request.form.get('description')
-        work_item.detail = request.form.get('detail')
-        work_item.references = request.form.get('references', '')
-        
-        # Update photo captions
-        photo_ids = request.form.getlist('photo_ids[]')
-        photo_captions = request.form.getlist('photo_captions[]')
-        
-        for photo_id, caption in zip(photo_ids, photo_captions):
-            from app.models import Photo
-            photo = Photo.query.get(int(photo_id))
-            if photo and photo.work_item_id == work_item.id:
-                photo.caption = caption
-        
-        # Handle new photo uploads
-        new_photo_files = request.files.getlist('new_photos[]')
-        new_photo_captions = request.form.getlist('new_photo_captions[]')
-        
-        for photo_file, caption in zip(new_photo_files, new_photo_captions):
-            if photo_file and photo_file.filename and allowed_file(photo_file.filename):
-                filename = generate_unique_filename(photo_file.filename)
-                filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                photo_file.save(filepath)
-                _, _, final_path = resize_image(filepath, current_app.config['PHOTO_MAX_WIDTH'])
-                final_filename = os.path.basename(final_path)
-                
-                from app.models import Photo
-                new_photo = Photo(
-                    filename=final_filename,
-                    caption=caption or '',
-                    work_item_id=work_item.id
-                )
-                db.session.add(new_photo)
-        
-        db.session.commit()
-        flash('Work item updated successfully!', 'success')
+        check_version(work_item)
+        if _save_item_form(work_item):
+            db.session.commit()
+            flash('Work item updated successfully!', 'success')
+        else:
+            flash('No changes to save.', 'info')
+    except CONFLICT_ERRORS:
+        return conflict_response(work_item, url_for('admin.view_item', item_id=item_id))
     except Exception as e:
         db.session.rollback()
         flash(f'Error updating work item: {str(e)}', 'danger')
@@ -199,59 +284,26 @@ def assign_item(item_id):
     work_item = WorkItem.query.get_or_404(item_id)
     
     old_status = work_item.status
-    new_status = request.form.get('status')
+    new_status = request.form.get('status', old_status)
     assigned_to = request.form.get('assigned_to')
     revision_notes = request.form.get('revision_notes')
     admin_name = session.get('crew_name', 'Admin')
     
     try:
+        check_version(work_item)
+
         # Update main form fields (same as edit_item)
-        work_item.item_number = request.form.get('item_number')
-        work_item.location = request.form.get('location')
-        work_item.description = request.form.get('description')
-        work_item.detail = request.form.get('detail')
-        work_item.references = request.form.get('references', '')
-        
-        # Update photo captions
-        photo_ids = request.form.getlist('photo_ids[]')
-        photo_captions = request.form.getlist('photo_captions[]')
-        
-        for photo_id, caption in zip(photo_ids, photo_captions):
-            from app.models import Photo
-            photo = Photo.query.get(int(photo_id))
-            if photo and photo.work_item_id == work_item.id:
-                photo.caption = caption
-        
-        # Handle new photo uploads
-        new_photo_files = request.files.getlist('new_photos[]')
-        new_photo_captions = request.form.getlist('new_photo_captions[]')
-        
-        for photo_file, caption in zip(new_photo_files, new_photo_captions):
-            if photo_file and photo_file.filename and allowed_file(photo_file.filename):
-                filename = generate_unique_filename(photo_file.filename)
-                filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                photo_file.save(filepath)
-                _, _, final_path = resize_image(filepath, current_app.config['PHOTO_MAX_WIDTH'])
-                final_filename = os.path.basename(final_path)
-                
-                from app.models import Photo
-                new_photo = Photo(
-                    filename=final_filename,
-                    caption=caption or '',
-                    work_item_id=work_item.id
-                )
-                db.session.add(new_photo)
-        
+        changed = _save_item_form(work_item)
+
         # Update assignment fields
-        work_item.status = new_status
-        work_item.assigned_to = assigned_to if assigned_to else None
-        work_item.revision_notes = revision_notes
-        work_item.last_modified_by = admin_name
-        work_item.last_modified_at = datetime.utcnow()
-        
-        # Set needs_revision flag
-        work_item.needs_revision = (new_status in ['Needs Revision', 'Awaiting Photos'])
-        
+        if _set_changed(work_item, {
+            'status': new_status,
+            'assigned_to': assigned_to if assigned_to else None,
+            'revision_notes': revision_notes,
+            'needs_revision': new_status in ['Needs Revision', 'Awaiting Photos'],
+        }):
+            changed = True
+
         # Record status change in history
         if old_status != new_status:
             history = StatusHistory(
@@ -262,23 +314,31 @@ def assign_item(item_id):
                 notes=revision_notes
             )
             db.session.add(history)
-        
-        db.session.commit()
+
+        if changed:
+            work_item.last_modified_by = admin_name
+            work_item.last_modified_at = datetime.utcnow()
+            db.session.commit()
 
         # Auto-generate backup document if status changed to "Completed Review"
         if new_status == 'Completed Review' and old_status != new_status:
             try:
-                generate_docx(item_id)
-                flash(f'Assignment updated successfully! Backup document generated.', 'success')
+                enqueue_export('backup', [item_id], admin_name)
+                flash(f'Assignment updated successfully! Backup document queued.', 'success')
             except Exception as doc_error:
+                db.session.rollback()
                 flash(f'Assignment updated successfully! (Warning: Document generation failed: {str(doc_error)})', 'warning')
-        else:
+        elif changed:
             flash(f'Assignment updated successfully!', 'success')
+        else:
+            flash('No changes to save.', 'info')
 
         # Send SMS notification if enabled and crew member is assigned
         if assigned_to and current_app.config.get('ENABLE_NOTIFICATIONS'):
             send_assignment_notification(work_item, assigned_to, revision_notes)
 
+    except CONFLICT_ERRORS:
+        return conflict_response(work_item, url_for('admin.view_item', item_id=item_id))
     except Exception as e:
         db.session.rollback()
         flash(f'Error updating assignment: {str(e)}', 'danger')
@@ -310,19 +370,22 @@ def update_status(item_id):
 @bp.route('/download/<int:item_id>')
 @admin_required
 def download_single(item_id):
-    """Download a single work item as .docx."""
+    """Queue a single work item .docx export."""
+    WorkItem.query.get_or_404(item_id)
     try:
-        filepath = generate_docx(item_id)
-        return send_file(filepath, as_attachment=True)
+        job = enqueue_export('single', [item_id], session.get('crew_name', 'Admin'))
     except Exception as e:
-        flash(f'Error generating document: {str(e)}', 'danger')
+        db.session.rollback()
+        flash(f'Error queuing document: {str(e)}', 'danger')
         return redirect(url_for('admin.dashboard'))
 
+    return redirect(url_for('admin.view_job', job_id=job.id))
+
 
 @bp.route('/download-batch', methods=['POST'])
 @admin_required
 def download_batch():
-    """Download multiple work items as a .zip file."""
+    """Queue multiple work items as a .zip file, or as one combined .docx."""
     item_ids = request.form.getlist('item_ids[]')
 
     if not item_ids:
@@ -332,33 +395,129 @@ def download_batch():
     try:
         # Convert to integers
         item_ids = [int(id) for id in item_ids]
+        kind = 'combined' if request.form.get('format') == 'combined' else 'zip'
+        job = enqueue_export(kind, item_ids, session.get('crew_name', 'Admin'))
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error creating batch download: {str(e)}', 'danger')
+        return redirect(url_for('admin.dashboard'))
+
+    return redirect(url_for('admin.view_job', job_id=job.id))
 
-        # Generate all documents
-        filepaths = generate_multiple_docx(item_ids)
 
-        if not filepaths:
-            flash('No documents generated', 'danger')
-            return redirect(url_for('admin.dashboard'))
+@bp.route('/import', methods=['GET', 'POST'])
+@admin_required
+def import_work_items():
+    """Bulk import work items from an uploaded CSV/XLSX file."""
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a .csv or .xlsx file to import', 'danger')
+            return redirect(url_for('admin.import_work_items'))
+        try:
+            result = import_items(upload.stream, upload.filename, session.get('crew_name', 'Admin'))
+            flash(f"Imported {upload.filename}: {result['created']} created, {result['updated']} updated, "
+                  f"{result['skipped']} skipped", 'success' if not result['skipped'] else 'warning')
+        except ImportFileError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('admin.import_work_items'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error importing work items: {str(e)}', 'danger')
+            return redirect(url_for('admin.import_work_items'))
+
+    return render_template('admin_import.html',
+                         result=result,
+                         columns=IMPORT_COLUMNS,
+                         required_columns=REQUIRED_COLUMNS)
+
+
+@bp.route('/export/<fmt>')
+@admin_required
+@use_replica
+def export_data(fmt):
+    """Stream every work item (optionally ?status=) as CSV or JSON Lines."""
+    if fmt not in STREAMED_FORMATS:
+        abort(404)
+    response = Response(stream_with_context(stream_export(fmt, request.args.get('status'))),
+                        mimetype=FORMATS[fmt][0])
+    response.headers['Content-Disposition'] = f'attachment; filename={export_filename(fmt)}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@bp.route('/export/parquet', methods=['POST'])
+@admin_required
+def export_parquet():
+    """Queue a Parquet export of every work item (built by the export worker)."""
+    try:
+        job = enqueue_export('parquet', [], session.get('crew_name', 'Admin'),
+                             total=db.session.query(WorkItem.id).count())
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error creating Parquet export: {str(e)}', 'danger')
+        return redirect(url_for('admin.list_jobs'))
+
+    return redirect(url_for('admin.view_job', job_id=job.id))
 
-        # Create zip file in memory
-        memory_file = BytesIO()
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for filepath in filepaths:
-                if os.path.exists(filepath):
-                    zf.write(filepath, os.path.basename(filepath))
 
-        memory_file.seek(0)
+@bp.route('/duplicates')
+@admin_required
+def photo_duplicates():
+    """Photos that look alike across work items."""
+    return render_template('admin_duplicates.html',
+                         groups=find_duplicate_groups(),
+                         max_groups=MAX_DUPLICATE_GROUPS,
+                         distance=current_app.config['PHOTO_DUPLICATE_DISTANCE'])
 
-        return send_file(
-            memory_file,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name='work_items_batch.zip'
-        )
 
-    except Exception as e:
-        flash(f'Error creating batch download: {str(e)}', 'danger')
-        return redirect(url_for('admin.dashboard'))
+@bp.route('/jobs')
+@admin_required
+def list_jobs():
+    """Recent export jobs."""
+    jobs = ExportJob.query.order_by(ExportJob.created_at.desc()).limit(50).all()
+    return render_template('admin_jobs.html', jobs=jobs, format_datetime=format_datetime)
+
+
+@bp.route('/jobs/<int:job_id>')
+@admin_required
+def view_job(job_id):
+    """Export job status page; polls until the result is ready."""
+    job = ExportJob.query.get_or_404(job_id)
+    return render_template('admin_job.html', job=job, format_datetime=format_datetime)
+
+
+@bp.route('/jobs/<int:job_id>/status')
+@admin_required
+def job_status(job_id):
+    """Export job progress as JSON for the status page."""
+    job = ExportJob.query.get_or_404(job_id)
+    return jsonify({
+        'id': job.id,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent,
+        'error': job.error,
+    })
+
+
+@bp.route('/jobs/<int:job_id>/download')
+@admin_required
+def download_job(job_id):
+    """Download a finished export job's result."""
+    job = ExportJob.query.get_or_404(job_id)
+    if job.status != 'done' or not job.result_key:
+        flash('This export is not ready yet', 'warning')
+        return redirect(url_for('admin.view_job', job_id=job.id))
+
+    docs_storage = get_docs_storage()
+    if not docs_storage.exists(job.result_key):
+        flash('This export has expired; please run it again', 'warning')
+        return redirect(url_for('admin.list_jobs'))
+
+    return docs_storage.send(job.result_key, as_attachment=True, download_name=job.result_name)
 
 
 @bp.route('/delete/<int:item_id>', methods=['POST'])
@@ -366,17 +525,16 @@ def download_batch():
 def delete_item(item_id):
     """Delete a work item (use with caution)."""
     work_item = WorkItem.query.get_or_404(item_id)
-
-    # Delete associated photos from disk
-    for photo in work_item.photos:
-        photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], photo.filename)
-        if os.path.exists(photo_path):
-            os.remove(photo_path)
+    filenames = {photo.filename for photo in work_item.photos}
 
     # Delete from database
     db.session.delete(work_item)
     db.session.commit()
 
+    # Delete photo files that no other work item shares
+    for filename in filenames:
+        release_blob(filename)
+
     flash(f'Work item {work_item.item_number} deleted', 'success')
     return redirect(url_for('admin.dashboard'))
 
@@ -388,50 +546,23 @@ def save_admin_notes(item_id):
     work_item = WorkItem.query.get_or_404(item_id)
 
     try:
+        check_version(work_item)
+
         # Update main form fields (same as edit_item)
-        work_item.item_number = request.form.get('item_number')
-        work_item.location = request.form.get('location')
-        work_item.description = request.form.get('description')
-        work_item.detail = request.form.get('detail')
-        work_item.references = request.form.get('references', '')
-        
-        # Update photo captions
-        photo_ids = request.form.getlist('photo_ids[]')
-        photo_captions = request.form.getlist('photo_captions[]')
-        
-        for photo_id, caption in zip(photo_ids, photo_captions):
-            from app.models import Photo
-            photo = Photo.query.get(int(photo_id))
-            if photo and photo.work_item_id == work_item.id:
-                photo.caption = caption
-        
-        # Handle new photo uploads
-        new_photo_files = request.files.getlist('new_photos[]')
-        new_photo_captions = request.form.getlist('new_photo_captions[]')
-        
-        for photo_file, caption in zip(new_photo_files, new_photo_captions):
-            if photo_file and photo_file.filename and allowed_file(photo_file.filename):
-                filename = generate_unique_filename(photo_file.filename)
-                filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                photo_file.save(filepath)
-                _, _, final_path = resize_image(filepath, current_app.config['PHOTO_MAX_WIDTH'])
-                final_filename = os.path.basename(final_path)
-                
-                from app.models import Photo
-                new_photo = Photo(
-                    filename=final_filename,
-                    caption=caption or '',
-                    work_item_id=work_item.id
-                )
-                db.session.add(new_photo)
-        
+        changed = _save_item_form(work_item)
+
         # Update admin notes
-        admin_notes = request.form.get('admin_notes', '')
-        work_item.admin_notes = admin_notes
-        work_item.admin_notes_updated_at = datetime.utcnow()
+        if _set_changed(work_item, {'admin_notes': request.form.get('admin_notes', '')}):
+            work_item.admin_notes_updated_at = datetime.utcnow()
+            changed = True
 
-        db.session.commit()
-        flash('Admin notes and all changes saved successfully!', 'success')
+        if changed:
+            db.session.commit()
+            flash('Admin notes and all changes saved successfully!', 'success')
+        else:
+            flash('No changes to save.', 'info')
+    except CONFLICT_ERRORS:
+        return conflict_response(work_item, url_for('admin.view_item', item_id=item_id))
     except Exception as e:
         db.session.rollback()
         flash(f'Error saving admin notes: {str(e)}', 'danger')
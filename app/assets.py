@@ -0,0 +1,279 @@
+"""Self-hosted, fingerprinted and precompressed static assets.
+
+Pages used to load Bootstrap and Bootstrap Icons from cdn.jsdelivr.net and
+our own CSS/JS unversioned. Shipboard links often cannot reach the CDN, and
+every unversioned file cost a revalidation round trip on each page view.
+
+``build_assets`` turns the vendored libraries (``app/static/vendor``) and
+our sources into a few bundles::
+
+    css/app.css              Bootstrap + used icons + variables.css + style.css
+    js/app.js                Bootstrap + main.js
+    js/photo-upload.js       crew photo manager
+    js/photo-resize-worker.js
+
+Each bundle is minified, written to ``app/static/dist`` under a
+content-hashed name (``app.3f9c2a1b.css``) with ``.gz`` and, when the
+``brotli`` package is installed, ``.br`` siblings, and listed in
+``manifest.json``. Bootstrap Icons are not shipped as a font: the icons
+the templates use are inlined into the CSS as SVG masks.
+
+Templates call ``asset_url('css/app.css')``; ``/assets/<name>`` serves the
+hashed files with the best precompressed encoding the client accepts and
+``Cache-Control: immutable``, so repeat visits make no requests for them.
+The app rebuilds on startup when the sources no longer match the manifest
+(ASSET_BUILD_ON_START), and ``python build_assets.py`` builds ahead of time.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+from urllib.parse import quote
+from flask import abort, request, send_file
+
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+VENDOR_DIR = os.path.join(STATIC_DIR, 'vendor')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+ICON_SPRITE = 'bootstrap-icons/bootstrap-icons.svg'
+ICONS_PLACEHOLDER = '<bootstrap-icons>'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Upstream copies of the vendored files (python build_assets.py --vendor)
+VENDOR_SOURCES = {
+    'bootstrap/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    # No Popper bundle: the templates use collapse, tabs and alerts, not dropdowns or tooltips
+    'bootstrap/bootstrap.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.min.js',
+    ICON_SPRITE: 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/bootstrap-icons.svg',
+}
+
+# Bundle name -> source files (relative to app/static), in order
+BUNDLES = {
+    'css/app.css': ['vendor/bootstrap/bootstrap.min.css', ICONS_PLACEHOLDER,
+                    'css/variables.css', 'css/style.css'],
+    'js/app.js': ['vendor/bootstrap/bootstrap.min.js', 'js/main.js'],
+    'js/photo-upload.js': ['js/photo-upload.js'],
+    'js/photo-resize-worker.js': ['js/photo-resize-worker.js'],
+}
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_ICON_CLASS = re.compile(r'\bbi-([a-z0-9]+(?:-[a-z0-9]+)*)')
+_SOURCE_MAP = re.compile(r'^\s*(?://|/\*)# sourceMappingURL=.*$', re.MULTILINE)
+_CSS_IMPORT = re.compile(r'^@import\s+url\([^)]*\);\s*$', re.MULTILINE)
+
+_manifest = None
+
+
+def vendor_assets():
+    """Download the pinned upstream files into app/static/vendor."""
+    import urllib.request
+
+    for name, url in VENDOR_SOURCES.items():
+        path = os.path.join(VENDOR_DIR, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=60) as response:
+            data = response.read()
+        with open(path, 'wb') as f:
+            f.write(data)
+        logger.info(f'Vendored {url} ({len(data)} bytes)')
+
+
+def _used_icons():
+    """Bootstrap icon names referenced by templates and scripts."""
+    names = set()
+    for root in (TEMPLATE_DIR, os.path.join(STATIC_DIR, 'js')):
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(('.html', '.js')):
+                    with open(os.path.join(dirpath, filename), encoding='utf-8') as f:
+                        names.update(_ICON_CLASS.findall(f.read()))
+    return sorted(names)
+
+
+def _icons_css(names):
+    """CSS drawing the given Bootstrap icons as SVG masks in ``currentColor``."""
+    with open(os.path.join(VENDOR_DIR, ICON_SPRITE), encoding='utf-8') as f:
+        sprite = f.read()
+
+    rules = [
+        '.bi::before{display:inline-block;width:1em;height:1em;vertical-align:-.125em;content:"";'
+        'background-color:currentColor;-webkit-mask:var(--bi) no-repeat center/contain;'
+        'mask:var(--bi) no-repeat center/contain}'
+    ]
+    for name in names:
+        match = re.search(rf'<symbol[^>]*\bid="{re.escape(name)}"[^>]*>(.*?)</symbol>', sprite, re.DOTALL)
+        if not match:
+            continue  # Not an icon (e.g. a ``bi-`` prefix in unrelated text)
+        view_box = re.search(r'viewBox="([^"]+)"', match.group(0)).group(1)
+        svg = (f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='{view_box}'>"
+               f"{match.group(1).replace(chr(34), chr(39))}</svg>")
+        rules.append(f'.bi-{name}{{--bi:url("data:image/svg+xml,{quote(svg, safe=" /=:;,.-_~()")}")}}')
+    return '\n'.join(rules)
+
+
+def minify_css(text):
+    """Conservative CSS minifier; uses rcssmin when installed."""
+    try:
+        import rcssmin
+        return rcssmin.cssmin(text, keep_bang_comments=True)
+    except ImportError:
+        pass
+    text = re.sub(r'/\*(?!!).*?\*/', '', text, flags=re.DOTALL)
+    text = re.sub(r'\s+', ' ', text)
+    # Only around punctuation where whitespace never matters (not ':' - "a :hover")
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """Conservative JS minifier; uses rjsmin when installed.
+
+    Without rjsmin only indentation, blank lines and whole-line comments are
+    removed, which cannot change what the code does.
+    """
+    try:
+        import rjsmin
+        return rjsmin.jsmin(text, keep_bang_comments=True)
+    except ImportError:
+        pass
+    text = re.sub(r'^\s*/\*(?!!).*?\*/[ \t]*$', '', text, flags=re.DOTALL | re.MULTILINE)
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('//'):
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def _read_sources(bundle):
+    parts = []
+    for source in BUNDLES[bundle]:
+        if source == ICONS_PLACEHOLDER:
+            parts.append(_icons_css(_used_icons()))
+            continue
+        with open(os.path.join(STATIC_DIR, source), encoding='utf-8') as f:
+            text = _SOURCE_MAP.sub('', f.read())
+        if source.endswith('.css'):
+            # Bundled in order, so @import of a sibling would fetch it twice
+            text = _CSS_IMPORT.sub('', text)
+        parts.append(text)
+    return parts
+
+
+def _sources_digest():
+    """Hash of every build input, to tell whether the manifest is current."""
+    digest = hashlib.sha256()
+    for bundle in sorted(BUNDLES):
+        for source in BUNDLES[bundle]:
+            if source == ICONS_PLACEHOLDER:
+                digest.update(' '.join(_used_icons()).encode('utf-8'))
+                source = f'vendor/{ICON_SPRITE}'
+            with open(os.path.join(STATIC_DIR, source), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _write(path, data):
+    temp_path = f'{path}.tmp{os.getpid()}'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _compressed_variants(data):
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+        variants['.br'] = brotli.compress(data, quality=11)
+    except ImportError:
+        pass
+    return variants
+
+
+def build_assets(dist_dir=DIST_DIR):
+    """Build every bundle into ``dist_dir`` and write the manifest.
+
+    Returns the manifest. Files from earlier builds are left in place so
+    pages already open in a browser keep working; they are tiny.
+    """
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest = {'digest': _sources_digest(), 'assets': {}}
+
+    for bundle in BUNDLES:
+        text = '\n'.join(_read_sources(bundle))
+        data = (minify_css(text) if bundle.endswith('.css') else minify_js(text)).encode('utf-8')
+
+        stem, ext = os.path.splitext(os.path.basename(bundle))
+        hashed_name = f'{stem}.{hashlib.sha256(data).hexdigest()[:8]}{ext}'
+        path = os.path.join(dist_dir, hashed_name)
+        _write(path, data)
+        for suffix, compressed in _compressed_variants(data).items():
+            _write(path + suffix, compressed)
+        manifest['assets'][bundle] = hashed_name
+
+    _write(os.path.join(dist_dir, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(dist_dir=DIST_DIR):
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def asset_url(name):
+    """URL of a built asset, e.g. ``asset_url('css/app.css')``."""
+    hashed_name = _manifest['assets'].get(name) if _manifest else None
+    if hashed_name is None:
+        raise KeyError(f'Unknown asset {name!r}; run python build_assets.py')
+    return f'/assets/{hashed_name}'
+
+
+def serve_asset(filename):
+    """Serve a hashed asset, precompressed when the client accepts it."""
+    if os.path.basename(filename) != filename or filename == MANIFEST_NAME:
+        abort(404)
+    path = os.path.join(DIST_DIR, filename)
+    if not os.path.isfile(path):
+        abort(404)
+
+    accepted = request.headers.get('Accept-Encoding', '')
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.isfile(path + suffix):
+            encoding, path = name, path + suffix
+            break
+
+    mimetype = 'text/css' if filename.endswith('.css') else 'text/javascript'
+    response = send_file(path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE, conditional=True)
+    response.cache_control.immutable = True
+    response.cache_control.public = True
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """Load (or rebuild) the manifest and register ``asset_url`` and ``/assets/``."""
+    global _manifest
+    manifest = load_manifest()
+    if app.config.get('ASSET_BUILD_ON_START', True):
+        if manifest is None or manifest.get('digest') != _sources_digest():
+            logger.info('Static assets changed; rebuilding')
+            manifest = build_assets()
+    elif manifest is None:
+        logger.warning('No asset manifest found; run python build_assets.py')
+    _manifest = manifest
+
+    app.add_template_global(asset_url)
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
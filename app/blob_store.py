@@ -0,0 +1,106 @@
+"""Content-addressed storage for processed photos.
+
+A photo is stored once under the SHA-256 of its processed bytes, using
+two-level sharded keys in the upload store (see ``app.storage``)::
+
+    3f/a2/3fa2...e9.jpg
+
+``Photo.filename`` holds that relative key, so identical photos attached to
+several work items share one file. A blob's reference count is the number
+of Photo rows pointing at it; the file is deleted when it drops to zero.
+
+A request that deduplicates onto an existing blob only references it once
+it commits, so a count of zero does not prove the blob is unused. Reusing
+a blob therefore refreshes its modification time, and blobs written or
+reused within BLOB_GRACE_SECONDS are never deleted right away: they are
+left to the storage GC (``gc_storage.py``), which skips files younger
+than the same hour and re-checks the references.
+"""
+import hashlib
+import logging
+import os
+from app import db
+from app.renditions import release_renditions
+from app.storage import get_upload_storage
+
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Longer than any request holding an uncommitted reference (and the GC's default minimum age)
+BLOB_GRACE_SECONDS = 3600
+
+
+def hash_file(path):
+    """Return the hex SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_key(content_hash, ext):
+    """Return the sharded relative key for a blob, e.g. ``3f/a2/3fa2....jpg``."""
+    return f'{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.{ext}'
+
+
+def blob_path(upload_folder, key):
+    """Return the absolute path of a blob key (or legacy flat filename) on local disk."""
+    return os.path.join(upload_folder, *key.split('/'))
+
+
+def publish_blob(storage, temp_path):
+    """Move a processed local file into the store under its content hash.
+
+    Returns ``(key, content_hash, created)``. If an identical blob already
+    exists the temporary file is discarded and ``created`` is False; the
+    blob's modification time is refreshed so it is not released while the
+    caller's reference is uncommitted.
+    """
+    content_hash = hash_file(temp_path)
+    ext = temp_path.rsplit('.', 1)[1].lower()
+    key = blob_key(content_hash, ext)
+
+    if storage.touch(key):
+        os.remove(temp_path)
+        return key, content_hash, False
+
+    storage.put_file(key, temp_path)
+    return key, content_hash, True
+
+
+def count_references(filename, connection=None):
+    """Return how many Photo rows reference a stored file."""
+    from app.models import Photo
+
+    query = db.select(db.func.count(Photo.id)).where(Photo.filename == filename)
+    if connection is not None:
+        return connection.execute(query).scalar()
+    return db.session.execute(query).scalar()
+
+
+def release_blob(filename):
+    """Delete a stored file once no Photo row references it.
+
+    Call after the transaction that removed the referencing rows has
+    committed. Blobs written or reused within BLOB_GRACE_SECONDS are left
+    for the storage GC, as a request that is still running may reference
+    them. Returns True if the file was deleted.
+    """
+    if count_references(filename):
+        return False
+
+    storage = get_upload_storage()
+    try:
+        age = storage.age(filename)
+        if age is not None and age < BLOB_GRACE_SECONDS:
+            logger.info(f'Leaving recently used blob {filename} to the storage GC')
+            return False
+        deleted = storage.delete(filename)
+    except Exception as e:
+        logger.error(f'Could not remove blob {filename}: {e}')
+        return False
+
+    release_renditions(filename)
+    return deleted
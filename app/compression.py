@@ -0,0 +1,101 @@
+"""Response compression (brotli or gzip) for dynamic pages and JSON.
+
+The dashboard and crew lists are hundreds of KB of repetitive HTML, which
+compresses ~10x; on a ship's satellite link that is most of the page load.
+Responses are compressed in an ``after_request`` hook when the client
+accepts it, the type is compressible and the body is at least
+COMPRESS_MIN_BYTES (tiny bodies gain nothing and cost a few CPU cycles).
+
+Streamed responses (``stream_page``) have no known size and are always
+compressed, chunk by chunk with a sync flush after each one, so the first
+part of the page still reaches the browser before the rest is rendered.
+
+File responses (photos, documents) pass through untouched, as do
+responses that already carry a Content-Encoding (the precompressed
+``/assets/`` bundles).
+"""
+import zlib
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/x-ndjson', 'image/svg+xml',
+}
+
+
+def choose_encoding(accept_encodings):
+    """The best encoding the client accepts: 'br', 'gzip' or None."""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compressor(encoding, config):
+    """Return (compress, flush, finish) functions for one response body."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config['COMPRESS_BROTLI_QUALITY'])
+        return compressor.process, compressor.flush, compressor.finish
+    # wbits=31: gzip container rather than raw zlib
+    compressor = zlib.compressobj(config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _compress_chunks(chunks, encoding, config):
+    compress, flush, finish = _compressor(encoding, config)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compress(chunk) + flush()
+        yield finish()
+    finally:
+        # Ends the wrapped stream (and the request context it holds) early
+        # if the client disconnects
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    config = current_app.config
+    if (not config['COMPRESS_RESPONSES']
+            or request.method == 'HEAD'
+            or response.direct_passthrough
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_chunks(response.response, encoding, config)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_BYTES']:
+            return response
+        compress, _, finish = _compressor(encoding, config)
+        response.set_data(compress(data) + finish())
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The compressed body is a different representation
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,133 @@
+"""Optimistic concurrency for work item edits.
+
+``WorkItem.version`` is the mapper's ``version_id_col``: every UPDATE of a
+work item runs ``... WHERE id = ? AND version = ?`` and increments it, so
+when two requests write the same row the second one's flush matches no
+row and raises StaleDataError. The edit forms also post the version they
+were rendered from, which covers the much longer window of a form left
+open in a browser while someone else saves.
+
+Either way nothing is written: the request is rolled back and answered
+with a 409 merge view, from which the user saves again. The forms also
+post ``base``, a digest of each field's value as the form showed it
+(``edit_base``), so the merge is three-way: a field only the user edited
+keeps their value, a field only the other save changed keeps the saved
+value, and only fields both changed (to different values) are offered as
+a choice. No row is ever locked, so editors of different items (and
+readers) never wait on each other.
+"""
+import hashlib
+import json
+from flask import render_template, request
+from sqlalchemy.orm.exc import StaleDataError
+from app import db
+from app.utils import format_datetime
+
+
+# Work item fields merged by value (and shown in the merge view on a conflict)
+FIELD_LABELS = {
+    'item_number': 'Item Number',
+    'location': 'Location',
+    'description': 'Description',
+    'detail': 'Detail',
+    'references': 'Operator Furnished Material (OFM)',
+    'status': 'Status',
+    'assigned_to': 'Assigned To',
+    'revision_notes': 'Revision Notes',
+    'admin_notes': 'Admin Notes',
+}
+
+
+class EditConflict(Exception):
+    """The work item changed after the submitted form was rendered."""
+
+
+CONFLICT_ERRORS = (EditConflict, StaleDataError)
+
+
+def check_version(work_item):
+    """Raise EditConflict if the form was rendered from an older version.
+
+    Forms without a version field (pages loaded before it existed) are
+    accepted; the version_id_col check still applies to them.
+    """
+    submitted = request.form.get('version', type=int)
+    if submitted is not None and submitted != work_item.version:
+        raise EditConflict(f'{work_item.item_number} is at version {work_item.version}, form was {submitted}')
+
+
+def _normalize(value):
+    """Field value as a form posts it (browsers send textarea newlines as CRLF)."""
+    return (value or '').replace('\r\n', '\n')
+
+
+def _digest(value):
+    return hashlib.sha1(_normalize(value).encode()).hexdigest()[:12]
+
+
+def edit_base(work_item):
+    """Digests of the item's field values, posted by edit forms as ``base``."""
+    return json.dumps({name: _digest(getattr(work_item, name)) for name in FIELD_LABELS},
+                      separators=(',', ':'))
+
+
+def _posted_base():
+    try:
+        base = json.loads(request.form.get('base', ''))
+    except ValueError:
+        return {}
+    return base if isinstance(base, dict) else {}
+
+
+def conflict_response(work_item, cancel_url):
+    """Roll back and return the merge view (HTTP 409) for the posted form.
+
+    Each posted field is compared with the ``base`` the form was rendered
+    from: one the user changed and the other save did not keeps the user's
+    value, one the other save changed and the user did not keeps the saved
+    value, and one both changed to different values is offered as a choice
+    (the user's value preselected). Forms without a base offer every
+    differing field, with the saved value preselected. Other posted fields
+    are carried over unchanged, along with the current version and base,
+    so saving the merge view repeats the original request on top of the
+    other save. Uploaded files cannot be carried over.
+    """
+    db.session.rollback()  # Also expires work_item, so it shows the saved values
+
+    base = _posted_base()
+    conflicts, carried, merged = [], [], []
+    for name in request.form:
+        values = request.form.getlist(name)
+        if name in ('version', 'base'):
+            continue
+        if name in FIELD_LABELS and len(values) == 1:
+            saved = getattr(work_item, name) or ''
+            mine = values[0]
+            if _normalize(saved) != _normalize(mine):
+                other_changed = name not in base or _digest(saved) != base[name]
+                user_changed = name not in base or _digest(mine) != base[name]
+                if other_changed and user_changed:
+                    conflicts.append({'name': name, 'label': FIELD_LABELS[name], 'saved': saved,
+                                      'mine': mine, 'keep_mine': name in base})
+                    continue
+                if other_changed:
+                    merged.append(FIELD_LABELS[name])
+                    carried.append((name, saved))
+                    continue
+        carried.extend((name, value) for value in values)
+
+    files_dropped = any(f.filename for name in request.files for f in request.files.getlist(name))
+    return render_template('item_conflict.html',
+                           work_item=work_item,
+                           conflicts=conflicts,
+                           carried=carried,
+                           merged=merged,
+                           files_dropped=files_dropped,
+                           action=request.path,
+                           cancel_url=cancel_url,
+                           format_datetime=format_datetime), 409
+
+
+def init_app(app):
+    """Register ``edit_base`` for the edit forms."""
+    app.add_template_global(edit_base)
@@ -0,0 +1,279 @@
+"""Aggregate work item counts maintained alongside every write.
+
+``work_item_counters`` holds one row per (dimension, key), e.g.
+``('status', 'Submitted')`` or ``('assignee', 'DP')``. A session
+``after_flush`` hook turns the work items and status history rows flushed
+in a transaction into +1/-1 deltas and adds them up in ``session.info``;
+a ``before_commit`` hook applies the total with an atomic
+``count = count + delta`` upsert on the same connection, so the counters
+commit or roll back together with the rows they describe. Applying them
+only at commit keeps the few hot counter rows locked (on PostgreSQL) for
+the commit alone, not while a request goes on to process photos after
+flushing its work item. The dashboard and ``/admin/api/summary`` read the
+small counter table instead of counting work items.
+
+Writes that bypass the ORM unit of work (bulk UPDATE/INSERT statements)
+are not seen by the hook; run ``python check_counters.py --rebuild`` after
+them. A rebuild locks the counter table against writers while it counts,
+so saves committing at the same time are neither lost nor counted twice.
+"""
+import logging
+from collections import Counter
+from sqlalchemy import event, inspect
+from app import db
+from app.models import StatusHistory, WorkItem, WorkItemCounter
+
+
+logger = logging.getLogger(__name__)
+
+TOTAL = 'total'
+STATUS = 'status'
+ASSIGNEE = 'assignee'
+SUBMITTER = 'submitter'
+NEEDS_REVISION = 'needs_revision'
+STATUS_CHANGES = 'status_changes'
+
+DEFAULT_STATUS = 'Submitted'
+TRACKED_ATTRIBUTES = ('status', 'assigned_to', 'submitter_name', 'needs_revision')
+
+
+def _item_keys(status, assigned_to, submitter_name, needs_revision):
+    """Counter rows one work item contributes to."""
+    keys = [
+        (TOTAL, ''),
+        (STATUS, status or DEFAULT_STATUS),
+        (ASSIGNEE, assigned_to or ''),
+        (SUBMITTER, submitter_name or ''),
+    ]
+    if needs_revision:
+        keys.append((NEEDS_REVISION, ''))
+    return keys
+
+
+def _values(state, old=False):
+    """Tracked attribute values of a work item, before or after this flush."""
+    values = []
+    for name in TRACKED_ATTRIBUTES:
+        history = state.attrs[name].history
+        if old and history.deleted:
+            values.append(history.deleted[0])
+        elif old and history.added and not history.deleted:
+            values.append(None)  # Was unset before this flush
+        else:
+            values.append(state.attrs[name].value)
+    return values
+
+
+def _collect_deltas(session):
+    deltas = Counter()
+
+    for obj in session.new:
+        if isinstance(obj, WorkItem):
+            for key in _item_keys(*_values(inspect(obj))):
+                deltas[key] += 1
+        elif isinstance(obj, StatusHistory):
+            deltas[(STATUS_CHANGES, obj.new_status)] += 1
+
+    for obj in session.dirty:
+        if isinstance(obj, WorkItem) and session.is_modified(obj, include_collections=False):
+            state = inspect(obj)
+            for key in _item_keys(*_values(state, old=True)):
+                deltas[key] -= 1
+            for key in _item_keys(*_values(state)):
+                deltas[key] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, WorkItem):
+            for key in _item_keys(*_values(inspect(obj), old=True)):
+                deltas[key] -= 1
+        elif isinstance(obj, StatusHistory):
+            deltas[(STATUS_CHANGES, obj.new_status)] -= 1
+
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def _upsert_statement(dialect_name, dimension, key, delta):
+    table = WorkItemCounter.__table__
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+
+    stmt = insert(table).values(dimension=dimension, key=key, count=delta)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.dimension, table.c.key],
+        set_={'count': table.c.count + stmt.excluded.count}
+    )
+
+
+def apply_deltas(connection, deltas):
+    """Add ``{(dimension, key): delta}`` to the counters on ``connection``."""
+    table = WorkItemCounter.__table__
+    dialect_name = connection.dialect.name
+
+    for (dimension, key), delta in sorted(deltas.items()):
+        stmt = _upsert_statement(dialect_name, dimension, key, delta)
+        if stmt is not None:
+            connection.execute(stmt)
+            continue
+
+        result = connection.execute(
+            table.update()
+            .where(table.c.dimension == dimension, table.c.key == key)
+            .values(count=table.c.count + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(dimension=dimension, key=key, count=delta))
+
+
+def _load_deleted_items(session, flush_context, instances):
+    # Make sure the old values of deleted items are loaded while their rows exist
+    for obj in session.deleted:
+        if isinstance(obj, WorkItem):
+            for name in TRACKED_ATTRIBUTES:
+                getattr(obj, name)
+
+
+def _collect_flushed_deltas(session, flush_context):
+    deltas = _collect_deltas(session)
+    if deltas:
+        session.info.setdefault('counter_deltas', Counter()).update(deltas)
+
+
+def _apply_pending_deltas(session):
+    session.flush()  # The commit flushes after this hook; collect those changes now
+    deltas = session.info.pop('counter_deltas', None)
+    deltas = {key: delta for key, delta in (deltas or {}).items() if delta}
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def _discard_pending_deltas(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('counter_deltas', None)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+def compute_counts(session=None):
+    """Count every counter from the work_items and status_history tables."""
+    session = session or db.session
+    counts = Counter()
+
+    rows = session.query(
+        WorkItem.status, WorkItem.assigned_to, WorkItem.submitter_name,
+        WorkItem.needs_revision, db.func.count(WorkItem.id)
+    ).group_by(
+        WorkItem.status, WorkItem.assigned_to, WorkItem.submitter_name, WorkItem.needs_revision
+    )
+    for status, assigned_to, submitter_name, needs_revision, count in rows:
+        for key in _item_keys(status, assigned_to, submitter_name, needs_revision):
+            counts[key] += count
+
+    changes = session.query(StatusHistory.new_status, db.func.count(StatusHistory.id)).group_by(StatusHistory.new_status)
+    for new_status, count in changes:
+        counts[(STATUS_CHANGES, new_status)] += count
+
+    counts.setdefault((TOTAL, ''), 0)
+    return counts
+
+
+def check_counters():
+    """Compare stored counters with a fresh count.
+
+    Returns ``{(dimension, key): (stored, expected)}`` for every mismatch.
+    """
+    expected = compute_counts()
+    stored = {
+        (row.dimension, row.key): row.count
+        for row in WorkItemCounter.query
+    }
+    mismatches = {}
+    for key in set(expected) | set(stored):
+        if expected.get(key, 0) != stored.get(key, 0):
+            mismatches[key] = (stored.get(key, 0), expected.get(key, 0))
+    return mismatches
+
+
+def _lock_counters(session):
+    """Block counter writes by other transactions until this one ends.
+
+    Taken before counting: a save that committed earlier is in the count,
+    and one committing later waits to add its delta on top of the rebuild.
+    """
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name == 'postgresql':
+        session.execute(db.text('LOCK TABLE work_item_counters IN EXCLUSIVE MODE'))
+    elif dialect_name == 'sqlite':
+        # Any write takes the database write lock, and reads then see the latest data
+        session.execute(WorkItemCounter.__table__.update().where(db.false()).values(count=0))
+
+
+def rebuild_counters():
+    """Replace the stored counters with a fresh count, in one locked transaction."""
+    _lock_counters(db.session)
+    counts = compute_counts()
+    WorkItemCounter.query.delete()
+    db.session.add_all(
+        WorkItemCounter(dimension=dimension, key=key, count=count)
+        for (dimension, key), count in counts.items()
+    )
+    db.session.commit()
+    return counts
+
+
+def get_summary():
+    """Return the counters grouped for display, from the counter table alone."""
+    summary = {
+        'total': 0,
+        'needs_revision': 0,
+        'by_status': {},
+        'by_assignee': {},
+        'by_submitter': {},
+        'status_changes': {},
+    }
+    groups = {
+        STATUS: 'by_status',
+        ASSIGNEE: 'by_assignee',
+        SUBMITTER: 'by_submitter',
+        STATUS_CHANGES: 'status_changes',
+    }
+    for row in WorkItemCounter.query.filter(WorkItemCounter.count != 0):
+        if row.dimension == TOTAL:
+            summary['total'] = row.count
+        elif row.dimension == NEEDS_REVISION:
+            summary['needs_revision'] = row.count
+        elif row.dimension in groups:
+            label = row.key if row.key or row.dimension != ASSIGNEE else 'Unassigned'
+            summary[groups[row.dimension]][label] = row.count
+    return summary
+
+
+def init_app(app):
+    """Register the flush and commit hooks and seed the counters on first start."""
+    if not event.contains(db.session, 'after_flush', _collect_flushed_deltas):
+        event.listen(db.session, 'before_flush', _load_deleted_items)
+        event.listen(db.session, 'after_flush', _collect_flushed_deltas)
+        event.listen(db.session, 'before_commit', _apply_pending_deltas)
+        event.listen(db.session, 'after_transaction_end', _discard_pending_deltas)
+        # Load the previous value when a tracked attribute is set on an
+        # expired instance, so the flush knows which counter to decrement
+        for name in TRACKED_ATTRIBUTES:
+            event.listen(getattr(WorkItem, name), 'set', _load_old_value,
+                         active_history=True, retval=True)
+
+    with app.app_context():
+        try:
+            if db.session.get(WorkItemCounter, (TOTAL, '')) is None:
+                rebuild_counters()
+                logger.info('Work item counters seeded')
+        except Exception as e:
+            # Another process may be seeding at the same time
+            db.session.rollback()
+            logger.warning(f'Could not seed work item counters: {e}')
+        finally:
+            db.session.remove()
@@ -1,12 +1,19 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app, jsonify
 from app import db
-from app.models import WorkItem, Photo, Comment
-from app.utils import allowed_file, generate_unique_filename, resize_image, get_next_draft_number
-from datetime import datetime
-import os
+from app.models import WorkItem, Photo, Comment, StatusHistory, SyncReceipt
+from app.activity import FEEDS, get_activity, get_page, page_to_json
+from app.blob_store import release_blob
+from app.conflicts import CONFLICT_ERRORS, check_version, conflict_response
+from app.database import on_primary, use_replica
+from app.photo_ingest import UploadRejected, check_uploads, collect_photo_uploads, ingest_photos
+from app.utils import allowed_file, format_datetime, get_next_draft_number, stream_page
+from datetime import datetime, timezone
+import json
+import logging
 
 
 bp = Blueprint('crew', __name__, url_prefix='/crew')
+logger = logging.getLogger(__name__)
 
 
 def crew_required(f):
@@ -22,6 +29,7 @@ def crew_required(f):
 
 @bp.route('/submit', methods=['GET', 'POST'])
 @crew_required
+@use_replica
 def submit_form():
     """Crew submission form."""
     if request.method == 'POST':
@@ -91,30 +99,14 @@ def submit_form():
             db.session.add(work_item)
             db.session.flush()  # Get the ID without committing
 
-            # Process photos with their correct captions
+            # Reject the whole submission if any photo has an invalid type
             for idx, (photo_file, caption) in enumerate(valid_photo_pairs):
-                if photo_file and allowed_file(photo_file.filename):
-                    # Generate unique filename
-                    filename = generate_unique_filename(photo_file.filename)
-                    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-
-                    # Save file
-                    photo_file.save(filepath)
-
-                    # Resize image (returns new path if HEIC was converted)
-                    _, _, final_path = resize_image(filepath, current_app.config['PHOTO_MAX_WIDTH'])
-                    final_filename = os.path.basename(final_path)
-
-                    # Create photo record with the correct caption
-                    photo = Photo(
-                        filename=final_filename,
-                        caption=caption or '',
-                        work_item_id=work_item.id
-                    )
-                    db.session.add(photo)
-                else:
+                if not allowed_file(photo_file.filename):
                     raise ValueError(f'Invalid file type for photo {idx + 1}')
 
+            # Process photos with their correct captions
+            ingest_photos(work_item.id, valid_photo_pairs)
+
             db.session.commit()
             
             if is_update:
@@ -130,7 +122,9 @@ def submit_form():
             return redirect(url_for('crew.submit_form'))
 
     # GET request - show form
-    next_item_number = get_next_draft_number()
+    # The suggested number must not lag behind other crew members' submissions
+    with on_primary():
+        next_item_number = get_next_draft_number()
     crew_name = session.get('crew_name')
     
     # Get items assigned to this crew member
@@ -160,16 +154,17 @@ def submit_form():
         print(f"Error querying completed items: {e}")
         completed_items = []
     
-    return render_template('crew_form.html', 
-                         next_item_number=next_item_number,
-                         crew_name=crew_name,
-                         min_photos=current_app.config['PHOTO_MIN_COUNT'],
-                         max_photos=current_app.config['PHOTO_MAX_COUNT'],
-                         assigned_items=assigned_items,
-                         in_progress_items=in_progress_items,
-                         completed_items=completed_items,
-                         ev_yard_items=current_app.config['EV_YARD_ITEMS'],
-                         draft_items=current_app.config['DRAFT_ITEMS'])
+    return stream_page('crew_form.html',
+                       next_item_number=next_item_number,
+                       crew_name=crew_name,
+                       min_photos=current_app.config['PHOTO_MIN_COUNT'],
+                       max_photos=current_app.config['PHOTO_MAX_COUNT'],
+                       photo_max_width=current_app.config['PHOTO_MAX_WIDTH'],
+                       assigned_items=assigned_items,
+                       in_progress_items=in_progress_items,
+                       completed_items=completed_items,
+                       ev_yard_items=current_app.config['EV_YARD_ITEMS'],
+                       draft_items=current_app.config['DRAFT_ITEMS'])
 
 
 @bp.route('/edit/<int:item_id>', methods=['GET', 'POST'])
@@ -191,6 +186,8 @@ def edit_assigned_item(item_id):
 
     if request.method == 'POST':
         try:
+            check_version(work_item)
+
             # Update allowed fields only
             work_item.description = request.form.get('description')
             work_item.detail = request.form.get('detail')
@@ -204,6 +201,14 @@ def edit_assigned_item(item_id):
             old_status = work_item.status
             work_item.status = 'Submitted'
             work_item.needs_revision = False
+            if old_status != 'Submitted':
+                db.session.add(StatusHistory(
+                    work_item_id=work_item.id,
+                    old_status=old_status,
+                    new_status='Submitted',
+                    changed_by=crew_name,
+                    notes='Resubmitted after revision'
+                ))
 
             # Clear revision notes after addressing them
             work_item.revision_notes = None
@@ -221,25 +226,14 @@ def edit_assigned_item(item_id):
             new_photo_files = request.files.getlist('new_photos[]')
             new_photo_captions = request.form.getlist('new_photo_captions[]')
 
-            for photo_file, caption in zip(new_photo_files, new_photo_captions):
-                if photo_file and photo_file.filename and allowed_file(photo_file.filename):
-                    filename = generate_unique_filename(photo_file.filename)
-                    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                    photo_file.save(filepath)
-                    _, _, final_path = resize_image(filepath, current_app.config['PHOTO_MAX_WIDTH'])
-                    final_filename = os.path.basename(final_path)
-
-                    new_photo = Photo(
-                        filename=final_filename,
-                        caption=caption or '',
-                        work_item_id=work_item.id
-                    )
-                    db.session.add(new_photo)
+            ingest_photos(work_item.id, collect_photo_uploads(new_photo_files, new_photo_captions))
 
             db.session.commit()
             flash(f'Work item {work_item.item_number} updated successfully! Status changed from "{old_status}" to "Submitted".', 'success')
             return redirect(url_for('crew.success', item_number=work_item.item_number))
 
+        except CONFLICT_ERRORS:
+            return conflict_response(work_item, url_for('crew.edit_assigned_item', item_id=item_id))
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating work item: {str(e)}', 'danger')
@@ -249,7 +243,8 @@ def edit_assigned_item(item_id):
     return render_template('crew_edit.html',
                          work_item=work_item,
                          crew_name=crew_name,
-                         max_photos=current_app.config['PHOTO_MAX_COUNT'])
+                         max_photos=current_app.config['PHOTO_MAX_COUNT'],
+                         photo_max_width=current_app.config['PHOTO_MAX_WIDTH'])
 
 
 @bp.route('/delete-photo/<int:item_id>/<int:photo_id>')
@@ -272,14 +267,11 @@ def delete_assigned_photo(item_id, photo_id):
         return redirect(url_for('crew.edit_assigned_item', item_id=item_id))
 
     try:
-        # Delete file from disk
-        photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], photo.filename)
-        if os.path.exists(photo_path):
-            os.remove(photo_path)
-
-        # Delete from database
+        # Delete from database, then the file once nothing references it
+        filename = photo.filename
         db.session.delete(photo)
         db.session.commit()
+        release_blob(filename)
         flash('Photo deleted successfully', 'success')
     except Exception as e:
         db.session.rollback()
@@ -290,6 +282,7 @@ def delete_assigned_photo(item_id, photo_id):
 
 @bp.route('/view/<int:item_id>')
 @crew_required
+@use_replica
 def view_item(item_id):
     """View a work item (read-only)."""
     work_item = WorkItem.query.get_or_404(item_id)
@@ -302,7 +295,24 @@ def view_item(item_id):
     return render_template('crew_view.html',
                          work_item=work_item,
                          crew_name=crew_name,
-                         can_edit=can_edit)
+                         can_edit=can_edit,
+                         activity=get_activity(item_id),
+                         activity_endpoint='crew.item_activity',
+                         format_datetime=format_datetime)
+
+
+@bp.route('/view/<int:item_id>/activity/<feed>')
+@crew_required
+@use_replica
+def item_activity(item_id, feed):
+    """Older comments or status history of a work item (JSON, "Load more")."""
+    if feed not in FEEDS:
+        return jsonify({'error': 'Unknown feed'}), 404
+    try:
+        entries, next_cursor = get_page(item_id, feed, before=request.args.get('before'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify(page_to_json(feed, entries, next_cursor))
 
 
 @bp.route('/success')
@@ -311,3 +321,200 @@ def success():
     """Success page after submission."""
     item_number = request.args.get('item_number', 'Unknown')
     return render_template('crew_success.html', item_number=item_number)
+
+
+def _parse_queued_at(value):
+    """Return a submission's ``queued_at`` as naive UTC (like the stored times), or None.
+
+    Devices send ISO 8601, with an offset or ``Z`` (``toISOString()``) or
+    without one (taken as UTC).
+    """
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@bp.route('/sync', methods=['POST'])
+@crew_required
+def sync_submissions():
+    """Apply a batch of submissions queued on a device while it was offline.
+
+    The request is multipart/form-data with a ``manifest`` field holding JSON
+    (or a plain JSON body when no photos are attached)::
+
+        {"submissions": [{"client_id": "<uuid generated on the device>",
+                          "queued_at": "2026-03-01T14:05:00",
+                          "item_number": "", "location": "...",
+                          "description": "...", "detail": "...",
+                          "references": "",
+                          "photos": [{"field": "photo-0", "caption": "..."}]}]}
+
+    Each photo ``field`` names a file part in the same request. ``client_id``
+    is the idempotency key: replaying a batch after a dropped connection
+    returns the original result instead of creating duplicates. The whole
+    batch is applied in one transaction and the response lists, per
+    submission, the server-assigned item number or the reason it was not
+    applied (``conflict`` / ``rejected``).
+    """
+    if request.files or 'manifest' in request.form:
+        try:
+            manifest = json.loads(request.form.get('manifest', ''))
+        except ValueError:
+            return jsonify({'error': 'manifest is not valid JSON'}), 400
+    else:
+        manifest = request.get_json(silent=True)
+
+    submissions = manifest.get('submissions') if isinstance(manifest, dict) else None
+    if not isinstance(submissions, list):
+        return jsonify({'error': 'manifest must contain a submissions list'}), 400
+
+    max_batch = current_app.config['SYNC_MAX_BATCH']
+    if len(submissions) > max_batch:
+        return jsonify({'error': f'Maximum {max_batch} submissions per sync batch'}), 413
+
+    crew_name = session.get('crew_name')
+    keys = [sub.get('client_id') for sub in submissions if isinstance(sub, dict)]
+    receipts = {
+        receipt.idempotency_key: receipt
+        for receipt in SyncReceipt.query.filter(SyncReceipt.idempotency_key.in_(
+            [key for key in keys if isinstance(key, str)]
+        )).all()
+    } if keys else {}
+
+    # Reserve DRAFT numbers locally so one batch does not re-query per item
+    next_draft = int(get_next_draft_number().replace('DRAFT_', ''))
+
+    results = []
+    try:
+        for sub in submissions:
+            if not isinstance(sub, dict):
+                results.append({'client_id': None, 'status': 'rejected',
+                                'error': 'Submission must be an object'})
+                continue
+
+            client_id = sub.get('client_id')
+            if not isinstance(client_id, str) or not client_id or len(client_id) > 64:
+                results.append({'client_id': client_id, 'status': 'rejected',
+                                'error': 'client_id must be a non-empty string of at most 64 characters'})
+                continue
+
+            receipt = receipts.get(client_id)
+            if receipt:
+                results.append({'client_id': client_id, 'status': 'duplicate',
+                                'item_number': receipt.item_number,
+                                'work_item_id': receipt.work_item_id})
+                continue
+
+            location = sub.get('location')
+            description = sub.get('description')
+            detail = sub.get('detail')
+            if not all([location, description, detail]):
+                results.append({'client_id': client_id, 'status': 'rejected',
+                                'error': 'All required fields must be filled out'})
+                continue
+
+            photo_refs = sub.get('photos') or []
+            if len(photo_refs) > current_app.config['PHOTO_MAX_COUNT']:
+                results.append({'client_id': client_id, 'status': 'rejected',
+                                'error': f'Maximum {current_app.config["PHOTO_MAX_COUNT"]} photos allowed'})
+                continue
+
+            photo_pairs = []
+            for ref in photo_refs:
+                photo_file = request.files.get(ref.get('field', '')) if isinstance(ref, dict) else None
+                if not photo_file or not photo_file.filename or not allowed_file(photo_file.filename):
+                    photo_pairs = None
+                    break
+                photo_pairs.append((photo_file, ref.get('caption') or ''))
+            if photo_pairs is None:
+                results.append({'client_id': client_id, 'status': 'rejected',
+                                'error': 'Missing or invalid photo file'})
+                continue
+            try:
+                check_uploads(photo_pairs)
+            except UploadRejected as e:
+                results.append({'client_id': client_id, 'status': 'rejected', 'error': str(e)})
+                continue
+
+            item_number = sub.get('item_number')
+            existing_item = WorkItem.query.filter_by(item_number=item_number).first() if item_number else None
+
+            if existing_item:
+                # Never clobber an approved item or one changed since the device went offline
+                queued_at = _parse_queued_at(sub.get('queued_at'))
+                server_modified = existing_item.last_modified_at or existing_item.submitted_at
+                if existing_item.status == 'Completed Review':
+                    reason = f'Item {item_number} has already been approved. Contact admin to modify.'
+                elif queued_at is None or (server_modified and server_modified > queued_at):
+                    reason = f'Item {item_number} was changed on the server after this submission was queued.'
+                else:
+                    reason = None
+                if reason:
+                    results.append({'client_id': client_id, 'status': 'conflict',
+                                    'item_number': item_number,
+                                    'work_item_id': existing_item.id,
+                                    'server_status': existing_item.status,
+                                    'error': reason})
+                    continue
+
+                status = 'updated'
+                work_item = existing_item
+                work_item.last_modified_by = crew_name
+                work_item.last_modified_at = datetime.utcnow()
+            else:
+                status = 'created'
+                if not item_number:
+                    # Skip numbers taken since the reservation, including by earlier
+                    # submissions of this batch (autoflushed into the query)
+                    while db.session.query(WorkItem.id).filter_by(item_number=f'DRAFT_{next_draft:04d}').first():
+                        next_draft += 1
+                    item_number = f'DRAFT_{next_draft:04d}'
+                    next_draft += 1
+                work_item = WorkItem(
+                    item_number=item_number,
+                    submitter_name=crew_name,
+                    original_submitter=crew_name,
+                    assigned_to=crew_name  # Auto-assign to submitter
+                )
+
+            work_item.location = location
+            work_item.ns_equipment = 'N/A'  # Keep for database compatibility
+            work_item.description = description
+            work_item.detail = detail
+            work_item.references = sub.get('references', '')
+
+            db.session.add(work_item)
+            db.session.flush()  # Get the ID without committing
+
+            ingest_photos(work_item.id, photo_pairs, checked=True)
+
+            receipt = SyncReceipt(
+                idempotency_key=client_id,
+                work_item_id=work_item.id,
+                item_number=item_number,
+                submitter_name=crew_name
+            )
+            db.session.add(receipt)
+            receipts[client_id] = receipt
+
+            results.append({'client_id': client_id, 'status': status,
+                            'item_number': item_number,
+                            'work_item_id': work_item.id})
+
+        db.session.commit()
+
+    except Exception:
+        db.session.rollback()
+        logger.exception(f'Could not apply sync batch of {len(submissions)} submissions from {crew_name}')
+        return jsonify({'error': 'Error applying sync batch; try again later'}), 500
+
+    return jsonify({
+        'results': results,
+        'conflicts': [result for result in results if result['status'] == 'conflict'],
+    })
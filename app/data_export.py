@@ -0,0 +1,182 @@
+"""Streaming export of the work item table for analysis.
+
+One row per work item: its columns plus the photo count and status
+history summary (number of status changes, first/last change and when it
+reached Completed Review), in CSV, JSON Lines or Parquet.
+
+Rows are read with a single aggregate query executed with ``yield_per``
+(a server-side cursor on PostgreSQL) and written EXPORT_BATCH_ROWS at a
+time, so neither the database driver nor the writer ever holds the whole
+table. CSV and JSONL are streamed straight to the client (or to a file,
+``python export_items.py``); Parquet is columnar and needs the footer
+written last, so the web app builds it in an export job (kind
+``parquet``) and it needs ``pyarrow`` installed.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models import Photo, StatusHistory, WorkItem
+
+
+# Output columns and their types (for the Parquet schema)
+COLUMNS = [
+    ('id', 'int'),
+    ('item_number', 'str'),
+    ('location', 'str'),
+    ('ns_equipment', 'str'),
+    ('description', 'str'),
+    ('detail', 'str'),
+    ('references', 'str'),
+    ('status', 'str'),
+    ('assigned_to', 'str'),
+    ('needs_revision', 'bool'),
+    ('submitter_name', 'str'),
+    ('original_submitter', 'str'),
+    ('submitted_at', 'datetime'),
+    ('last_modified_by', 'str'),
+    ('last_modified_at', 'datetime'),
+    ('version', 'int'),
+    ('photo_count', 'int'),
+    ('status_changes', 'int'),
+    ('first_status_change_at', 'datetime'),
+    ('last_status_change_at', 'datetime'),
+    ('completed_at', 'datetime'),
+]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+STREAMED_FORMATS = ('csv', 'jsonl')
+COMPLETED_STATUS = 'Completed Review'
+
+
+class ExportFormatError(ValueError):
+    """The requested format is unknown or its library is not installed."""
+
+
+def export_query(status=None):
+    """SELECT of one output row per work item, in COLUMNS order."""
+    items = WorkItem.__table__
+    photos = (
+        db.select(Photo.work_item_id, db.func.count().label('photo_count'))
+        .group_by(Photo.work_item_id)
+        .subquery()
+    )
+    history = (
+        db.select(
+            StatusHistory.work_item_id,
+            db.func.count().label('status_changes'),
+            db.func.min(StatusHistory.changed_at).label('first_status_change_at'),
+            db.func.max(StatusHistory.changed_at).label('last_status_change_at'),
+            db.func.max(db.case((StatusHistory.new_status == COMPLETED_STATUS, StatusHistory.changed_at)))
+            .label('completed_at'),
+        )
+        .group_by(StatusHistory.work_item_id)
+        .subquery()
+    )
+
+    stmt = (
+        db.select(
+            *[items.c[name] for name in COLUMN_NAMES[:COLUMN_NAMES.index('photo_count')]],
+            db.func.coalesce(photos.c.photo_count, 0).label('photo_count'),
+            db.func.coalesce(history.c.status_changes, 0).label('status_changes'),
+            history.c.first_status_change_at,
+            history.c.last_status_change_at,
+            history.c.completed_at,
+        )
+        .select_from(
+            items.outerjoin(photos, photos.c.work_item_id == items.c.id)
+            .outerjoin(history, history.c.work_item_id == items.c.id)
+        )
+        .order_by(items.c.id)
+    )
+    if status:
+        stmt = stmt.where(items.c.status == status)
+    return stmt
+
+
+def iter_batches(status=None, batch_size=None):
+    """Yield lists of row tuples, ``batch_size`` rows at a time."""
+    batch_size = batch_size or current_app.config['EXPORT_BATCH_ROWS']
+    result = db.session.execute(export_query(status), execution_options={'yield_per': batch_size})
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def iter_csv(batches):
+    """Yield the CSV text for the header and each batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMN_NAMES)
+    for rows in batches:
+        writer.writerows([_text(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()  # The header alone if there were no rows
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+def iter_jsonl(batches):
+    """Yield one JSON object per line, a batch per chunk."""
+    for rows in batches:
+        yield ''.join(
+            json.dumps(dict(zip(COLUMN_NAMES, row)), default=_json_default, ensure_ascii=False) + '\n'
+            for row in rows
+        )
+
+
+def write_parquet(batches, fileobj, progress=None):
+    """Write the batches to ``fileobj`` as a Parquet file; return the row count."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportFormatError('Parquet export needs pyarrow (pip install pyarrow)')
+
+    types = {'int': pa.int64(), 'str': pa.string(), 'bool': pa.bool_(), 'datetime': pa.timestamp('us')}
+    schema = pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+    count = 0
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        for rows in batches:
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            count += len(rows)
+            if progress:
+                progress(count)
+    return count
+
+
+def stream_export(fmt, status=None, batch_size=None):
+    """Chunks of a CSV or JSONL export, for a streamed response or file."""
+    if fmt not in STREAMED_FORMATS:
+        raise ExportFormatError(f'{fmt!r} cannot be streamed; use one of {", ".join(STREAMED_FORMATS)}')
+    batches = iter_batches(status, batch_size)
+    return iter_csv(batches) if fmt == 'csv' else iter_jsonl(batches)
+
+
+def export_filename(fmt, when=None):
+    return f'work_items_{(when or datetime.utcnow()).strftime("%Y%m%d_%H%M")}.{FORMATS[fmt][1]}'
@@ -0,0 +1,116 @@
+"""Per-connection database setup and read-replica routing.
+
+For SQLite (local development and single-box deployments) every new
+connection gets ``journal_mode=WAL`` so readers do not block the writer,
+``synchronous=NORMAL`` (safe with WAL) and a busy timeout so concurrent
+writers wait for the lock instead of failing with "database is locked".
+Postgres settings are passed as connect arguments in ``config.py``.
+
+When READ_REPLICA_URL is set, views decorated with ``@use_replica`` send
+their SELECTs to the replica engine (the ``replica`` bind); everything else,
+and every write, uses the primary. Routing stays on the primary when:
+
+* the request is not a GET/HEAD,
+* the session has written in its current transaction, or
+* the user committed a write within READ_REPLICA_STICKY_SECONDS, so they
+  see their own change even while the replica lags (read-your-writes).
+
+Views that read through a replica must not write what they read back.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select, CompoundSelect
+
+
+REPLICA_BIND = 'replica'
+LAST_WRITE_KEY = '_db_last_write'
+
+
+def use_replica(f):
+    """Decorator to serve a read-only view from the read replica."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            g.use_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@contextmanager
+def on_primary():
+    """Read from the primary inside a replica-enabled view."""
+    use_replica = g.pop('use_replica', False)
+    try:
+        yield
+    finally:
+        g.use_replica = use_replica
+
+
+def _recently_wrote():
+    if not has_request_context():
+        return False
+    last_write = session.get(LAST_WRITE_KEY)
+    return last_write is not None and \
+        time.time() - last_write < current_app.config['READ_REPLICA_STICKY_SECONDS']
+
+
+class RoutingSession(Session):
+    """Session that sends reads from replica-enabled views to the replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or (clause is not None and not isinstance(clause, (Select, CompoundSelect))):
+                self.info['wrote'] = True
+            elif self._use_replica(clause):
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if self.info.get('wrote') or not (has_app_context() and g.get('use_replica')):
+            return False
+        if REPLICA_BIND not in self._db.engines:
+            return False
+        if isinstance(clause, Select) and clause._for_update_arg is not None:
+            return False
+        return not _recently_wrote()
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(db_session):
+    # Only a replica makes stickiness matter; don't touch the cookie otherwise
+    if db_session.info.pop('wrote', False) and has_request_context() \
+            and REPLICA_BIND in db_session._db.engines:
+        session[LAST_WRITE_KEY] = time.time()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(db_session):
+    db_session.info.pop('wrote', None)
+
+
+def _sqlite_pragmas(journal_mode, busy_timeout_ms):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms)}')
+            if journal_mode:
+                cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+                if journal_mode.upper() == 'WAL':
+                    cursor.execute('PRAGMA synchronous = NORMAL')
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def init_app(app):
+    """Install connection hooks on the app's engines (primary and replica)."""
+    with app.app_context():
+        for engine in app.extensions['sqlalchemy'].engines.values():
+            if engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+                event.listen(engine, 'connect', _sqlite_pragmas(
+                    app.config['SQLITE_JOURNAL_MODE'], app.config['SQLITE_BUSY_TIMEOUT_MS']
+                ))
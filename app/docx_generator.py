@@ -1,20 +1,117 @@
 from docx import Document
+from docx.document import _Body
 from docx.shared import Inches, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.oxml.shape import CT_Inline
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from app import db
 from app.models import WorkItem
+from app.renditions import PHOTO_WIDTH_INCHES, get_print_image
+from app.storage import get_docs_storage, get_upload_storage
 from flask import current_app
-import os
+from io import BytesIO
+from sqlalchemy.orm import selectinload
+from datetime import datetime
+import copy
+import logging
+import threading
 
 
-def generate_docx(work_item_id):
-    """
-    Generate a .docx file matching the template format.
-    Returns the filepath of the generated document.
+logger = logging.getLogger(__name__)
+
+
+# Markers in the template skeleton. Value placeholders ({item_number},
+# {location}, ...) must each sit alone in a single run.
+PHOTOS_MARKER = '{photos}'
+OFM_MARKER = '{ofm}'
+
+_skeleton = None
+_skeleton_lock = threading.Lock()
+
+
+def docx_filename(item_number, description):
+    """Return the generated document filename for a work item."""
+    return f"{item_number}_{description[:30].replace(' ', '_')}.docx"
+
+
+def _footer_text(work_item):
+    return (f'Submitted by: {work_item.submitter_name} | '
+            f'Date: {work_item.submitted_at.strftime("%Y-%m-%d %H:%M")}')
+
+
+def _add_heading(doc, text):
+    heading = doc.add_paragraph()
+    heading_run = heading.add_run(text)
+    heading_run.bold = True
+    heading_run.font.size = Pt(12)
+    return heading
+
+
+class PictureEmbedder:
+    """Embeds stored photos into one document, adding each image part once.
+
+    ``add_picture`` re-reads and re-hashes the image file on every call and
+    scans the whole document for the next shape id, which grows quadratic
+    for documents with many photos. This embeds the cached print rendition
+    (see ``app.renditions``), keeps the (rId, image) pair per stored key and
+    hands out shape ids from a counter instead.
     """
-    from app.models import WorkItem
 
-    work_item = WorkItem.query.get_or_404(work_item_id)
+    def __init__(self, doc, upload_storage=None):
+        self.part = doc.part
+        self.storage = upload_storage or get_upload_storage()
+        self.images = {}
+        self.next_shape_id = self.part.next_id
+
+    def _embed(self, image):
+        image_parts = self.part.package.image_parts
+        image_part = image_parts._get_by_sha1(image.sha1) or image_parts._add_image_part(image)
+        return self.part.relate_to(image_part, RT.IMAGE), image
+
+    def add(self, paragraph, key, width=Inches(PHOTO_WIDTH_INCHES)):
+        """Add the photo stored under ``key`` to a paragraph; False if it is missing."""
+        if key not in self.images:
+            image = get_print_image(key, self.storage)
+            self.images[key] = self._embed(image) if image is not None else None
+
+        if self.images[key] is None:
+            return False
+
+        rId, image = self.images[key]
+        cx, cy = image.scaled_dimensions(width, None)
+        inline = CT_Inline.new_pic_inline(self.next_shape_id, rId, image.filename, cx, cy)
+        self.next_shape_id += 1
+        paragraph.add_run()._r.add_drawing(inline)
+        return True
+
+
+def _add_photo(doc, pictures, photo, idx):
+    """Append a photo paragraph and its caption; returns the paragraphs added."""
+    added = [doc.add_paragraph()]  # Blank line
 
+    # Photo
+    picture_p = doc.add_paragraph()
+    try:
+        if pictures.add(picture_p, photo.filename):
+            added.append(picture_p)
+        else:
+            picture_p._p.getparent().remove(picture_p._p)
+    except Exception as e:
+        picture_p._p.getparent().remove(picture_p._p)
+        added.append(doc.add_paragraph(f'[Error loading photo: {photo.filename}]'))
+
+    # Caption
+    caption_p = doc.add_paragraph()
+    caption_p.add_run(f'Photo {idx} Caption: ').italic = True
+    caption_p.add_run(photo.caption)
+    added.append(caption_p)
+    return added
+
+
+def _new_document(title_text):
+    """Return an empty document with the default font and a centered title."""
     # Create document
     doc = Document()
 
@@ -26,13 +123,16 @@ def generate_docx(work_item_id):
 
     # Title
     title = doc.add_paragraph()
-    title_run = title.add_run('WORK ITEM DRAFT TEMPLATE')
+    title_run = title.add_run(title_text)
     title_run.bold = True
     title_run.font.size = Pt(14)
     title.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
-    doc.add_paragraph()  # Blank line
+    return doc
+
 
+def _append_work_item(doc, work_item, pictures):
+    """Append one work item's fields, photos and footer to a document (or body)."""
     # Item NO.
     p = doc.add_paragraph()
     p.add_run('Item NO.: ').bold = True
@@ -45,90 +145,323 @@ def generate_docx(work_item_id):
 
     doc.add_paragraph()  # Blank line
 
-    # Description heading
-    heading = doc.add_paragraph()
-    heading_run = heading.add_run('Description:')
-    heading_run.bold = True
-    heading_run.font.size = Pt(12)
-
-    # Description content
+    # Description
+    _add_heading(doc, 'Description:')
     doc.add_paragraph(work_item.description)
 
     doc.add_paragraph()  # Blank line
 
-    # Detail heading
-    heading = doc.add_paragraph()
-    heading_run = heading.add_run('Detail:')
-    heading_run.bold = True
-    heading_run.font.size = Pt(12)
-
-    # Detail content
+    # Detail
+    _add_heading(doc, 'Detail:')
     doc.add_paragraph(work_item.detail)
 
     # Operator Furnished Material (if provided)
     if work_item.references:
         doc.add_paragraph()  # Blank line
-        heading = doc.add_paragraph()
-        heading_run = heading.add_run('Operator Furnished Material (OFM):')
-        heading_run.bold = True
-        heading_run.font.size = Pt(12)
+        _add_heading(doc, 'Operator Furnished Material (OFM):')
         doc.add_paragraph(work_item.references)
 
     # Photos section
     doc.add_paragraph()  # Blank line
-    heading = doc.add_paragraph()
-    heading_run = heading.add_run('PHOTOS')
-    heading_run.bold = True
-    heading_run.font.size = Pt(12)
+    _add_heading(doc, 'PHOTOS')
 
     # Add each photo
     for idx, photo in enumerate(work_item.photos, 1):
-        doc.add_paragraph()  # Blank line
+        _add_photo(doc, pictures, photo, idx)
 
-        # Photo
-        photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], photo.filename)
-        if os.path.exists(photo_path):
-            try:
-                doc.add_picture(photo_path, width=Inches(4))
-            except Exception as e:
-                doc.add_paragraph(f'[Error loading photo: {photo.filename}]')
+    # Metadata footer
+    doc.add_paragraph()
+    doc.add_paragraph()
+    footer = doc.add_paragraph()
+    footer_run = footer.add_run(_footer_text(work_item))
+    footer_run.font.size = Pt(9)
+    footer_run.font.color.rgb = RGBColor(128, 128, 128)
 
-        # Caption
-        caption_p = doc.add_paragraph()
-        caption_p.add_run(f'Photo {idx} Caption: ').italic = True
-        caption_p.add_run(photo.caption)
 
-    # Metadata footer
+def build_document(work_item):
+    """Build a work item document from scratch, run by run."""
+    doc = _new_document('WORK ITEM DRAFT TEMPLATE')
+    doc.add_paragraph()  # Blank line
+    _append_work_item(doc, work_item, PictureEmbedder(doc))
+    return doc
+
+
+def _build_skeleton():
+    """Build the template skeleton: the fixed layout with placeholder runs."""
+    doc = Document()
+
+    style = doc.styles['Normal']
+    style.font.name = 'Calibri'
+    style.font.size = Pt(11)
+
+    title = doc.add_paragraph()
+    title_run = title.add_run('WORK ITEM DRAFT TEMPLATE')
+    title_run.bold = True
+    title_run.font.size = Pt(14)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    doc.add_paragraph()
+
+    p = doc.add_paragraph()
+    p.add_run('Item NO.: ').bold = True
+    p.add_run('{item_number}')
+
+    p = doc.add_paragraph()
+    p.add_run('Location: ').bold = True
+    p.add_run('{location}')
+
+    doc.add_paragraph()
+    _add_heading(doc, 'Description:')
+    doc.add_paragraph('{description}')
+
+    doc.add_paragraph()
+    _add_heading(doc, 'Detail:')
+    doc.add_paragraph('{detail}')
+
+    # The OFM block (marker, blank line, heading, text) is dropped when empty
+    doc.add_paragraph(OFM_MARKER)
+    doc.add_paragraph()
+    _add_heading(doc, 'Operator Furnished Material (OFM):')
+    doc.add_paragraph('{references}')
+
+    doc.add_paragraph()
+    _add_heading(doc, 'PHOTOS')
+    doc.add_paragraph(PHOTOS_MARKER)
+
     doc.add_paragraph()
     doc.add_paragraph()
     footer = doc.add_paragraph()
-    footer_run = footer.add_run(
-        f'Submitted by: {work_item.submitter_name} | '
-        f'Date: {work_item.submitted_at.strftime("%Y-%m-%d %H:%M")}'
-    )
+    footer_run = footer.add_run('{footer}')
     footer_run.font.size = Pt(9)
     footer_run.font.color.rgb = RGBColor(128, 128, 128)
 
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def get_skeleton():
+    """Return the parsed template skeleton, loading it once per process.
+
+    ``DOCX_TEMPLATE_PATH`` may point at a .docx edited in Word that uses the
+    same placeholders; otherwise the built-in skeleton is used. Callers must
+    not modify the returned document; ``render_document`` works on a copy.
+    """
+    global _skeleton
+    if _skeleton is None:
+        with _skeleton_lock:
+            if _skeleton is None:
+                template_path = current_app.config.get('DOCX_TEMPLATE_PATH')
+                if template_path:
+                    with open(template_path, 'rb') as f:
+                        data = f.read()
+                else:
+                    data = _build_skeleton()
+                _skeleton = Document(BytesIO(data))
+    return _skeleton
+
+
+def render_document(work_item):
+    """Render a work item document by cloning the template skeleton.
+
+    Styles, headings and fixed text come pre-built from the skeleton; only
+    the placeholder runs are filled in and the photos inserted. Copying the
+    parsed package in memory avoids re-reading and re-parsing its XML parts.
+    """
+    doc = copy.deepcopy(get_skeleton())
+
+    values = {
+        '{item_number}': work_item.item_number,
+        '{location}': work_item.location,
+        '{description}': work_item.description,
+        '{detail}': work_item.detail,
+        '{references}': work_item.references or '',
+        '{footer}': _footer_text(work_item),
+    }
+
+    paragraphs = doc.paragraphs
+    photos_marker = None
+    for idx, paragraph in enumerate(paragraphs):
+        text = paragraph.text
+        if '{' not in text:
+            continue
+
+        if text == OFM_MARKER:
+            # Marker plus the blank line, heading and text that follow it
+            block = paragraphs[idx:idx + 4] if not work_item.references else [paragraph]
+            for p in block:
+                p._p.getparent().remove(p._p)
+            continue
+
+        if text == PHOTOS_MARKER:
+            photos_marker = paragraph
+            continue
+
+        for run in paragraph.runs:
+            if run.text in values:
+                run.text = values[run.text]
+
+    if photos_marker is not None:
+        pictures = PictureEmbedder(doc)
+        for idx, photo in enumerate(work_item.photos, 1):
+            for p in _add_photo(doc, pictures, photo, idx):
+                photos_marker._p.addprevious(p._p)
+        photos_marker._p.getparent().remove(photos_marker._p)
+
+    return doc
+
+
+def generate_docx(work_item_id):
+    """
+    Generate a .docx file matching the template format.
+    Returns the filename (storage key) of the generated document.
+    """
+    from app.models import WorkItem
+
+    work_item = WorkItem.query.get_or_404(work_item_id)
+
+    if current_app.config['DOCX_RENDERER'] == 'builder':
+        doc = build_document(work_item)
+    else:
+        doc = render_document(work_item)
+
     # Save document
-    filename = f"{work_item.item_number}_{work_item.description[:30].replace(' ', '_')}.docx"
-    # Use absolute path from Flask app root
-    docs_folder = os.path.join(os.path.dirname(current_app.root_path), current_app.config['GENERATED_DOCS_FOLDER'])
-    os.makedirs(docs_folder, exist_ok=True)
-    filepath = os.path.join(docs_folder, filename)
-    doc.save(filepath)
-    
-    return filepath
+    filename = docx_filename(work_item.item_number, work_item.description)
+    buffer = BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    get_docs_storage().save(filename, buffer)
+
+    return filename
 
 
-def generate_multiple_docx(work_item_ids):
+def generate_multiple_docx(work_item_ids, progress=None):
     """
-    Generate multiple .docx files and return list of filepaths.
+    Generate multiple .docx files and return list of filenames (storage keys).
+    ``progress`` is called with the number of items handled so far.
     """
-    filepaths = []
-    for work_item_id in work_item_ids:
+    filenames = []
+    for done, work_item_id in enumerate(work_item_ids, 1):
         try:
-            filepath = generate_docx(work_item_id)
-            filepaths.append(filepath)
+            filename = generate_docx(work_item_id)
+            filenames.append(filename)
         except Exception as e:
             print(f"Error generating document for work item {work_item_id}: {e}")
-    return filepaths
+        if progress:
+            progress(done)
+    return filenames
+
+
+def _add_toc(doc):
+    """Add a table-of-contents field; returns the paragraph holding its result.
+
+    Word rebuilds the field from the Heading 1 paragraphs when the document
+    is opened (``updateFields``); until then the static entries written by
+    ``_fill_toc`` are shown, so viewers that never update fields still get
+    a usable list.
+    """
+    paragraph = doc.add_paragraph()
+
+    def field_char(run, char_type):
+        fld = OxmlElement('w:fldChar')
+        fld.set(qn('w:fldCharType'), char_type)
+        run._r.append(fld)
+
+    field_char(paragraph.add_run(), 'begin')
+    instr = OxmlElement('w:instrText')
+    instr.set(qn('xml:space'), 'preserve')
+    instr.text = 'TOC \\o "1-1" \\h \\z \\u'
+    paragraph.add_run()._r.append(instr)
+    field_char(paragraph.add_run(), 'separate')
+
+    update_fields = OxmlElement('w:updateFields')
+    update_fields.set(qn('w:val'), 'true')
+    doc.settings.element.append(update_fields)
+
+    return paragraph
+
+
+def _fill_toc(paragraph, entries):
+    """Write the static TOC entries into the field result and close the field."""
+    for idx, entry in enumerate(entries):
+        run = paragraph.add_run(entry)
+        if idx < len(entries) - 1:
+            run.add_break()
+    end = OxmlElement('w:fldChar')
+    end.set(qn('w:fldCharType'), 'end')
+    paragraph.add_run()._r.append(end)
+
+
+def _iter_work_items(work_item_ids, chunk_size=100):
+    """Yield work items ordered by item number, loading them in chunks.
+
+    Only one chunk (with its photos) is held at a time, so memory stays flat
+    regardless of how many items are exported. Items deleted since the
+    export was queued are skipped.
+    """
+    ids = list(work_item_ids)
+    ordered = []
+    for start in range(0, len(ids), chunk_size):
+        ordered.extend(
+            db.session.query(WorkItem.item_number, WorkItem.id)
+            .filter(WorkItem.id.in_(ids[start:start + chunk_size]))
+        )
+    ordered = [item_id for _, item_id in sorted(ordered)]
+
+    for start in range(0, len(ordered), chunk_size):
+        chunk = ordered[start:start + chunk_size]
+        items = {
+            item.id: item for item in
+            WorkItem.query.options(selectinload(WorkItem.photos)).filter(WorkItem.id.in_(chunk))
+        }
+        for item_id in chunk:
+            if item_id not in items:
+                logger.info(f'Work item {item_id} was deleted during the export; skipping it')
+                continue
+            yield items[item_id]
+
+
+def generate_combined_docx(work_item_ids, stream, progress=None):
+    """
+    Write many work items into a single .docx with a table of contents.
+    Each item starts on a new page; a photo attached to several items is
+    embedded once. ``progress`` is called with the number of items written
+    so far. Returns the number of items written.
+    """
+    doc = _new_document('WORK ITEM PACKAGE')
+
+    subtitle = doc.add_paragraph(f'Generated {datetime.utcnow().strftime("%Y-%m-%d %H:%M")} UTC')
+    subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph()
+
+    heading = doc.add_paragraph()
+    heading_run = heading.add_run('CONTENTS')
+    heading_run.bold = True
+    heading_run.font.size = Pt(12)
+    toc = _add_toc(doc)
+
+    # python-docx scans the body for sectPr on every add_paragraph, so each
+    # item is built in a small scratch body and spliced in ahead of sectPr
+    sect_pr = doc.element.body.sectPr
+    heading_style_id = doc.styles['Heading 1'].style_id
+    pictures = PictureEmbedder(doc)
+    entries = []
+    for work_item in _iter_work_items(work_item_ids):
+        scratch = _Body(OxmlElement('w:body'), doc)
+        scratch.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+
+        title = f'{work_item.item_number} - {work_item.description[:80]}'
+        heading = scratch.add_paragraph()
+        heading._p.style = heading_style_id
+        heading.add_run(title)
+        entries.append(title)
+
+        _append_work_item(scratch, work_item, pictures)
+        for block in list(scratch._element):
+            sect_pr.addprevious(block)
+        if progress:
+            progress(len(entries))
+
+    _fill_toc(toc, entries)
+    doc.save(stream)
+    return len(entries)
@@ -0,0 +1,311 @@
+"""Database-backed queue for document exports.
+
+Routes never generate documents themselves: they call ``enqueue_export`` and
+redirect to the job's status page. A worker (a thread inside each web
+process while EXPORT_WORKER_EMBEDDED is true, the default with
+SERVER_MODE=threaded, or ``python worker.py`` run as its own service, the
+default with SERVER_MODE=gevent) claims queued jobs, generates the
+documents and stores the result in the docs store. Claiming is a conditional ``UPDATE ... WHERE status = 'queued'``, so
+any number of workers can poll the same table without running a job twice,
+and no outside services are needed.
+
+Job kinds:
+
+* ``single`` / ``backup`` - one work item's .docx (the regular generated
+  document, which doubles as the Completed Review backup).
+* ``zip`` - a .zip of one .docx per item, stored under ``exports/<job id>_...``.
+* ``combined`` - one .docx holding every item, stored under ``exports/<job id>_...``.
+* ``parquet`` - the whole work item table as Parquet (see app/data_export.py);
+  ``item_ids`` is empty.
+
+Jobs that finished more than EXPORT_JOB_RETENTION_HOURS ago are purged
+together with their ``exports/`` files. A running job's worker stamps
+``heartbeat_at`` whenever it reports progress; jobs whose heartbeat is
+older than EXPORT_JOB_TIMEOUT_SECONDS (their worker died or hangs) are
+re-queued, up to EXPORT_JOB_MAX_ATTEMPTS attempts, while long jobs that
+are still progressing are left alone.
+"""
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import ExportJob
+from app.data_export import export_filename, iter_batches, write_parquet
+from app.docx_generator import generate_docx, generate_multiple_docx, generate_combined_docx
+from app.storage import get_docs_storage
+
+
+logger = logging.getLogger(__name__)
+
+EXPORT_PREFIX = 'exports/'
+JOB_KINDS = ('single', 'backup', 'zip', 'combined', 'parquet')
+PROGRESS_INTERVAL_SECONDS = 1.0
+HOUSEKEEPING_INTERVAL_SECONDS = 60
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+
+def enqueue_export(kind, item_ids, requested_by=None, total=None):
+    """Queue an export job and return it (committed).
+
+    ``total`` is the progress target; it defaults to the number of items.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f'Unknown export kind: {kind}')
+
+    job = ExportJob(
+        kind=kind,
+        item_ids=json.dumps([int(item_id) for item_id in item_ids]),
+        requested_by=requested_by,
+        total=len(item_ids) if total is None else total,
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def claim_next_job(worker_id):
+    """Atomically take the oldest queued job; returns None if there is none."""
+    while True:
+        job_id = db.session.execute(
+            db.select(ExportJob.id)
+            .where(ExportJob.status == 'queued')
+            .order_by(ExportJob.created_at, ExportJob.id)
+            .limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+
+        result = db.session.execute(
+            db.update(ExportJob)
+            .where(ExportJob.id == job_id, ExportJob.status == 'queued')
+            .values(status='running', worker_id=worker_id, progress=0, started_at=datetime.utcnow(),
+                    heartbeat_at=datetime.utcnow(), attempts=ExportJob.attempts + 1)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(ExportJob, job_id)
+        # Another worker claimed it between the SELECT and the UPDATE; try the next one
+
+
+class _ProgressReporter:
+    """Writes job progress and heartbeat on its own connection, at most once per interval.
+
+    Committing through the ORM session would expire the work items the
+    generator is still using, so progress bypasses the session.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.last_write = 0.0
+
+    def __call__(self, done):
+        now = time.monotonic()
+        if now - self.last_write < PROGRESS_INTERVAL_SECONDS:
+            return
+        self.last_write = now
+        with db.engine.begin() as conn:
+            conn.execute(
+                db.update(ExportJob).where(ExportJob.id == self.job_id)
+                .values(progress=done, heartbeat_at=datetime.utcnow())
+            )
+
+
+def _store_result(job, filename, fileobj):
+    key = f'{EXPORT_PREFIX}{job.id}_{filename}'
+    fileobj.seek(0)
+    get_docs_storage().save(key, fileobj)
+    return key, filename
+
+
+def _run_single(job, item_ids, progress):
+    filename = generate_docx(item_ids[0])
+    progress(1)
+    return filename, filename
+
+
+def _run_zip(job, item_ids, progress):
+    filenames = generate_multiple_docx(item_ids, progress)
+    if not filenames:
+        raise RuntimeError('No documents generated')
+
+    docs_storage = get_docs_storage()
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as output:
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for filename in filenames:
+                with docs_storage.open(filename) as src, zf.open(filename, 'w') as dest:
+                    shutil.copyfileobj(src, dest)
+        return _store_result(job, 'work_items_batch.zip', output)
+
+
+def _run_combined(job, item_ids, progress):
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as output:
+        if not generate_combined_docx(item_ids, output, progress):
+            raise RuntimeError('No documents generated')
+        filename = f'work_items_package_{job.created_at.strftime("%Y%m%d")}.docx'
+        return _store_result(job, filename, output)
+
+
+def _run_parquet(job, item_ids, progress):
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as output:
+        write_parquet(iter_batches(), output, progress)
+        return _store_result(job, export_filename('parquet', job.created_at), output)
+
+
+_RUNNERS = {
+    'single': _run_single,
+    'backup': _run_single,
+    'zip': _run_zip,
+    'combined': _run_combined,
+    'parquet': _run_parquet,
+}
+
+
+def run_job(job):
+    """Generate a claimed job's output and record the outcome."""
+    job_id = job.id
+    item_ids = json.loads(job.item_ids)
+    started = time.perf_counter()
+
+    try:
+        result_key, result_name = _RUNNERS[job.kind](job, item_ids, _ProgressReporter(job_id))
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(f'Export job {job_id} failed')
+        job = db.session.get(ExportJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        job = db.session.get(ExportJob, job_id)
+        job.status = 'done'
+        job.progress = job.total
+        job.result_key = result_key
+        job.result_name = result_name
+        job.error = None
+
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    logger.info(f'Export job {job_id} ({job.kind}) {job.status} in {time.perf_counter() - started:.1f}s')
+    return job
+
+
+def requeue_stale_jobs():
+    """Re-queue (or fail) running jobs whose worker stopped reporting progress."""
+    config = current_app.config
+    cutoff = datetime.utcnow() - timedelta(seconds=config['EXPORT_JOB_TIMEOUT_SECONDS'])
+    stale = ExportJob.query.filter(
+        ExportJob.status == 'running',
+        db.func.coalesce(ExportJob.heartbeat_at, ExportJob.started_at) < cutoff
+    ).all()
+
+    for job in stale:
+        if job.attempts < config['EXPORT_JOB_MAX_ATTEMPTS']:
+            job.status = 'queued'
+            job.worker_id = None
+        else:
+            job.status = 'failed'
+            job.error = 'Export did not finish; the worker may have been restarted.'
+            job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return len(stale)
+
+
+def purge_expired_jobs():
+    """Delete finished jobs past the retention period and their export files."""
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config['EXPORT_JOB_RETENTION_HOURS'])
+    expired = ExportJob.query.filter(
+        ExportJob.status.in_(['done', 'failed']),
+        ExportJob.finished_at < cutoff
+    ).all()
+
+    docs_storage = get_docs_storage()
+    for job in expired:
+        # single/backup results are the regular generated documents; the GC owns those
+        if job.result_key and job.result_key.startswith(EXPORT_PREFIX):
+            try:
+                docs_storage.delete(job.result_key)
+            except Exception as e:
+                logger.error(f'Could not remove export {job.result_key}: {e}')
+        db.session.delete(job)
+    db.session.commit()
+    return len(expired)
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def run_worker(app, worker_id=None, once=False, stop_event=None):
+    """Process export jobs until stopped.
+
+    With ``once`` the worker exits as soon as the queue is empty.
+    """
+    worker_id = worker_id or default_worker_id()
+    stop_event = stop_event or threading.Event()
+    last_housekeeping = 0.0
+
+    with app.app_context():
+        poll_interval = app.config['EXPORT_WORKER_POLL_SECONDS']
+        logger.info(f'Export worker {worker_id} started')
+
+        while not stop_event.is_set():
+            try:
+                if time.monotonic() - last_housekeeping > HOUSEKEEPING_INTERVAL_SECONDS:
+                    requeue_stale_jobs()
+                    purge_expired_jobs()
+                    last_housekeeping = time.monotonic()
+
+                job = claim_next_job(worker_id)
+                if job is not None:
+                    run_job(job)
+                    continue
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f'Export worker error: {e}')
+            finally:
+                db.session.remove()
+
+            if once:
+                break
+            stop_event.wait(poll_interval)
+
+
+def start_embedded_worker(app):
+    """Start an in-process worker thread when EXPORT_WORKER_EMBEDDED is set.
+
+    Called by the served app (run.py) only, so scripts that create an app
+    (migrations, worker.py, exports) never claim jobs they would abandon
+    on exit. In a gevent worker a ``threading.Thread`` would be a greenlet
+    and document generation would stall every request on the hub, so the
+    worker gets a native thread from its own gevent thread pool instead.
+    """
+    if not app.config.get('EXPORT_WORKER_EMBEDDED'):
+        return
+
+    if _gevent_patched():
+        from gevent.threadpool import ThreadPool
+        pool = ThreadPool(1)
+        pool.spawn(run_worker, app)
+        app.extensions['export_worker'] = pool
+        return
+
+    thread = threading.Thread(target=run_worker, args=(app,), name='export-worker', daemon=True)
+    thread.start()
+    app.extensions['export_worker'] = thread
+
+
+def _gevent_patched():
+    """True inside a gevent worker, where ``threading`` is monkey-patched."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
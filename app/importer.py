@@ -0,0 +1,279 @@
+"""Bulk import of work items from CSV or XLSX.
+
+A yard period starts with hundreds (or thousands) of scope items; entering
+them one crew form at a time does not scale. ``import_items`` reads a CSV
+(or, with ``openpyxl`` installed, an XLSX) file row by row, validates each
+row, and upserts on ``item_number`` in chunks of IMPORT_CHUNK_SIZE rows:
+one ``INSERT ... ON CONFLICT (item_number) DO UPDATE`` executed for the
+chunk's new items (PostgreSQL and SQLite; other databases fall back to an
+INSERT per row) and one UPDATE executed for its existing items, committed
+per chunk. Only one chunk is held in memory, so file size does not matter.
+
+The first row names the columns (case and spaces ignored, e.g.
+``Item Number``); ``item_number``, ``location``, ``description`` and
+``detail`` are required. Existing items get the non-empty cells of their
+row (an empty cell leaves that column as it is) and a new ``version`` (so
+open edit forms see a conflict instead of overwriting the import), and
+status changes are recorded in their status history; new items get the
+crew form's defaults for empty cells. Invalid rows are skipped and
+reported with their line numbers.
+
+An import is an upsert, so re-running a file after a failure part-way
+through is safe. The bulk statements bypass the counter hooks, so the
+counters are rebuilt at the end.
+
+Used by ``python import_items.py`` and the admin Import page.
+"""
+import csv
+import io
+import logging
+import os
+import time
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.counters import rebuild_counters
+from app.models import StatusHistory, WorkItem
+
+
+logger = logging.getLogger(__name__)
+
+IMPORT_COLUMNS = ('item_number', 'location', 'ns_equipment', 'description', 'detail',
+                  'references', 'status', 'assigned_to', 'submitter_name')
+REQUIRED_COLUMNS = ('item_number', 'location', 'description', 'detail')
+COLUMN_ALIASES = {'ofm': 'references', 'operator_furnished_material': 'references'}
+REVISION_STATUSES = ('Needs Revision', 'Awaiting Photos')
+MAX_REPORTED_ERRORS = 50
+
+
+class ImportFileError(ValueError):
+    """The file cannot be imported at all (format or header)."""
+
+
+def _column_name(header):
+    name = '_'.join(str(header or '').strip().lower().replace('-', ' ').split())
+    return COLUMN_ALIASES.get(name, name)
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Spreadsheet numbers, e.g. item 101 stored as 101.0
+    return str(value).strip()
+
+
+def _read_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()  # Leave the caller's stream open
+
+
+def _read_xlsx(stream):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportFileError('XLSX import needs openpyxl (pip install openpyxl); save the sheet as CSV instead')
+
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield [_cell_text(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def read_rows(stream, filename):
+    """Return ``(columns, rows)``: the normalized header and an iterator of
+    ``(line_number, {column: text})`` for each non-empty row."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.csv':
+        lines = _read_csv(stream)
+    elif ext == '.xlsx':
+        lines = _read_xlsx(stream)
+    else:
+        raise ImportFileError(f'Unsupported file type {ext or filename!r}; use .csv or .xlsx')
+
+    header = next(lines, None)
+    if not header:
+        raise ImportFileError('The file is empty')
+    columns = [_column_name(name) for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ImportFileError(f'Missing required column(s): {", ".join(missing)}')
+
+    def rows():
+        for line_number, values in enumerate(lines, start=2):
+            record = {column: value.strip() for column, value in zip(columns, values)
+                      if column in IMPORT_COLUMNS}
+            if any(record.values()):
+                yield line_number, record
+
+    return [name for name in IMPORT_COLUMNS if name in columns], rows()
+
+
+def _validate(record, columns, status_options):
+    """Return the row's non-empty column values, or raise ValueError."""
+    table = WorkItem.__table__
+    values = {}
+    for name in columns:
+        value = record.get(name, '')
+        if not value:
+            if name in REQUIRED_COLUMNS:
+                raise ValueError(f'{name} is required')
+            continue
+        length = getattr(table.c[name].type, 'length', None)
+        if length and len(value) > length:
+            raise ValueError(f'{name} is longer than {length} characters')
+        values[name] = value
+
+    if 'status' in values and values['status'] not in status_options:
+        raise ValueError(f'unknown status {values["status"]!r}')
+    return values
+
+
+def _upsert_statement(dialect_name, update_columns):
+    table = WorkItem.__table__
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+
+    stmt = insert(table)
+    set_ = {name: stmt.excluded[name] for name in update_columns}
+    set_['version'] = table.c.version + 1
+    return stmt.on_conflict_do_update(index_elements=[table.c.item_number], set_=set_)
+
+
+def _update_statement(update_columns):
+    """UPDATE of one existing item per parameter set; a NULL keeps the stored value."""
+    table = WorkItem.__table__
+    values = {name: db.func.coalesce(db.bindparam(f'new_{name}'), table.c[name]) for name in update_columns}
+    if 'status' in update_columns:
+        # Constant parameters: an expanding IN cannot be used with executemany
+        values['needs_revision'] = values['status'].in_([db.literal(status) for status in REVISION_STATUSES])
+    values.update(last_modified_by=db.bindparam('new_last_modified_by'),
+                  last_modified_at=db.bindparam('new_last_modified_at'),
+                  version=table.c.version + 1)
+    return table.update().where(table.c.item_number == db.bindparam('new_item_number')).values(values)
+
+
+def _write_chunk(chunk, columns, imported_by, notes):
+    """Upsert ``{item_number: values}``; return (created, updated)."""
+    table = WorkItem.__table__
+    existing = {
+        item_number: (item_id, status)
+        for item_id, item_number, status in db.session.execute(
+            db.select(table.c.id, table.c.item_number, table.c.status)
+            .where(table.c.item_number.in_(list(chunk)))
+        )
+    }
+
+    now = datetime.utcnow()
+    update_columns = [name for name in columns if name != 'item_number']
+    new_rows, updates, history = [], [], []
+    for item_number, values in chunk.items():
+        if item_number in existing:
+            # Columns with an empty cell are passed as NULL and left unchanged
+            updates.append({
+                **{f'new_{name}': values.get(name) for name in columns},
+                'new_last_modified_by': imported_by,
+                'new_last_modified_at': now,
+            })
+            item_id, old_status = existing[item_number]
+            if values.get('status', old_status) != old_status:
+                history.append({'work_item_id': item_id, 'old_status': old_status, 'new_status': values['status'],
+                                'changed_by': imported_by, 'changed_at': now, 'notes': notes})
+            continue
+
+        row = {
+            'ns_equipment': 'N/A',
+            'references': None,
+            'status': 'Submitted',
+            'assigned_to': None,
+            'submitter_name': imported_by,
+            'submitted_at': now,
+            'last_modified_by': imported_by,
+            'last_modified_at': now,
+            **values,
+        }
+        row['original_submitter'] = row['submitter_name']
+        row['needs_revision'] = row['status'] in REVISION_STATUSES
+        row['version'] = 1
+        new_rows.append(row)
+
+    if new_rows:
+        # One executemany needs the same keys in every row
+        keys = set().union(*new_rows)
+        new_rows = [{key: row.get(key) for key in keys} for row in new_rows]
+        stmt = _upsert_statement(db.engine.dialect.name, update_columns + ['last_modified_by', 'last_modified_at'])
+        if stmt is not None:
+            # executemany of one compiled statement; on PostgreSQL SQLAlchemy
+            # sends it as multi-row VALUES batches ("insertmanyvalues")
+            db.session.execute(stmt, new_rows)
+        else:
+            for row in new_rows:
+                db.session.execute(table.insert().values(row))
+    if updates:
+        db.session.execute(_update_statement(update_columns), updates)
+    if history:
+        db.session.execute(StatusHistory.__table__.insert(), history)
+    db.session.commit()
+    return len(new_rows), len(updates)
+
+
+def import_items(stream, filename, imported_by, chunk_size=None):
+    """Import work items from a CSV/XLSX stream; return a summary dict.
+
+    The summary has ``rows`` (data rows read), ``created``, ``updated``,
+    ``skipped``, ``errors`` (up to MAX_REPORTED_ERRORS ``(line, message)``
+    pairs), ``seconds`` and ``rows_per_second``. Raises ImportFileError if
+    the file cannot be read at all.
+    """
+    chunk_size = chunk_size or current_app.config['IMPORT_CHUNK_SIZE']
+    status_options = current_app.config['STATUS_OPTIONS']
+    started = time.perf_counter()
+
+    columns, rows = read_rows(stream, filename)
+    notes = f'Imported from {filename}'
+    result = {'rows': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'errors': []}
+    chunk = {}
+
+    def flush():
+        created, updated = _write_chunk(chunk, columns, imported_by, notes)
+        result['created'] += created
+        result['updated'] += updated
+        chunk.clear()
+
+    try:
+        for line_number, record in rows:
+            result['rows'] += 1
+            try:
+                values = _validate(record, columns, status_options)
+            except ValueError as e:
+                result['skipped'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append((line_number, str(e)))
+                continue
+            # Rows for the same item are merged, later cells winning (one statement cannot update a row twice)
+            chunk[values['item_number']] = {**chunk.get(values['item_number'], {}), **values}
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if result['created'] or result['updated']:
+            rebuild_counters()
+
+    result['seconds'] = time.perf_counter() - started
+    result['rows_per_second'] = result['rows'] / result['seconds'] if result['seconds'] else 0.0
+    logger.info(f"Imported {filename}: {result['created']} created, {result['updated']} updated, "
+                f"{result['skipped']} skipped in {result['seconds']:.1f}s")
+    return result
@@ -28,11 +28,17 @@ class WorkItem(db.Model):
     admin_notes = db.Column(db.Text)
     admin_notes_updated_at = db.Column(db.DateTime)
 
+    # Optimistic locking: every UPDATE checks and increments this
+    # (see app/conflicts.py)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
     # Relationships
     photos = db.relationship('Photo', backref='work_item', lazy=True, cascade='all, delete-orphan')
     comments = db.relationship('Comment', backref='work_item', lazy=True, cascade='all, delete-orphan')
     history = db.relationship('StatusHistory', backref='work_item', lazy=True, cascade='all, delete-orphan')
 
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
         return f'<WorkItem {self.item_number}>'
 
@@ -41,9 +47,16 @@ class Photo(db.Model):
     __tablename__ = 'photos'
 
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String(200), nullable=False)
+    filename = db.Column(db.String(200), nullable=False, index=True)  # Blob key, e.g. 3f/a2/<sha256>.jpg
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the processed image
     caption = db.Column(db.String(500), nullable=False)
     work_item_id = db.Column(db.Integer, db.ForeignKey('work_items.id'), nullable=False)
+    # Metadata of the stored image, so pages can lay photos out without reading them
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    byte_size = db.Column(db.Integer)
+    placeholder = db.Column(db.Text)  # Tiny blurred JPEG as a data: URI (see utils.make_placeholder)
+    perceptual_hash = db.Column(db.String(16))  # dHash as hex, for near-duplicate detection (see app.photo_index)
 
     def __repr__(self):
         return f'<Photo {self.filename}>'
@@ -51,7 +64,10 @@ class Photo(db.Model):
 
 class Comment(db.Model):
     __tablename__ = 'comments'
-    
+    __table_args__ = (
+        db.Index('ix_comments_item_created', 'work_item_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     work_item_id = db.Column(db.Integer, db.ForeignKey('work_items.id'), nullable=False)
     author_name = db.Column(db.String(100), nullable=False)
@@ -65,7 +81,11 @@ class Comment(db.Model):
 
 class StatusHistory(db.Model):
     __tablename__ = 'status_history'
-    
+    __table_args__ = (
+        db.Index('ix_status_history_item_changed', 'work_item_id', 'changed_at'),
+        db.Index('ix_status_history_status_changed', 'new_status', 'changed_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     work_item_id = db.Column(db.Integer, db.ForeignKey('work_items.id'), nullable=False)
     old_status = db.Column(db.String(20))
@@ -76,3 +96,58 @@ class StatusHistory(db.Model):
     
     def __repr__(self):
         return f'<StatusHistory {self.work_item_id}: {self.new_status}>'
+
+
+class SyncReceipt(db.Model):
+    __tablename__ = 'sync_receipts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    work_item_id = db.Column(db.Integer, db.ForeignKey('work_items.id', ondelete='SET NULL'))
+    item_number = db.Column(db.String(50), nullable=False)
+    submitter_name = db.Column(db.String(100), nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SyncReceipt {self.idempotency_key}: {self.item_number}>'
+
+
+class ExportJob(db.Model):
+    __tablename__ = 'export_jobs'
+    __table_args__ = (db.Index('ix_export_jobs_status_created', 'status', 'created_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # single, zip, combined, backup, parquet
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    item_ids = db.Column(db.Text, nullable=False)  # JSON list of work item ids
+    requested_by = db.Column(db.String(100))
+    progress = db.Column(db.Integer, default=0)
+    total = db.Column(db.Integer, default=0)
+    attempts = db.Column(db.Integer, default=0)
+    worker_id = db.Column(db.String(100))
+    result_key = db.Column(db.String(300))  # Key in the docs store
+    result_name = db.Column(db.String(200))  # Download filename
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Last progress report of the running worker
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def percent(self):
+        return int(100 * self.progress / self.total) if self.total else 0
+
+    def __repr__(self):
+        return f'<ExportJob {self.id}: {self.kind} {self.status}>'
+
+
+class WorkItemCounter(db.Model):
+    """Maintained aggregate counts of work items (see app/counters.py)."""
+    __tablename__ = 'work_item_counters'
+
+    dimension = db.Column(db.String(20), primary_key=True)  # total, status, assignee, submitter, ...
+    key = db.Column(db.String(100), primary_key=True, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<WorkItemCounter {self.dimension}:{self.key}={self.count}>'
@@ -1,15 +1,26 @@
-"""SMS Notification System using Twilio."""
+"""SMS Notification System using Twilio.
+
+The client is created once per process and reuses its HTTP connection pool.
+Requests go through ``requests`` with TWILIO_TIMEOUT, so a slow Twilio API
+cannot hold a request thread indefinitely; under the gevent serving mode
+the patched sockets make the call cooperative.
+"""
 import logging
+import threading
 from flask import current_app
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
 from twilio.base.exceptions import TwilioRestException
 
 
 logger = logging.getLogger(__name__)
 
+_clients = {}
+_clients_lock = threading.Lock()
+
 
 def get_twilio_client():
-    """Initialize and return Twilio client."""
+    """Return the process-wide Twilio client for the configured account."""
     account_sid = current_app.config.get('TWILIO_ACCOUNT_SID')
     auth_token = current_app.config.get('TWILIO_AUTH_TOKEN')
 
@@ -17,7 +28,13 @@ def get_twilio_client():
         logger.warning('Twilio credentials not configured')
         return None
 
-    return Client(account_sid, auth_token)
+    with _clients_lock:
+        client = _clients.get((account_sid, auth_token))
+        if client is None:
+            http_client = TwilioHttpClient(timeout=current_app.config.get('TWILIO_TIMEOUT', 10))
+            client = Client(account_sid, auth_token, http_client=http_client)
+            _clients[(account_sid, auth_token)] = client
+        return client
 
 
 def send_sms(to_number, message):
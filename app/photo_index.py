@@ -0,0 +1,231 @@
+"""Near-duplicate photo detection.
+
+Crews often attach the same shot, or near-identical ones, to several work
+items. Byte-identical uploads already share one blob (``app.blob_store``),
+but a re-encoded, resized or re-taken copy does not. Each Photo stores a
+64-bit perceptual hash (``utils.perceptual_hash``), and copies of one
+shot hash within a few bits of each other; PHOTO_DUPLICATE_DISTANCE is
+the largest Hamming distance treated as a likely duplicate.
+
+The hashes are kept in a multi-index hash (``MultiIndexHash``): one table
+per 16-bit slice of the hash, so a search looks up a few dozen buckets
+instead of comparing against every photo, and checking an upload against
+tens of thousands of photos takes well under a millisecond (a BK-tree,
+at these distances over 64-bit hashes, visits most of its nodes and is
+no faster than a scan). Each worker process
+builds the index on first use and tops it up before every search with
+photos added since (by id), reading on its own connection so only
+committed photos are indexed. Ids can commit out of order, so ids skipped
+among the last INDEX_GAP_WINDOW are looked up again on later refreshes
+until they show up or fall out of the window (rolled back or deleted
+photos never do). Photos deleted since are dropped when the
+matches are loaded from the database. Hashes backfilled into existing rows
+are picked up when the process restarts.
+"""
+import threading
+from itertools import combinations
+from flask import current_app
+from app import db
+from app.models import Photo, WorkItem
+
+
+MAX_DUPLICATE_GROUPS = 100
+# Skipped photo ids this far below the newest indexed id are retried on refresh
+INDEX_GAP_WINDOW = 1000
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two integer hashes."""
+    return bin(a ^ b).count('1')
+
+
+def _flip_masks(bits, max_flips):
+    """All masks of ``bits`` bits with at most ``max_flips`` bits set."""
+    return [sum(1 << bit for bit in flipped)
+            for flips in range(max_flips + 1)
+            for flipped in combinations(range(bits), flips)]
+
+
+class MultiIndexHash:
+    """Multi-index hashing of 64-bit hashes under Hamming distance.
+
+    Each hash is split into CHUNKS 16-bit chunks, and each chunk position
+    has a table from chunk value to the hashes having it. Two hashes at
+    most ``r`` bits apart differ in at most ``r // CHUNKS`` bits in at least
+    one chunk (pigeonhole), so a search only looks up each chunk of the
+    query with up to that many bits flipped, then checks the full distance
+    of the few hashes found. Items with an equal hash are kept together.
+    """
+    CHUNKS = 4
+    CHUNK_BITS = 16
+
+    def __init__(self):
+        self._items = {}  # hash -> [items]
+        self._tables = [{} for _ in range(self.CHUNKS)]  # chunk value -> [hashes]
+        self._masks = {}
+        self.size = 0
+
+    def _chunks(self, value):
+        mask = (1 << self.CHUNK_BITS) - 1
+        return [(value >> (n * self.CHUNK_BITS)) & mask for n in range(self.CHUNKS)]
+
+    def add(self, value, item):
+        self.size += 1
+        items = self._items.get(value)
+        if items is not None:
+            items.append(item)
+            return
+        self._items[value] = [item]
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            table.setdefault(chunk, []).append(value)
+
+    def search(self, value, radius):
+        """Return ``(distance, item)`` for every item within ``radius`` bits."""
+        max_flips = radius // self.CHUNKS
+        masks = self._masks.get(max_flips)
+        if masks is None:
+            masks = self._masks[max_flips] = _flip_masks(self.CHUNK_BITS, max_flips)
+
+        candidates = set()
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            for mask in masks:
+                bucket = table.get(chunk ^ mask)
+                if bucket:
+                    candidates.update(bucket)
+
+        found = []
+        for candidate in candidates:
+            distance = hamming_distance(value, candidate)
+            if distance <= radius:
+                found.extend((distance, item) for item in self._items[candidate])
+        return found
+
+    def nodes(self):
+        """Return ``(hash, items)`` for every distinct hash in the index."""
+        return list(self._items.items())
+
+
+class _PhotoIndex:
+    """Process-wide index of ``(photo id, work item id)`` by perceptual hash."""
+
+    def __init__(self):
+        self.hashes = MultiIndexHash()
+        self.last_id = 0
+        self.missing_ids = set()  # skipped ids within INDEX_GAP_WINDOW of last_id
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Add photos committed since the last refresh. Call with the lock held."""
+        new_photos = Photo.id > self.last_id
+        if self.missing_ids:
+            new_photos = db.or_(new_photos, Photo.id.in_(sorted(self.missing_ids)))
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                db.select(Photo.id, Photo.work_item_id, Photo.perceptual_hash)
+                .where(new_photos, Photo.perceptual_hash.isnot(None))
+                .order_by(Photo.id)
+            ).all()
+        if not rows:
+            return
+
+        last_id = max(self.last_id, rows[-1][0])
+        gap_start = max(self.last_id, last_id - INDEX_GAP_WINDOW)
+        missing = self.missing_ids | set(range(gap_start + 1, last_id + 1))
+        for photo_id, work_item_id, hash_hex in rows:
+            self.hashes.add(int(hash_hex, 16), (photo_id, work_item_id))
+            missing.discard(photo_id)
+        self.missing_ids = {photo_id for photo_id in missing if photo_id > last_id - INDEX_GAP_WINDOW}
+        self.last_id = last_id
+
+
+_index = _PhotoIndex()
+
+
+def reset_index():
+    """Forget the loaded index; the next search rebuilds it."""
+    global _index
+    _index = _PhotoIndex()
+
+
+def _load_photos(photo_ids):
+    """Current Photo rows (with item numbers) of the given ids, by id."""
+    if not photo_ids:
+        return {}
+    with db.engine.connect() as connection:
+        rows = connection.execute(
+            db.select(Photo.id, Photo.filename, Photo.caption, Photo.work_item_id, Photo.width,
+                      Photo.height, WorkItem.item_number)
+            .join(WorkItem, WorkItem.id == Photo.work_item_id)
+            .where(Photo.id.in_(list(photo_ids)))
+        ).all()
+    return {row.id: row._asdict() for row in rows}
+
+
+def find_similar(hash_hex, exclude_work_item_id=None, max_distance=None):
+    """Return existing photos that look like a photo with hash ``hash_hex``.
+
+    Each match is a dict of the photo's id, filename, caption, work item id
+    and item number, and the ``distance`` in bits, closest first. Photos of
+    ``exclude_work_item_id`` are left out.
+    """
+    if max_distance is None:
+        max_distance = current_app.config['PHOTO_DUPLICATE_DISTANCE']
+    index = _index
+    with index.lock:
+        index.refresh()
+        found = index.hashes.search(int(hash_hex, 16), max_distance)
+
+    distances = {photo_id: distance for distance, (photo_id, work_item_id) in found
+                 if work_item_id != exclude_work_item_id}
+    photos = _load_photos(distances)
+    return sorted(({**photo, 'distance': distances[photo_id]} for photo_id, photo in photos.items()),
+                  key=lambda match: (match['distance'], match['id']))
+
+
+def find_duplicate_groups(max_distance=None, limit=MAX_DUPLICATE_GROUPS):
+    """Group photos that look alike across two or more work items.
+
+    Photos are linked when their hashes are within ``max_distance`` bits,
+    and each connected group spanning several work items is returned as a
+    list of photo dicts (see ``find_similar``), largest groups first, at
+    most ``limit`` groups.
+    """
+    if max_distance is None:
+        max_distance = current_app.config['PHOTO_DUPLICATE_DISTANCE']
+    index = _index
+    parent = {}
+
+    def root(photo_id):
+        while parent.setdefault(photo_id, photo_id) != photo_id:
+            parent[photo_id] = parent[parent[photo_id]]
+            photo_id = parent[photo_id]
+        return photo_id
+
+    def union(a, b):
+        parent[root(a)] = root(b)
+
+    work_items = {}
+    with index.lock:
+        index.refresh()
+        for value, items in index.hashes.nodes():
+            first = items[0][0]
+            for photo_id, work_item_id in items:
+                work_items[photo_id] = work_item_id
+                union(photo_id, first)
+            for _, (photo_id, _) in index.hashes.search(value, max_distance):
+                union(photo_id, first)
+
+    groups = {}
+    for photo_id in work_items:
+        groups.setdefault(root(photo_id), []).append(photo_id)
+    groups = [ids for ids in groups.values() if len({work_items[photo_id] for photo_id in ids}) > 1]
+    groups = sorted(groups, key=len, reverse=True)[:limit]
+
+    photos = _load_photos({photo_id for ids in groups for photo_id in ids})
+    result = []
+    for ids in groups:
+        group = sorted((photos[photo_id] for photo_id in ids if photo_id in photos),
+                       key=lambda photo: (photo['item_number'], photo['id']))
+        if len({photo['work_item_id'] for photo in group}) > 1:  # Unless photos were deleted since
+            result.append(group)
+    return result
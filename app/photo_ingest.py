@@ -0,0 +1,272 @@
+"""Photo ingestion shared by the crew and admin upload routes.
+
+Every route that accepts photos hands its (file, caption) pairs to
+``ingest_photos``. Files are processed concurrently in a small thread pool
+(Pillow releases the GIL while decoding and resampling), written to a
+temporary name and atomically renamed into the content-addressed blob
+store (see ``app.blob_store``). Blobs written for a submission that is
+then rolled back are left to the storage GC rather than deleted at once,
+as a concurrent request may already have deduplicated onto them.
+
+The crew photo manager downscales photos in the browser before uploading;
+those arrive as small JPEGs at PHOTO_MAX_WIDTH and are stored as uploaded
+instead of being re-encoded (see ``app.utils.resize_image``).
+
+Uploads are validated from their headers first (``check_uploads``):
+anything that is not a JPEG, PNG or HEIC image, or has more pixels than
+PHOTO_MAX_PIXELS (or PHOTO_REQUEST_MAX_PIXELS for the photos of one
+submission together), is rejected before any pixel is decoded.
+
+Each Photo row records the stored image's width, height, size in bytes
+and a tiny placeholder, so pages can reserve the photo's space and show
+its colours without opening the file, and a perceptual hash: uploads that
+look like a photo of another work item are flashed as a warning once the
+submission commits (see ``app.photo_index``).
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, flash, g, has_request_context
+from app import db
+from app.blob_store import publish_blob
+from app.models import Photo
+from app.photo_index import find_similar
+from app.storage import get_upload_storage
+from app.utils import allowed_file, generate_unique_filename, make_placeholder, perceptual_hash, probe_image, \
+    resize_image
+
+
+logger = logging.getLogger(__name__)
+
+TEMP_PREFIX = '.tmp-'
+MAX_DUPLICATE_ITEMS_SHOWN = 3
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _gevent_patched():
+    """True inside a gevent worker, where ``threading`` is monkey-patched."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def _get_executor(max_workers):
+    """Return the per-process ingestion pool, creating it on first use.
+
+    Under gevent a patched ThreadPoolExecutor would run the resizing on
+    greenlets and block the hub, so gevent's native-thread pool is used.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if _gevent_patched():
+                    from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+                    _executor = NativeThreadPoolExecutor(max_workers=max_workers)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                   thread_name_prefix='photo-ingest')
+    return _executor
+
+
+class UploadRejected(ValueError):
+    """An upload is not an accepted image, or has too many pixels to process."""
+
+
+def check_uploads(uploads):
+    """Validate (file, caption) pairs from their headers, before any decoding.
+
+    Each file's format is sniffed from its magic bytes and its size read
+    from the image header. Raises UploadRejected for a file that is not a
+    JPEG, PNG or HEIC image, one larger than PHOTO_MAX_PIXELS, or when the
+    uploads together exceed PHOTO_REQUEST_MAX_PIXELS, so a 100 MP photo (or
+    a crafted header claiming one) never reaches Pillow's decoder or ties
+    up a worker. The total covers one call: a sync batch checks each
+    submission's photos on their own, as they are processed one at a time.
+    """
+    max_pixels = current_app.config['PHOTO_MAX_PIXELS']
+    request_max_pixels = current_app.config['PHOTO_REQUEST_MAX_PIXELS']
+    request_pixels = 0
+
+    for photo_file, _ in uploads:
+        try:
+            _, width, height = probe_image(photo_file.stream)
+        except ValueError as e:
+            raise UploadRejected(f'{photo_file.filename}: {e}')
+
+        if width * height > max_pixels:
+            raise UploadRejected(f'{photo_file.filename} is {width}x{height} pixels; '
+                                 f'photos can have at most {max_pixels / 1e6:g} megapixels')
+        request_pixels += width * height
+        if request_pixels > request_max_pixels:
+            raise UploadRejected(f'The photos in this upload total more than {request_max_pixels / 1e6:g} '
+                                 f'megapixels; upload fewer or smaller photos at a time')
+
+
+def collect_photo_uploads(photo_files, photo_captions):
+    """Pair uploaded files with their captions, skipping empty or disallowed files."""
+    return [
+        (photo_file, caption)
+        for photo_file, caption in zip(photo_files, photo_captions)
+        if photo_file and photo_file.filename and allowed_file(photo_file.filename)
+    ]
+
+
+def _process_upload(photo_file, storage, max_width, passthrough_max_bytes):
+    """Save, resize and publish one upload to the blob store. Runs in a pool thread.
+
+    Returns ``(key, content_hash, created, metadata, timing)``; ``metadata``
+    holds the Photo's width, height, byte_size, placeholder and perceptual_hash.
+    """
+    started = time.perf_counter()
+    filename = generate_unique_filename(photo_file.filename)
+    temp_path = os.path.join(storage.scratch_dir, TEMP_PREFIX + filename)
+    processed_path = temp_path
+
+    try:
+        photo_file.save(temp_path)
+        saved = time.perf_counter()
+
+        # Returns a new .jpg path if a HEIC/HEIF original was converted
+        width, height, processed_path = resize_image(temp_path, max_width, passthrough_max_bytes)
+        if processed_path != temp_path:
+            os.remove(temp_path)
+        metadata = {
+            'width': width,
+            'height': height,
+            'byte_size': os.path.getsize(processed_path),
+            'placeholder': make_placeholder(processed_path),
+            'perceptual_hash': perceptual_hash(processed_path),
+        }
+        resized = time.perf_counter()
+
+        key, content_hash, created = publish_blob(storage, processed_path)
+    except Exception:
+        for path in {temp_path, processed_path}:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    finished = time.perf_counter()
+    return key, content_hash, created, metadata, {
+        'save_ms': round((saved - started) * 1000, 1),
+        'resize_ms': round((resized - saved) * 1000, 1),
+        'total_ms': round((finished - started) * 1000, 1),
+    }
+
+
+def ingest_photos(work_item_id, uploads, checked=False):
+    """Process (file, caption) pairs and add a Photo row for each to the session.
+
+    Returns the new Photo objects in upload order. The uploads are first
+    validated with ``check_uploads`` (unless the caller already did, with
+    ``checked``), so nothing is written if any of them is rejected. The
+    caller is responsible for committing; if the transaction is rolled back
+    instead, the files written here are left to the storage GC.
+    """
+    if not uploads:
+        return []
+    if not checked:
+        check_uploads(uploads)
+
+    storage = get_upload_storage()
+    max_width = current_app.config['PHOTO_MAX_WIDTH']
+    passthrough_max_bytes = current_app.config['PHOTO_PASSTHROUGH_MAX_BYTES']
+    executor = _get_executor(current_app.config['PHOTO_INGEST_WORKERS'])
+
+    futures = [
+        executor.submit(_process_upload, photo_file, storage, max_width, passthrough_max_bytes)
+        for photo_file, _ in uploads
+    ]
+
+    photos = []
+    timings = g.setdefault('photo_ingest_timings', [])
+    first_error = None
+
+    for future, (photo_file, caption) in zip(futures, uploads):
+        try:
+            key, content_hash, created, metadata, timing = future.result()
+        except Exception as e:
+            first_error = first_error or e
+            continue
+
+        timings.append(timing)
+        logger.info(f'Ingested photo {photo_file.filename} -> {key} '
+                    f'({"new" if created else "deduplicated"}, save {timing["save_ms"]}ms, '
+                    f'resize {timing["resize_ms"]}ms)')
+
+        photo = Photo(
+            filename=key,
+            content_hash=content_hash,
+            caption=caption or '',
+            work_item_id=work_item_id,
+            **metadata
+        )
+        db.session.add(photo)
+        photos.append(photo)
+
+    if first_error:
+        raise first_error
+
+    _note_duplicates(work_item_id, uploads, photos)
+    return photos
+
+
+def _note_duplicates(work_item_id, uploads, photos):
+    """Remember uploads that look like photos of other work items.
+
+    The warnings are flashed once the transaction commits (see
+    ``_flash_duplicates``).
+    """
+    duplicates = db.session.info.setdefault('photo_duplicates', [])
+    for (photo_file, _), photo in zip(uploads, photos):
+        matches = find_similar(photo.perceptual_hash, exclude_work_item_id=work_item_id)
+        if matches:
+            item_numbers = sorted({match['item_number'] for match in matches})
+            logger.info(f'Photo {photo_file.filename} looks like photos on {", ".join(item_numbers)}')
+            duplicates.append((photo_file.filename, item_numbers))
+
+
+def _flash_duplicates(session):
+    """The transaction committed: warn about the likely duplicates it added."""
+    duplicates = session.info.pop('photo_duplicates', None)
+    if duplicates and has_request_context():
+        for filename, item_numbers in duplicates:
+            shown = ', '.join(item_numbers[:MAX_DUPLICATE_ITEMS_SHOWN])
+            more = f' and {len(item_numbers) - MAX_DUPLICATE_ITEMS_SHOWN} more' \
+                if len(item_numbers) > MAX_DUPLICATE_ITEMS_SHOWN else ''
+            flash(f'{filename} looks like a photo already attached to {shown}{more}', 'warning')
+
+
+def _discard_duplicates(session, transaction):
+    """Drop the duplicate warnings of a transaction that ended without committing."""
+    if transaction.parent is None:
+        session.info.pop('photo_duplicates', None)
+
+
+def _add_server_timing(response):
+    """Expose per-photo ingestion timings via the Server-Timing header."""
+    timings = g.pop('photo_ingest_timings', None)
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(
+            f'photo-{idx};dur={timing["total_ms"]}'
+            for idx, timing in enumerate(timings, 1)
+        )
+    return response
+
+
+def init_app(app):
+    """Register the transaction hooks and timing header for photo ingestion."""
+    from sqlalchemy import event
+
+    if not event.contains(db.session, 'after_commit', _flash_duplicates):
+        event.listen(db.session, 'after_commit', _flash_duplicates)
+        event.listen(db.session, 'after_transaction_end', _discard_duplicates)
+
+    app.after_request(_add_server_timing)
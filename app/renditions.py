@@ -0,0 +1,151 @@
+"""Print renditions of stored photos for embedding in .docx files.
+
+Documents show every photo 4 inches wide, so embedding the stored JPEG as-is
+carries more pixels and bytes than the page can use. A rendition is the
+photo downscaled to ``PHOTO_WIDTH_INCHES`` at ``DOCX_PHOTO_DPI`` and
+re-encoded at ``DOCX_PHOTO_QUALITY``, stored next to the blobs in the upload
+store::
+
+    renditions/150/3f/a2/3fa2...e9.jpg
+
+Renditions are created on first use and reused by every later document. If
+a rendition would not be smaller than the stored photo, the photo itself is
+embedded. Blob keys are content-addressed and never change, so the parsed
+image (bytes plus header) is also kept in a process-wide LRU cache and
+shared by batch runs instead of being re-read and re-parsed per document.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from docx.image.image import Image as DocxImage
+from flask import current_app
+from PIL import Image
+from app.storage import get_upload_storage
+
+
+logger = logging.getLogger(__name__)
+
+PHOTO_WIDTH_INCHES = 4
+RENDITION_PREFIX = 'renditions/'
+
+
+def rendition_key(key, dpi):
+    """Return the store key of a photo's rendition at ``dpi``."""
+    return f'{RENDITION_PREFIX}{dpi}/{key}'
+
+
+def parse_rendition_key(key):
+    """Split a rendition key into ``(dpi, source key)``; None for other keys."""
+    if not key.startswith(RENDITION_PREFIX):
+        return None
+    dpi, _, source = key[len(RENDITION_PREFIX):].partition('/')
+    if not dpi.isdigit() or not source:
+        return None
+    return int(dpi), source
+
+
+def make_rendition(data, dpi, quality):
+    """Return JPEG bytes of an image scaled to the print width at ``dpi``."""
+    target_width = PHOTO_WIDTH_INCHES * dpi
+    with Image.open(BytesIO(data)) as img:
+        if img.width > target_width:
+            target_height = max(1, round(img.height * target_width / img.width))
+            # Let the JPEG decoder skip detail the rendition will not use
+            img.draft('RGB', (target_width, target_height))
+            img = img.convert('RGB').resize((target_width, target_height), Image.Resampling.LANCZOS)
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        output = BytesIO()
+        img.save(output, 'JPEG', quality=quality, optimize=True)
+        return output.getvalue()
+
+
+class _ImageCache:
+    """Thread-safe LRU of parsed docx images, bounded by total blob size."""
+
+    def __init__(self):
+        self._images = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def put(self, key, image, max_bytes):
+        with self._lock:
+            if key in self._images:
+                return
+            self._images[key] = image
+            self._bytes += len(image.blob)
+            while self._bytes > max_bytes and self._images:
+                _, evicted = self._images.popitem(last=False)
+                self._bytes -= len(evicted.blob)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
+
+
+_cache = _ImageCache()
+
+
+def _load_bytes(storage, key, dpi, quality):
+    """Return the bytes to embed for a photo, creating its rendition if needed."""
+    print_key = rendition_key(key, dpi)
+    if storage.exists(print_key):
+        return storage.read_bytes(print_key)
+
+    if not storage.exists(key):
+        return None
+    data = storage.read_bytes(key)
+
+    try:
+        rendition = make_rendition(data, dpi, quality)
+    except Exception as e:
+        logger.warning(f'Could not create print rendition for {key}: {e}')
+        return data
+
+    if len(rendition) >= len(data):
+        return data
+
+    storage.save(print_key, BytesIO(rendition))
+    return rendition
+
+
+def get_print_image(key, storage=None):
+    """Return the parsed docx image to embed for a stored photo.
+
+    Returns None if the photo is missing from the store.
+    """
+    config = current_app.config
+    dpi = config['DOCX_PHOTO_DPI']
+    cache_key = (key, dpi)
+
+    image = _cache.get(cache_key)
+    if image is not None:
+        return image
+
+    data = _load_bytes(storage or get_upload_storage(), key, dpi, config['DOCX_PHOTO_QUALITY'])
+    if data is None:
+        return None
+
+    image = DocxImage.from_blob(data)
+    image.sha1  # Computed lazily; hash once here rather than in every document
+    _cache.put(cache_key, image, config['DOCX_IMAGE_CACHE_MB'] * 1024 * 1024)
+    return image
+
+
+def release_renditions(key):
+    """Delete the current rendition of a photo whose blob has been removed."""
+    storage = get_upload_storage()
+    try:
+        storage.delete(rendition_key(key, current_app.config['DOCX_PHOTO_DPI']))
+    except Exception as e:
+        logger.error(f'Could not remove rendition of {key}: {e}')
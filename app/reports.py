@@ -0,0 +1,320 @@
+"""Turnaround and throughput reports built from the status history.
+
+Every work item is treated as a timeline of events: its submission
+(``work_items.submitted_at``, status Submitted) followed by its
+``status_history`` rows. From that timeline:
+
+* time in status - how long items stayed in each status before moving on
+  (``LEAD`` over each item's events), plus how many sit there now;
+* reviewer turnaround - how long an item waited before each reviewer acted
+  on it, grouped by ``changed_by`` (from the same ``LEAD`` pass);
+* cycle time - submission to first Completed Review;
+* weekly throughput - items reaching Completed Review per week, per assignee.
+
+On PostgreSQL and SQLite 3.25+ the aggregation is done in the database with
+window functions. Elsewhere the events are streamed in order and aggregated
+in Python, giving the same results. Reports are cached per process for the
+rest of the day; ``get_reports(refresh=True)`` recomputes them.
+"""
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from flask import current_app
+from app import db
+from app.models import StatusHistory, WorkItem
+
+
+COMPLETED_STATUS = 'Completed Review'
+SUBMITTED_STATUS = 'Submitted'
+DEFAULT_WEEKS = 12
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _hours(seconds):
+    return round(seconds / 3600, 1) if seconds is not None else None
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _to_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _uses_window_functions(dialect_name):
+    if dialect_name == 'postgresql':
+        return True
+    if dialect_name == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 25)
+    return False
+
+
+def _epoch_seconds(column, dialect_name):
+    if dialect_name == 'sqlite':
+        return (db.func.julianday(column) - 2440587.5) * 86400.0
+    return db.extract('epoch', column)
+
+
+def _week_of(column, dialect_name):
+    if dialect_name == 'sqlite':
+        # Monday of the column's week
+        return db.func.date(column, 'weekday 0', '-6 days')
+    return db.func.date_trunc('week', column)
+
+
+def _events(dialect_name=None):
+    """Submissions and status changes as one (work_item_id, status, changed_by, changed_at) set.
+
+    With ``dialect_name``, ``changed_at`` is converted to epoch seconds once
+    here so window functions and durations work on plain numbers.
+    """
+    def at(column):
+        return _epoch_seconds(column, dialect_name) if dialect_name else column
+
+    submissions = db.select(
+        WorkItem.id.label('work_item_id'),
+        db.literal(SUBMITTED_STATUS).label('status'),
+        WorkItem.submitter_name.label('changed_by'),
+        at(WorkItem.submitted_at).label('changed_at'),
+    ).where(WorkItem.submitted_at.isnot(None))
+    changes = db.select(
+        StatusHistory.work_item_id,
+        StatusHistory.new_status.label('status'),
+        StatusHistory.changed_by,
+        at(StatusHistory.changed_at).label('changed_at'),
+    ).where(StatusHistory.changed_at.isnot(None))
+    return db.union_all(submissions, changes).subquery('events')
+
+
+def _interval_stats_sql(dialect_name, now):
+    """Time in status and reviewer turnaround from a single windowed pass.
+
+    Each event's interval ends at the item's next event; the person who made
+    that next change is the one the item was waiting on.
+    """
+    events = _events(dialect_name)
+    window = {'partition_by': events.c.work_item_id, 'order_by': events.c.changed_at}
+    intervals = db.select(
+        events.c.status,
+        events.c.changed_at.label('entered_at'),
+        db.func.lead(events.c.changed_at).over(**window).label('left_at'),
+        db.func.lead(events.c.changed_by).over(**window).label('left_by'),
+    ).subquery('intervals')
+
+    closed = intervals.c.left_at - intervals.c.entered_at
+    open_ = now.replace(tzinfo=timezone.utc).timestamp() - intervals.c.entered_at
+    rows = db.session.execute(
+        db.select(
+            intervals.c.status,
+            intervals.c.left_by,
+            db.func.count(),
+            db.func.sum(closed),
+            db.func.max(closed),
+            db.func.sum(db.case((intervals.c.left_at.is_(None), open_), else_=None)),
+        ).group_by(intervals.c.status, intervals.c.left_by)
+    )
+
+    by_status = defaultdict(lambda: {'closed': 0, 'closed_sum': 0.0, 'closed_max': None, 'open': 0, 'open_sum': 0.0})
+    by_reviewer = defaultdict(lambda: {'actions': 0, 'sum': 0.0, 'max': None})
+    for status, left_by, count, closed_sum, closed_max, open_sum in rows:
+        stats = by_status[status]
+        if left_by is None:
+            stats['open'] += count
+            stats['open_sum'] += open_sum or 0.0
+            continue
+        stats['closed'] += count
+        stats['closed_sum'] += closed_sum
+        stats['closed_max'] = max(stats['closed_max'] or 0.0, closed_max)
+        reviewer = by_reviewer[left_by]
+        reviewer['actions'] += count
+        reviewer['sum'] += closed_sum
+        reviewer['max'] = max(reviewer['max'] or 0.0, closed_max)
+
+    time_in_status = [
+        {
+            'status': status,
+            'transitions': stats['closed'],
+            'avg_hours': _hours(stats['closed_sum'] / stats['closed']) if stats['closed'] else None,
+            'max_hours': _hours(stats['closed_max']),
+            'current': stats['open'],
+            'current_avg_hours': _hours(stats['open_sum'] / stats['open']) if stats['open'] else None,
+        }
+        for status, stats in by_status.items()
+    ]
+    turnaround = [
+        {'reviewer': reviewer, 'actions': stats['actions'], 'avg_hours': _hours(stats['sum'] / stats['actions']),
+         'max_hours': _hours(stats['max'])}
+        for reviewer, stats in by_reviewer.items()
+    ]
+    return time_in_status, turnaround
+
+
+def _cycle_times_sql(dialect_name):
+    completed = db.select(
+        StatusHistory.work_item_id,
+        db.func.min(StatusHistory.changed_at).label('completed_at'),
+    ).where(StatusHistory.new_status == COMPLETED_STATUS).group_by(StatusHistory.work_item_id).subquery()
+
+    seconds = (_epoch_seconds(completed.c.completed_at, dialect_name)
+               - _epoch_seconds(WorkItem.submitted_at, dialect_name))
+    return sorted(
+        value for (value,) in db.session.execute(
+            db.select(seconds).join(completed, completed.c.work_item_id == WorkItem.id)
+            .where(WorkItem.submitted_at.isnot(None))
+        )
+    )
+
+
+def _throughput_sql(dialect_name, since):
+    week = _week_of(StatusHistory.changed_at, dialect_name).label('week')
+    rows = db.session.execute(
+        db.select(week, WorkItem.assigned_to, db.func.count(db.distinct(StatusHistory.work_item_id)))
+        .join(WorkItem, WorkItem.id == StatusHistory.work_item_id)
+        .where(StatusHistory.new_status == COMPLETED_STATUS, StatusHistory.changed_at >= since)
+        .group_by(week, WorkItem.assigned_to)
+    )
+    return [(_to_datetime(str(week)[:10]).date(), assignee, count) for week, assignee, count in rows]
+
+
+def _compute_python(now, since):
+    """Same reports as the SQL path, from events streamed in timeline order."""
+    events = db.session.execute(
+        db.select(_events()).order_by(db.text('work_item_id'), db.text('changed_at'))
+        .execution_options(yield_per=1000)
+    )
+
+    status_stats = defaultdict(lambda: {'closed': [], 'open': []})
+    reviewer_waits = defaultdict(list)
+    cycle_times = []
+    previous = None
+    submitted_at = completed = None
+
+    for work_item_id, status, changed_by, changed_at in events:
+        changed_at = _to_datetime(changed_at)
+        if previous is not None and previous[0] == work_item_id:
+            waited = (changed_at - previous[2]).total_seconds()
+            status_stats[previous[1]]['closed'].append(waited)
+            reviewer_waits[changed_by].append(waited)
+        else:
+            if previous is not None:
+                status_stats[previous[1]]['open'].append((now - previous[2]).total_seconds())
+            submitted_at = completed = None
+
+        if status == SUBMITTED_STATUS and submitted_at is None:
+            submitted_at = changed_at
+        if status == COMPLETED_STATUS and not completed and submitted_at is not None:
+            cycle_times.append((changed_at - submitted_at).total_seconds())
+            completed = True
+        previous = (work_item_id, status, changed_at)
+
+    if previous is not None:
+        status_stats[previous[1]]['open'].append((now - previous[2]).total_seconds())
+
+    time_in_status = [
+        {
+            'status': status,
+            'transitions': len(stats['closed']),
+            'avg_hours': _hours(sum(stats['closed']) / len(stats['closed'])) if stats['closed'] else None,
+            'max_hours': _hours(max(stats['closed'])) if stats['closed'] else None,
+            'current': len(stats['open']),
+            'current_avg_hours': _hours(sum(stats['open']) / len(stats['open'])) if stats['open'] else None,
+        }
+        for status, stats in status_stats.items()
+    ]
+    turnaround = [
+        {'reviewer': reviewer, 'actions': len(waits), 'avg_hours': _hours(sum(waits) / len(waits)),
+         'max_hours': _hours(max(waits))}
+        for reviewer, waits in reviewer_waits.items()
+    ]
+
+    weekly = defaultdict(set)
+    rows = db.session.execute(
+        db.select(StatusHistory.changed_at, WorkItem.assigned_to, StatusHistory.work_item_id)
+        .join(WorkItem, WorkItem.id == StatusHistory.work_item_id)
+        .where(StatusHistory.new_status == COMPLETED_STATUS, StatusHistory.changed_at >= since)
+    )
+    for changed_at, assignee, work_item_id in rows:
+        weekly[(_week_start(_to_datetime(changed_at).date()), assignee)].add(work_item_id)
+    throughput = [(week, assignee, len(items)) for (week, assignee), items in weekly.items()]
+
+    return time_in_status, turnaround, sorted(cycle_times), throughput
+
+
+def _status_order(row):
+    statuses = current_app.config.get('STATUS_OPTIONS', [])
+    return (statuses.index(row['status']) if row['status'] in statuses else len(statuses), row['status'])
+
+
+def _throughput_table(rows, weeks):
+    first_week = _week_start(date.today()) - timedelta(weeks=weeks - 1)
+    columns = [first_week + timedelta(weeks=n) for n in range(weeks)]
+    by_assignee = defaultdict(lambda: [0] * weeks)
+    for week, assignee, count in rows:
+        index = (week - first_week).days // 7
+        if 0 <= index < weeks:
+            by_assignee[assignee or 'Unassigned'][index] += count
+
+    return {
+        'weeks': [week.isoformat() for week in columns],
+        'rows': sorted(
+            ({'assignee': assignee, 'counts': counts, 'total': sum(counts)}
+             for assignee, counts in by_assignee.items()),
+            key=lambda row: (-row['total'], row['assignee'])
+        ),
+    }
+
+
+def compute_reports(weeks=DEFAULT_WEEKS):
+    """Compute every report now, bypassing the cache."""
+    started = datetime.utcnow()
+    dialect_name = db.engine.dialect.name
+    since = datetime.combine(_week_start(date.today()) - timedelta(weeks=weeks - 1), datetime.min.time())
+
+    if _uses_window_functions(dialect_name):
+        time_in_status, turnaround = _interval_stats_sql(dialect_name, started)
+        cycle_times = _cycle_times_sql(dialect_name)
+        throughput = _throughput_sql(dialect_name, since)
+    else:
+        time_in_status, turnaround, cycle_times, throughput = _compute_python(started, since)
+
+    return {
+        'generated_at': started,
+        'time_in_status': sorted(time_in_status, key=_status_order),
+        'reviewer_turnaround': sorted(turnaround, key=lambda row: -row['actions']),
+        'cycle_time': {
+            'completed': len(cycle_times),
+            'avg_hours': _hours(sum(cycle_times) / len(cycle_times)) if cycle_times else None,
+            'median_hours': _hours(_percentile(cycle_times, 0.5)),
+            'p90_hours': _hours(_percentile(cycle_times, 0.9)),
+        },
+        'throughput': _throughput_table(throughput, weeks),
+        'elapsed_ms': round((datetime.utcnow() - started).total_seconds() * 1000, 1),
+    }
+
+
+def get_reports(weeks=DEFAULT_WEEKS, refresh=False):
+    """Return the reports, computed at most once per day per process."""
+    cache_key = (date.today(), weeks)
+    with _cache_lock:
+        if not refresh and cache_key in _cache:
+            return _cache[cache_key]
+
+    reports = compute_reports(weeks)
+    with _cache_lock:
+        for stale_key in [key for key in _cache if key[0] != cache_key[0]]:
+            del _cache[stale_key]
+        _cache[cache_key] = reports
+    return reports
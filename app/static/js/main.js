@@ -4,3 +4,12 @@
 // Currently all interactive features are handled inline in templates
 
 console.log('Ship Maintenance Tracker loaded');
+
+// Show an edit-conflict merge view (HTTP 409) returned to a fetch() form submission
+function showConflictPage(response) {
+    return response.text().then(html => {
+        document.open();
+        document.write(html);
+        document.close();
+    });
+}
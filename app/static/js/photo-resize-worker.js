@@ -0,0 +1,49 @@
+/**
+ * Photo downscaling worker for the crew photo manager.
+ * Decodes a photo (applying its EXIF orientation), scales it to the
+ * server's photo width and re-encodes it as JPEG off the main thread, so
+ * phones upload ~100KB instead of multi-megabyte originals.
+ *
+ * Message in:  { id, file, maxWidth, quality }
+ * Message out: { id, blob, width, height } or { id, error }
+ */
+
+async function downscale(file, maxWidth, quality) {
+    let bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+
+    if (bitmap.width > maxWidth) {
+        const height = Math.max(1, Math.round(bitmap.height * maxWidth / bitmap.width));
+        const resized = await createImageBitmap(bitmap, {
+            resizeWidth: maxWidth,
+            resizeHeight: height,
+            resizeQuality: 'high'
+        });
+        bitmap.close();
+        bitmap = resized;
+    }
+
+    // Browsers that ignore the resize options still get scaled by drawImage
+    const width = Math.min(bitmap.width, maxWidth);
+    const height = Math.max(1, Math.round(bitmap.height * width / bitmap.width));
+    const canvas = new OffscreenCanvas(width, height);
+    const ctx = canvas.getContext('2d');
+    ctx.fillStyle = '#ffffff'; // Transparent PNGs get a white background, as on the server
+    ctx.fillRect(0, 0, width, height);
+    ctx.imageSmoothingQuality = 'high';
+    ctx.drawImage(bitmap, 0, 0, width, height);
+    bitmap.close();
+
+    const blob = await canvas.convertToBlob({ type: 'image/jpeg', quality: quality });
+    return { blob, width, height };
+}
+
+self.onmessage = async (e) => {
+    const { id, file, maxWidth, quality } = e.data;
+    try {
+        const result = await downscale(file, maxWidth, quality);
+        self.postMessage({ id, ...result });
+    } catch (error) {
+        // e.g. HEIC outside Safari; the original is uploaded and converted server-side
+        self.postMessage({ id, error: error.message || String(error) });
+    }
+};
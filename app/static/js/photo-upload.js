@@ -1,8 +1,100 @@
 /**
  * Enhanced Photo Upload System
- * Features: Drag-and-drop, instant previews, delete buttons, loading states
+ * Features: Drag-and-drop, instant previews, delete buttons, loading states,
+ * in-browser downscaling to the server's photo width before upload
  */
 
+/**
+ * Downscales photos to maxWidth as JPEG, in a Web Worker when the browser
+ * supports OffscreenCanvas and on the main thread otherwise. Resolves to the
+ * original file when the photo cannot be decoded (e.g. HEIC outside Safari)
+ * or when downscaling would not make it smaller; the server handles those.
+ */
+class PhotoResizer {
+    constructor(maxWidth, workerUrl, quality = 0.85) {
+        this.maxWidth = maxWidth;
+        this.quality = quality;
+        this.worker = null;
+        this.pending = new Map();
+        this.nextId = 0;
+
+        if (maxWidth && workerUrl && window.Worker && window.OffscreenCanvas && window.createImageBitmap) {
+            try {
+                this.worker = new Worker(workerUrl);
+                this.worker.onmessage = (e) => this.handleResult(e.data);
+                this.worker.onerror = () => this.disableWorker();
+            } catch (error) {
+                this.worker = null;
+            }
+        }
+    }
+
+    resize(file) {
+        if (!this.maxWidth || !window.createImageBitmap) {
+            return Promise.resolve(file);
+        }
+
+        const resized = this.worker ? this.resizeInWorker(file) : this.resizeOnMainThread(file);
+        return resized
+            .then(result => this.toUpload(file, result))
+            .catch(() => file);
+    }
+
+    resizeInWorker(file) {
+        return new Promise((resolve, reject) => {
+            const id = ++this.nextId;
+            this.pending.set(id, { resolve, reject });
+            this.worker.postMessage({ id, file, maxWidth: this.maxWidth, quality: this.quality });
+        });
+    }
+
+    handleResult(data) {
+        const request = this.pending.get(data.id);
+        if (!request) return;
+        this.pending.delete(data.id);
+        if (data.error) {
+            request.reject(new Error(data.error));
+        } else {
+            request.resolve(data);
+        }
+    }
+
+    disableWorker() {
+        // The worker failed to load or crashed: fall back to the main thread
+        this.worker = null;
+        this.pending.forEach(request => request.reject(new Error('Resize worker failed')));
+        this.pending.clear();
+    }
+
+    async resizeOnMainThread(file) {
+        const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+        const width = Math.min(bitmap.width, this.maxWidth);
+        const height = Math.max(1, Math.round(bitmap.height * width / bitmap.width));
+
+        const canvas = document.createElement('canvas');
+        canvas.width = width;
+        canvas.height = height;
+        const ctx = canvas.getContext('2d');
+        ctx.fillStyle = '#ffffff';
+        ctx.fillRect(0, 0, width, height);
+        ctx.imageSmoothingQuality = 'high';
+        ctx.drawImage(bitmap, 0, 0, width, height);
+        bitmap.close();
+
+        const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', this.quality));
+        if (!blob) throw new Error('Could not encode photo');
+        return { blob, width, height };
+    }
+
+    toUpload(original, result) {
+        if (result.blob.size >= original.size && original.type === 'image/jpeg') {
+            return original;
+        }
+        const baseName = original.name.replace(/\.[^.]+$/, '');
+        return new File([result.blob], `${baseName}.jpg`, { type: 'image/jpeg', lastModified: original.lastModified });
+    }
+}
+
 class PhotoUploadManager {
     constructor(containerId, options = {}) {
         this.container = document.getElementById(containerId);
@@ -14,6 +106,7 @@ class PhotoUploadManager {
         this.minPhotos = options.minPhotos || 0;
         this.acceptedTypes = options.acceptedTypes || ['image/jpeg', 'image/jpg', 'image/png', 'image/heic', 'image/heif'];
         this.maxFileSize = options.maxFileSize || 10 * 1024 * 1024; // 10MB default
+        this.resizer = new PhotoResizer(options.maxWidth, options.workerUrl);
 
         // Elements
         this.dropZone = null;
@@ -159,7 +252,8 @@ class PhotoUploadManager {
         const photoData = {
             id: photoId,
             file: file,
-            caption: ''
+            caption: '',
+            ready: null
         };
 
         this.photos.push(photoData);
@@ -167,8 +261,19 @@ class PhotoUploadManager {
         // Create preview with loading state
         this.createPhotoPreview(photoData);
 
-        // Load image preview
-        this.loadImagePreview(photoData);
+        // Downscale, then preview the photo that will actually be uploaded
+        photoData.ready = this.resizer.resize(file).then(upload => {
+            photoData.file = upload;
+            this.showUploadSize(photoData, file);
+            this.loadImagePreview(photoData);
+        });
+    }
+
+    showUploadSize(photoData, original) {
+        const card = document.getElementById(photoData.id);
+        if (!card || photoData.file === original) return;
+        card.querySelector('.photo-filesize').textContent =
+            `${this.formatFileSize(original.size)} → ${this.formatFileSize(photoData.file.size)}`;
     }
 
     createPhotoPreview(photoData) {
@@ -223,6 +328,7 @@ class PhotoUploadManager {
 
         reader.onload = (e) => {
             const card = document.getElementById(photoData.id);
+            if (!card) return; // Removed while it was being downscaled
             const loadingDiv = card.querySelector('.photo-preview-loading');
             const contentDiv = card.querySelector('.photo-preview-content');
             const img = card.querySelector('.photo-preview-image img');
@@ -323,7 +429,12 @@ class PhotoUploadManager {
         return this.photos;
     }
 
-    // Method to prepare form data for submission
+    // Resolves once every photo has finished downscaling
+    whenReady() {
+        return Promise.all(this.photos.map(photo => photo.ready));
+    }
+
+    // Method to prepare form data for submission (after whenReady)
     appendToFormData(formData) {
         this.photos.forEach((photo, index) => {
             formData.append('photos', photo.file);
@@ -340,10 +451,13 @@ document.addEventListener('DOMContentLoaded', () => {
         // Get max photos from data attribute or use default
         const maxPhotos = parseInt(container.dataset.maxPhotos) || 10;
         const minPhotos = parseInt(container.dataset.minPhotos) || 0;
+        const maxWidth = parseInt(container.dataset.maxWidth) || 0;
 
         window.photoUploadManager = new PhotoUploadManager('photoUploadContainer', {
             maxPhotos: maxPhotos,
-            minPhotos: minPhotos
+            minPhotos: minPhotos,
+            maxWidth: maxWidth,
+            workerUrl: container.dataset.resizeWorker
         });
     }
 });
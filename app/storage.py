@@ -0,0 +1,266 @@
+"""Storage backends for uploaded photos and generated documents.
+
+Two stores are configured per app: ``uploads`` (photo blobs) and ``docs``
+(generated .docx files). ``STORAGE_BACKEND`` selects where they live:
+
+* ``local`` (default) - directories on the local filesystem
+  (``UPLOAD_FOLDER`` / ``GENERATED_DOCS_FOLDER``).
+* ``s3`` - an S3-compatible bucket. Set ``S3_ENDPOINT_URL`` to point at
+  MinIO or another stand-in for local testing. Downloads are served with
+  presigned-URL redirects so app replicas never proxy file bytes.
+
+Both backends expose the same small interface, keyed by ``/``-separated
+relative keys such as ``3f/a2/<sha256>.jpg``.
+"""
+import os
+import shutil
+import tempfile
+import time
+from flask import current_app, redirect, send_from_directory
+
+
+class LocalStorage:
+    """Files in a directory on the local filesystem."""
+
+    def __init__(self, root):
+        self.root = root
+        self.scratch_dir = root  # Same filesystem, so publishing is an atomic rename
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def open(self, key):
+        """Open a stored file for streaming reads."""
+        return open(self.path(key), 'rb')
+
+    def read_bytes(self, key):
+        with self.open(key) as f:
+            return f.read()
+
+    def save(self, key, fileobj):
+        """Stream a file object into the store, replacing any existing file atomically."""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                shutil.copyfileobj(fileobj, out)
+            os.replace(temp_path, target)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def put_file(self, key, local_path):
+        """Move a finished local file into the store."""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(local_path, target)
+
+    def touch(self, key):
+        """Set a file's modification time to now; returns False if it does not exist."""
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def age(self, key):
+        """Seconds since a file was last modified, or None if it does not exist."""
+        try:
+            return time.time() - os.path.getmtime(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def iter_files(self, min_age_seconds=0, recursive=False):
+        """Yield (key, size) for stored files older than ``min_age_seconds``.
+
+        Streams directory entries with ``os.scandir`` rather than listing
+        whole directories up front.
+        """
+        if not os.path.isdir(self.root):
+            return
+
+        cutoff = time.time() - min_age_seconds
+        pending_dirs = [('', self.root)]
+        while pending_dirs:
+            prefix, directory = pending_dirs.pop()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            pending_dirs.append((f'{prefix}{entry.name}/', entry.path))
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                    if stat.st_mtime > cutoff:
+                        continue
+                    yield prefix + entry.name, stat.st_size
+
+    def send(self, key, as_attachment=False, download_name=None):
+        """Return a response serving a stored file."""
+        return send_from_directory(self.root, key, as_attachment=as_attachment,
+                                   download_name=download_name)
+
+
+class S3Storage:
+    """Objects in an S3-compatible bucket under a key prefix."""
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None,
+                 access_key=None, secret_key=None, presign_seconds=900):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError('STORAGE_BACKEND=s3 requires the boto3 package (pip install boto3)')
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.presign_seconds = presign_seconds
+        self.scratch_dir = tempfile.gettempdir()
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+        )
+
+    def _object_key(self, key):
+        return self.prefix + key
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))['ContentLength']
+
+    def open(self, key):
+        """Open a stored object for streaming reads."""
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))['Body']
+
+    def read_bytes(self, key):
+        body = self.open(key)
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def save(self, key, fileobj):
+        """Stream a file object into the bucket (multipart for large files)."""
+        self.client.upload_fileobj(fileobj, self.bucket, self._object_key(key))
+
+    def put_file(self, key, local_path):
+        """Upload a finished local file and remove the local copy."""
+        self.client.upload_file(local_path, self.bucket, self._object_key(key))
+        os.remove(local_path)
+
+    def _head(self, key):
+        """The object's metadata, or None if it does not exist."""
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def touch(self, key):
+        """Refresh an object's LastModified (a server-side self-copy); False if it does not exist."""
+        from botocore.exceptions import ClientError
+        object_key = self._object_key(key)
+        try:
+            self.client.copy_object(Bucket=self.bucket, Key=object_key,
+                                    CopySource={'Bucket': self.bucket, 'Key': object_key},
+                                    MetadataDirective='REPLACE')
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def age(self, key):
+        """Seconds since an object was last written, or None if it does not exist."""
+        head = self._head(key)
+        return None if head is None else time.time() - head['LastModified'].timestamp()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    def iter_files(self, min_age_seconds=0, recursive=False):
+        """Yield (key, size) for objects older than ``min_age_seconds``."""
+        cutoff = time.time() - min_age_seconds
+        params = {'Bucket': self.bucket, 'Prefix': self.prefix}
+        if not recursive:
+            params['Delimiter'] = '/'
+
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(**params):
+            for obj in page.get('Contents', []):
+                if obj['LastModified'].timestamp() > cutoff:
+                    continue
+                yield obj['Key'][len(self.prefix):], obj['Size']
+
+    def url(self, key, as_attachment=False, download_name=None):
+        """Return a presigned GET URL for an object."""
+        params = {'Bucket': self.bucket, 'Key': self._object_key(key)}
+        if as_attachment:
+            name = download_name or key.rsplit('/', 1)[-1]
+            params['ResponseContentDisposition'] = f'attachment; filename="{name}"'
+        return self.client.generate_presigned_url('get_object', Params=params,
+                                                  ExpiresIn=self.presign_seconds)
+
+    def send(self, key, as_attachment=False, download_name=None):
+        """Redirect the client to a presigned URL instead of proxying bytes."""
+        return redirect(self.url(key, as_attachment, download_name))
+
+
+def _create_storage(app, local_root, s3_prefix):
+    backend = app.config['STORAGE_BACKEND']
+    if backend == 'local':
+        return LocalStorage(local_root)
+    if backend == 's3':
+        return S3Storage(
+            bucket=app.config['S3_BUCKET'],
+            prefix=s3_prefix,
+            endpoint_url=app.config['S3_ENDPOINT_URL'],
+            region=app.config['S3_REGION'],
+            access_key=app.config['S3_ACCESS_KEY_ID'],
+            secret_key=app.config['S3_SECRET_ACCESS_KEY'],
+            presign_seconds=app.config['S3_PRESIGN_SECONDS'],
+        )
+    raise ValueError(f'Unknown STORAGE_BACKEND: {backend}')
+
+
+def get_upload_storage():
+    """Return the store holding photo blobs."""
+    return current_app.extensions['storage']['uploads']
+
+
+def get_docs_storage():
+    """Return the store holding generated documents."""
+    return current_app.extensions['storage']['docs']
+
+
+def init_app(app):
+    """Create the upload and document stores for an app."""
+    docs_root = os.path.join(os.path.dirname(app.root_path), app.config['GENERATED_DOCS_FOLDER'])
+    app.extensions['storage'] = {
+        'uploads': _create_storage(app, app.config['UPLOAD_FOLDER'], app.config['S3_UPLOAD_PREFIX']),
+        'docs': _create_storage(app, docs_root, app.config['S3_DOCS_PREFIX']),
+    }
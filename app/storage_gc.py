@@ -0,0 +1,154 @@
+"""Garbage collection for stored photos and generated documents.
+
+Reconciles the upload store against the ``photos`` table and the document
+store against the documents the current work items would generate. Stores
+are listed as a stream (``os.scandir`` locally, paginated listings on S3)
+and checked against the database in bounded batches, so memory use does
+not grow with the number of stored files.
+"""
+import logging
+import time
+from flask import current_app
+from app import db
+from app.models import Photo, WorkItem
+from app.docx_generator import docx_filename
+from app.photo_ingest import TEMP_PREFIX
+from app.renditions import parse_rendition_key
+from app.storage import get_docs_storage, get_upload_storage
+
+
+logger = logging.getLogger(__name__)
+
+
+def _iter_batches(iterable, batch_size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _item_number_candidates(key):
+    """Item numbers a document named ``key`` could have been generated for.
+
+    ``docx_filename`` joins the item number and at most 30 characters of the
+    description with an underscore, and either may contain underscores, so
+    every split that leaves a short enough description is a candidate.
+    """
+    stem = key[:-len('.docx')]
+    return {stem[:position] for position, char in enumerate(stem)
+            if char == '_' and len(stem) - position - 1 <= 30}
+
+
+def _remove(storage, key, size, report, dry_run):
+    if not dry_run:
+        try:
+            if not storage.delete(key):
+                return
+        except Exception as e:
+            logger.error(f'Could not remove {key}: {e}')
+            report['errors'] += 1
+            return
+    report['files_removed'] += 1
+    report['bytes_freed'] += size
+
+
+def _new_report(store):
+    return {
+        'store': store,
+        'files_scanned': 0,
+        'files_removed': 0,
+        'bytes_freed': 0,
+        'errors': 0,
+    }
+
+
+def collect_upload_garbage(batch_size=500, min_age_seconds=3600, dry_run=False):
+    """Remove files in the upload store that no Photo row references.
+
+    Walks the sharded blob directories as well as legacy flat files. This
+    covers uploads from failed submissions, HEIC originals left next to
+    their converted JPEGs and abandoned temporary files. Print renditions
+    are kept while their source photo is referenced and they match the
+    configured DOCX_PHOTO_DPI.
+    """
+    storage = get_upload_storage()
+    report = _new_report('uploads')
+    dpi = current_app.config['DOCX_PHOTO_DPI']
+
+    files = storage.iter_files(min_age_seconds, recursive=True)
+    for batch in _iter_batches(files, batch_size):
+        report['files_scanned'] += len(batch)
+        sources = {}
+        for key, _ in batch:
+            if key.rsplit('/', 1)[-1].startswith(TEMP_PREFIX):
+                continue
+            rendition = parse_rendition_key(key)
+            if rendition is None:
+                sources[key] = key
+            elif rendition[0] == dpi:
+                sources[key] = rendition[1]
+
+        keys = set(sources.values())
+        referenced = {
+            filename for (filename,) in
+            db.session.query(Photo.filename).filter(Photo.filename.in_(keys))
+        } if keys else set()
+
+        for key, size in batch:
+            if sources.get(key) not in referenced:
+                _remove(storage, key, size, report, dry_run)
+
+    return report
+
+
+def collect_document_garbage(batch_size=500, min_age_seconds=3600, dry_run=False):
+    """Remove generated documents that no longer match a current work item.
+
+    Documents are regenerated on demand, so anything left for deleted items,
+    renamed items or edited descriptions is dead weight.
+    """
+    storage = get_docs_storage()
+    report = _new_report('docs')
+
+    for batch in _iter_batches(storage.iter_files(min_age_seconds), batch_size):
+        report['files_scanned'] += len(batch)
+        documents = [(key, size) for key, size in batch if key.endswith('.docx')]
+        item_numbers = set()
+        for key, _ in documents:
+            item_numbers |= _item_number_candidates(key)
+
+        live = {
+            docx_filename(item_number, description)
+            for item_number, description in
+            db.session.query(WorkItem.item_number, WorkItem.description)
+            .filter(WorkItem.item_number.in_(item_numbers))
+        } if item_numbers else set()
+
+        for key, size in documents:
+            if key not in live:
+                _remove(storage, key, size, report, dry_run)
+
+    return report
+
+
+def collect_garbage(batch_size=500, min_age_seconds=3600, dry_run=False):
+    """Run every collector and return their reports with the total bytes freed."""
+    started = time.perf_counter()
+    reports = [
+        collect_upload_garbage(batch_size, min_age_seconds, dry_run),
+        collect_document_garbage(batch_size, min_age_seconds, dry_run),
+    ]
+    for report in reports:
+        logger.info(f'GC {report["store"]}: removed {report["files_removed"]} of '
+                    f'{report["files_scanned"]} files, freed {report["bytes_freed"]} bytes')
+
+    return {
+        'dry_run': dry_run,
+        'reports': reports,
+        'bytes_freed': sum(report['bytes_freed'] for report in reports),
+        'elapsed_seconds': round(time.perf_counter() - started, 2),
+    }
@@ -1,7 +1,10 @@
-from PIL import Image
+from PIL import Image, ImageOps
+import base64
 import os
+import warnings
+from io import BytesIO
 from werkzeug.utils import secure_filename
-from flask import current_app
+from flask import Response, current_app, get_flashed_messages, render_template, stream_with_context
 import uuid
 
 
@@ -17,18 +20,159 @@ def generate_unique_filename(original_filename: str) -> str:
     return unique_name
 
 
-def resize_image(image_path: str, max_width: int = 576) -> tuple[int, int]:
-    """Resize an image in-place to the specified max width while maintaining aspect ratio.
-    Converts HEIC/HEIF to JPEG automatically."""
+EXIF_ORIENTATION = 0x0112
+
+
+def is_upload_ready(img, image_path: str, max_width: int, max_bytes: int) -> bool:
+    """Return True if an opened upload can be stored as-is.
+
+    The crew photo manager downscales photos in the browser, so most uploads
+    already are upright baseline JPEGs no wider than ``max_width``; decoding
+    and re-encoding them would only cost CPU and quality.
+    """
+    return (
+        img.format == 'JPEG'
+        and img.mode in ('RGB', 'L')
+        and img.width <= max_width
+        and image_path.lower().endswith(('.jpg', '.jpeg'))
+        and img.getexif().get(EXIF_ORIENTATION, 1) == 1
+        and os.path.getsize(image_path) <= max_bytes
+    )
+
+
+# APPn segments kept when stripping metadata: the colour profile, and Adobe's
+# colour transform flag (needed to decode some RGB JPEGs correctly)
+KEPT_APP_SEGMENTS = {0xE0: b'JFIF', 0xE2: b'ICC_PROFILE\0', 0xEE: b'Adobe'}
+
+
+def strip_jpeg_metadata(image_path: str) -> bool:
+    """Remove EXIF, XMP, IPTC and comment segments from a JPEG file in place.
+
+    Only the header segments before the scan are touched; the compressed
+    image data is copied byte for byte, so there is no quality loss. Camera
+    EXIF includes the GPS position, which stored photos must not carry.
+    Returns True if the file changed. Raises ValueError for a malformed file.
+    """
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(b'\xff\xd8'):
+        raise ValueError('not a JPEG file')
+
+    kept = [data[:2]]
+    pos = 2
+    while True:
+        if pos + 4 > len(data) or data[pos] != 0xFF:
+            raise ValueError('malformed JPEG header')
+        marker = data[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        if marker == 0xDA:  # Start of scan: the rest is image data
+            kept.append(data[pos:])
+            break
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:  # Markers without a length
+            kept.append(data[pos:pos + 2])
+            pos += 2
+            continue
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], 'big')
+        payload = data[pos + 4:end]
+        is_metadata = 0xE1 <= marker <= 0xEF or marker == 0xFE
+        if not is_metadata or payload.startswith(KEPT_APP_SEGMENTS.get(marker, b'\0\0')):
+            kept.append(data[pos:end])
+        pos = end
+
+    stripped = b''.join(kept)
+    if len(stripped) == len(data):
+        return False
+    with open(image_path, 'wb') as f:
+        f.write(stripped)
+    return True
+
+
+# Leading bytes of the image formats accepted for upload
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+]
+# ISO base media ``ftyp`` brands of HEIC/HEIF photos
+HEIF_BRANDS = {b'heic', b'heix', b'hevc', b'hevx', b'heim', b'heis', b'mif1', b'msf1'}
+
+
+def sniff_image_format(head: bytes):
+    """Return the Pillow format name of an image from its first 12 bytes, or None."""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    if head[4:8] == b'ftyp' and head[8:12] in HEIF_BRANDS:
+        return 'HEIF'
+    return None
+
+
+def register_heif_opener():
+    """Let Pillow open HEIC/HEIF files if pillow_heif is installed."""
     try:
-        # Try to import pillow_heif for HEIC support
-        try:
-            from pillow_heif import register_heif_opener
+        from pillow_heif import register_heif_opener as register
+        register()
+    except ImportError:
+        pass  # HEIC support not available, will use Pillow's native support if any
+
+
+def probe_image(stream) -> tuple[str, int, int]:
+    """Return ``(format, width, height)`` of an image without decoding it.
+
+    The format is taken from the magic bytes and the size from the image
+    header, so this reads a few KB however large the image is. The stream
+    is left where it was. Raises ValueError if the file is not a readable
+    JPEG, PNG or HEIC/HEIF image.
+    """
+    start = stream.tell()
+    try:
+        image_format = sniff_image_format(stream.read(12))
+        if image_format is None:
+            raise ValueError('not a JPEG, PNG or HEIC image')
+        if image_format == 'HEIF':
             register_heif_opener()
-        except ImportError:
-            pass  # HEIC support not available, will use Pillow's native support if any
-        
+        stream.seek(start)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            try:
+                with Image.open(stream, formats=[image_format]) as img:  # Parses the header only
+                    return image_format, img.width, img.height
+            except Image.DecompressionBombError as e:
+                raise ValueError(str(e))
+            except (OSError, SyntaxError, KeyError):
+                raise ValueError(f'could not read the {image_format} header')
+    finally:
+        stream.seek(start)
+
+
+def resize_image(image_path: str, max_width: int = 576, passthrough_max_bytes: int = 0) -> tuple[int, int, str]:
+    """Resize an image in-place to the specified max width while maintaining aspect ratio.
+    Converts HEIC/HEIF to JPEG automatically and applies the EXIF orientation.
+    JPEGs that are already small enough (see ``is_upload_ready``) are only
+    decoded to check they are intact, and kept as uploaded apart from their
+    metadata (see ``strip_jpeg_metadata``); re-encoded photos never carry
+    EXIF."""
+    try:
+        register_heif_opener()
+
         with Image.open(image_path) as img:
+            if passthrough_max_bytes and is_upload_ready(img, image_path, max_width, passthrough_max_bytes):
+                img.load()  # Raises on a truncated or corrupt upload
+                try:
+                    strip_jpeg_metadata(image_path)
+                    return img.width, img.height, image_path
+                except ValueError:
+                    pass  # Re-encode it instead
+
+            if img.format == 'JPEG':
+                # Let the decoder scale a large photo down (by up to 8x) while
+                # decoding; both sides are kept at least max_width, as either
+                # may become the width once the EXIF orientation is applied
+                img.draft('RGB', (max_width, max_width))
+            img = ImageOps.exif_transpose(img)
+
             # Convert to RGB if needed
             if img.mode in ('RGBA', 'LA', 'P'):
                 background = Image.new('RGB', img.size, (255, 255, 255))
@@ -57,6 +201,49 @@ def resize_image(image_path: str, max_width: int = 576) -> tuple[int, int]:
         raise
 
 
+PLACEHOLDER_SIZE = 16
+
+
+def make_placeholder(source) -> str:
+    """Return a low-quality placeholder of a stored photo as a data: URI.
+
+    The photo scaled to PLACEHOLDER_SIZE pixels on its long side, a few
+    hundred bytes of JPEG. Single work item pages inline it as the <img>
+    background, so the photo's colours show (blurred by the browser's
+    upscaling) while the photo itself loads; pages listing many items only
+    reserve the space, as hundreds of inlined placeholders would outweigh
+    the page itself. ``source`` is a path or file object.
+    """
+    with Image.open(source) as img:
+        # Let the JPEG decoder skip nearly all the detail
+        img.draft('RGB', (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+        thumb = img.convert('RGB')
+        thumb.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BILINEAR)
+        output = BytesIO()
+        thumb.save(output, 'JPEG', quality=40, optimize=True)
+    return 'data:image/jpeg;base64,' + base64.b64encode(output.getvalue()).decode('ascii')
+
+
+def perceptual_hash(source) -> str:
+    """Return the 64-bit difference hash (dHash) of a photo as 16 hex digits.
+
+    The photo is reduced to 9x8 grey pixels and each bit records whether a
+    pixel is brighter than its right-hand neighbour. Re-encoded, resized or
+    slightly cropped copies of a shot hash within a few bits of each other
+    (see ``app.photo_index``). ``source`` is a path or file object.
+    """
+    with Image.open(source) as img:
+        img.draft('L', (64, 64))
+        grey = img.convert('L').resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = grey.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            bits = bits << 1 | (left > pixels[row * 9 + col + 1])
+    return f'{bits:016x}'
+
+
 def get_next_draft_number() -> str:
     """Return the next available DRAFT number starting at DRAFT_0020."""
     from app.models import WorkItem
@@ -87,3 +274,40 @@ def format_datetime(dt) -> str:
     if dt:
         return dt.strftime('%Y-%m-%d %H:%M')
     return ''
+
+
+def stream_page(template_name: str, **context) -> Response:
+    """Render a template as a streamed response.
+
+    Like Flask's ``stream_template``, but template output is joined into
+    chunks of about STREAM_CHUNK_CHARS instead of sending every template
+    event on its own, so the header and first cards go out as soon as they
+    are rendered without thousands of tiny writes. Returns a normal
+    ``render_template`` response when STREAM_PAGES is off.
+
+    The response headers (and session cookie) are sent before the body is
+    rendered, so flashed messages are taken from the session here, and an
+    error while rendering can only cut the page short.
+    """
+    if not current_app.config['STREAM_PAGES']:
+        return render_template(template_name, **context)
+
+    get_flashed_messages()  # Cached on the request for the template
+    app = current_app._get_current_object()
+    template = app.jinja_env.get_or_select_template(template_name)
+    app.update_template_context(context)
+    chunk_chars = app.config['STREAM_CHUNK_CHARS']
+
+    def generate():
+        parts, size = [], 0
+        for part in template.generate(context):
+            parts.append(part)
+            size += len(part)
+            if size >= chunk_chars:
+                yield ''.join(parts)
+                parts, size = [], 0
+        yield ''.join(parts)
+
+    response = Response(stream_with_context(generate()), mimetype='text/html')
+    response.headers['X-Accel-Buffering'] = 'no'  # Ask proxies not to hold the stream back
+    return response
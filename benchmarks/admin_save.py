@@ -0,0 +1,75 @@
+"""
+Benchmark: SQL statements and time per admin item save.
+
+Posts the admin item form (save-admin-notes, as the "Save" button does)
+for an item with N photos in three cases: nothing changed, the notes
+changed, and every caption changed. Counts the statements the request
+sends to the database (including the counter and session bookkeeping).
+
+Usage:
+    python benchmarks/admin_save.py
+    python benchmarks/admin_save.py --photos 6 12 24 --requests 20
+"""
+import argparse
+import time
+
+from sqlalchemy import event
+
+from common import make_app, seed_items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--photos', type=int, nargs='+', default=[1, 6, 24], help='photos on the item')
+    parser.add_argument('--requests', type=int, default=20, help='saves per case (averaged)')
+    args = parser.parse_args()
+
+    app = make_app(fresh_database=True)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+
+    statements = []
+    with app.app_context():
+        from app import db
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+    print(f"{'photos':>7} {'case':>10} {'statements':>11} {'ms/save':>8}")
+    for photo_count in args.photos:
+        with app.app_context():
+            from app.models import WorkItem
+            item = db.session.get(WorkItem, seed_items(1, photos_per_item=photo_count,
+                                                       distinct_photos=min(photo_count, 4))[0])
+            form = {
+                'item_number': item.item_number,
+                'location': item.location,
+                'description': item.description,
+                'detail': item.detail,
+                'references': item.references or '',
+                'admin_notes': '',
+                'photo_ids[]': [photo.id for photo in item.photos],
+                'photo_captions[]': [photo.caption for photo in item.photos],
+            }
+            item_id = item.id
+
+        cases = {
+            'unchanged': lambda n: {},
+            'notes': lambda n: {'admin_notes': f'Note {n}'},
+            'captions': lambda n: {'photo_captions[]': [f'{c} ({n})' for c in form['photo_captions[]']]},
+        }
+        for name, changes in cases.items():
+            elapsed, counts = 0.0, []
+            for n in range(args.requests):
+                statements.clear()
+                started = time.perf_counter()
+                response = client.post(f'/admin/save-admin-notes/{item_id}', data={**form, **changes(n)})
+                elapsed += time.perf_counter() - started
+                assert response.status_code == 302, response.status_code
+                counts.append(len(statements))
+            print(f'{photo_count:>7} {name:>10} {max(counts):>11} {elapsed / args.requests * 1000:>8.2f}')
+            form.update(changes(args.requests - 1))  # The item as the last save left it
+
+
+if __name__ == '__main__':
+    main()
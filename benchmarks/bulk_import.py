@@ -0,0 +1,66 @@
+"""
+Benchmark: bulk import throughput and memory for CSV files of different sizes.
+
+For each size a CSV of synthetic scope items is written to a temporary
+file and imported twice: the first run creates every item, the second
+updates them all (same item numbers). The peak Python memory of a third,
+traced run shows that memory depends on IMPORT_CHUNK_SIZE, not on the file.
+
+Usage:
+    python benchmarks/bulk_import.py
+    python benchmarks/bulk_import.py --rows 1000 50000 --chunk-size 2000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import tracemalloc
+
+from common import make_app
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Item Number', 'Location', 'Description', 'Detail', 'OFM', 'Status', 'Assigned To'])
+        for n in range(rows):
+            writer.writerow([f'YARD_{n:06d}', f'Frame {n % 90}, Deck {n % 4}',
+                             f'Scope item {n}', 'Detailed scope of work. ' * 10,
+                             'P/N 1234-5678' if n % 2 else '', 'Submitted', 'DP' if n % 3 else ''])
+
+
+def run_import(path, chunk_size):
+    from app.importer import import_items
+    with open(path, 'rb') as f:
+        return import_items(f, path, 'Bench', chunk_size=chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[5000, 50000], help='rows per file')
+    parser.add_argument('--chunk-size', type=int, help='rows per upsert (default IMPORT_CHUNK_SIZE)')
+    args = parser.parse_args()
+
+    print(f"{'rows':>7} {'file MB':>8} {'create s':>9} {'rows/s':>8} {'update s':>9} {'rows/s':>8} {'peak MB':>8}")
+    for rows in args.rows:
+        app = make_app(fresh_database=True)
+        path = os.path.join(tempfile.mkdtemp(prefix='mta-bench-'), 'scope.csv')
+        write_csv(path, rows)
+
+        with app.app_context():
+            created = run_import(path, args.chunk_size)
+            updated = run_import(path, args.chunk_size)
+            assert created['created'] == rows and updated['updated'] == rows, (created, updated)
+
+            tracemalloc.start()
+            run_import(path, args.chunk_size)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        print(f"{rows:>7} {os.path.getsize(path) / 1024 / 1024:>8.1f} "
+              f"{created['seconds']:>9.2f} {created['rows_per_second']:>8.0f} "
+              f"{updated['seconds']:>9.2f} {updated['rows_per_second']:>8.0f} {peak / 1024 / 1024:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
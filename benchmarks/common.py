@@ -0,0 +1,99 @@
+"""Shared setup for the benchmark scripts.
+
+Each benchmark runs against a throwaway app instance: a temporary SQLite
+database (unless DATABASE_URL is already set) and temporary upload and
+document folders, seeded with synthetic work items and photos.
+"""
+import importlib
+import os
+import sys
+import tempfile
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_app(fresh_database=False, **config):
+    """Create an app backed by temporary storage; extra kwargs override config.
+
+    Overrides are applied before the app is created, so they also affect
+    the engine (e.g. SQLALCHEMY_ENGINE_OPTIONS). With ``fresh_database`` a
+    new SQLite file is used even if DATABASE_URL was set by an earlier call.
+    """
+    data_dir = tempfile.mkdtemp(prefix='mta-bench-')
+    sqlite_url = 'sqlite:///' + os.path.join(data_dir, 'bench.db')
+    if fresh_database and os.environ.get('DATABASE_URL', '').startswith('sqlite'):
+        os.environ['DATABASE_URL'] = sqlite_url
+    os.environ.setdefault('DATABASE_URL', sqlite_url)
+    os.environ['UPLOAD_FOLDER'] = os.path.join(data_dir, 'uploads')
+    os.environ['GENERATED_DOCS_FOLDER'] = os.path.join(data_dir, 'generated_docs')
+
+    import config as config_module
+    importlib.reload(config_module)  # Re-read the environment set above
+    from app import create_app
+
+    bench_config = type('BenchConfig', (config_module.Config,), {'TESTING': True, **config})
+    return create_app(bench_config)
+
+
+def make_jpeg(width=576, height=432, seed=0):
+    """Return JPEG bytes of a synthetic photo."""
+    from PIL import Image, ImageDraw
+
+    img = Image.new('RGB', (width, height), (seed * 37 % 256, seed * 91 % 256, seed * 53 % 256))
+    draw = ImageDraw.Draw(img)
+    for i in range(0, width, 24):
+        draw.line([(i, 0), (width - i, height)], fill=((i + seed) % 256, 120, 200), width=3)
+    buffer = BytesIO()
+    img.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def seed_items(count, photos_per_item=2, distinct_photos=4):
+    """Insert ``count`` work items sharing a small pool of stored photos.
+
+    Must be called inside an app context. Returns the new work item ids.
+    """
+    from datetime import datetime, timedelta
+    from app import db
+    from app.blob_store import blob_key
+    from app.models import WorkItem, Photo
+    from app.storage import get_upload_storage
+    import hashlib
+
+    storage = get_upload_storage()
+    keys = []
+    for seed in range(distinct_photos):
+        data = make_jpeg(seed=seed)
+        content_hash = hashlib.sha256(data).hexdigest()
+        key = blob_key(content_hash, 'jpg')
+        storage.save(key, BytesIO(data))
+        keys.append((key, content_hash))
+
+    start = WorkItem.query.count()
+    base_time = datetime.utcnow() - timedelta(days=count)
+    ids = []
+    for n in range(count):
+        item = WorkItem(
+            item_number=f'BENCH_{start + n:06d}',
+            location=f'Frame {n % 90}, Deck {n % 4}',
+            ns_equipment='N/A',
+            description=f'Benchmark work item {n} description text',
+            detail='Detailed scope of work. ' * 20,
+            references='P/N 1234-5678' if n % 2 else '',
+            submitter_name='DP',
+            original_submitter='DP',
+            assigned_to='DP',
+            submitted_at=base_time + timedelta(days=n),
+        )
+        db.session.add(item)
+        db.session.flush()
+        for p in range(photos_per_item):
+            key, content_hash = keys[(n + p) % len(keys)]
+            db.session.add(Photo(filename=key, content_hash=content_hash,
+                                 caption=f'Photo {p + 1} of item {n}', work_item_id=item.id))
+        ids.append(item.id)
+        if n % 500 == 499:
+            db.session.commit()
+    db.session.commit()
+    return ids
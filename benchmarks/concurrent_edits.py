@@ -0,0 +1,153 @@
+"""
+Concurrency check: crew and admin editors saving the same work item in
+parallel threads, with and without the form version and base.
+
+Each editor thread repeatedly loads the item (as opening the edit page
+does), appends its own token to one field and saves: crew threads append
+to Detail through /crew/edit, admin threads to Description through
+/admin/assign. Both forms post every item field, so a crew save and an
+admin save touch different fields of the same form.
+
+``unversioned`` posts the forms without the version field (as before the
+version column). ``versioned`` posts the version the form was loaded at
+and, on a 409 merge view, reloads and tries again. ``merged`` also posts
+the form's base, and when the merge view has no field to choose (the
+other save changed only fields this editor did not) submits it as shown,
+as a user accepting the defaults would; otherwise it reloads and tries
+again. Reports saves, 409 responses, merge views saved as shown, tokens
+missing from the final item (lost updates) and save latency. No row locks
+are taken in any profile, so latency shows only the cost of the retries.
+
+Usage:
+    python benchmarks/concurrent_edits.py
+    python benchmarks/concurrent_edits.py --crew 4 --admins 4 --edits 10
+"""
+import argparse
+import threading
+import time
+from html.parser import HTMLParser
+
+from common import make_app, seed_items
+from load_submissions import percentile
+
+
+class MergeForm(HTMLParser):
+    """Fields the merge view's form posts as shown: hidden inputs and checked radios."""
+
+    def __init__(self, html):
+        super().__init__()
+        self.fields, self.choices = {}, 0
+        self.feed(html)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag != 'input' or 'name' not in attrs:
+            return
+        if attrs.get('type') == 'radio':
+            self.choices += 'checked' in attrs
+            if 'checked' not in attrs:
+                return
+        self.fields[attrs['name']] = attrs.get('value', '')
+
+
+def load_item(app, item_id):
+    from app import db
+    from app.conflicts import edit_base
+    from app.models import WorkItem
+
+    with app.app_context():
+        item = db.session.get(WorkItem, item_id)
+        return {'version': item.version, 'base': edit_base(item), 'item_number': item.item_number,
+                'location': item.location, 'description': item.description, 'detail': item.detail,
+                'references': item.references or ''}
+
+
+def editor(app, item_id, role, name, edits, profile, stats, lock):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        if role == 'crew':
+            session['crew_authenticated'] = True
+            session['crew_name'] = 'DP'
+        else:
+            session['is_admin'] = True
+
+    for n in range(edits):
+        token = f'[{name}-{n}]'
+        while True:
+            form = load_item(app, item_id)
+            if profile != 'merged':
+                del form['base']
+            if profile == 'unversioned':
+                del form['version']
+            if role == 'crew':
+                url = f'/crew/edit/{item_id}'
+                form['detail'] += token
+            else:
+                url = f'/admin/assign/{item_id}'
+                form['description'] += token
+                form.update(status='Submitted', assigned_to='DP', revision_notes='')
+
+            while True:
+                started = time.perf_counter()
+                response = client.post(url, data=form)
+                elapsed = time.perf_counter() - started
+                merge = MergeForm(response.get_data(as_text=True)) if response.status_code == 409 else None
+                with lock:
+                    stats['latencies'].append(elapsed)
+                    if merge is None:
+                        assert response.status_code == 302, response.status_code
+                        stats['saves'] += 1
+                        stats['tokens'].append((role, token))
+                        break
+                    stats['conflicts'] += 1
+                    if profile != 'merged' or merge.choices:
+                        break
+                    stats['merges'] += 1
+                form = merge.fields
+            if merge is None:
+                break
+
+
+def run_profile(profile, args):
+    app = make_app(fresh_database=True)
+    with app.app_context():
+        item_id = seed_items(1, photos_per_item=0)[0]
+
+    stats = {'latencies': [], 'conflicts': 0, 'merges': 0, 'saves': 0, 'tokens': []}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=editor, args=(app, item_id, role, f'{role}{i}', args.edits, profile, stats, lock))
+        for role, count in (('crew', args.crew), ('admin', args.admins))
+        for i in range(count)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    final = load_item(app, item_id)
+    lost = [token for role, token in stats['tokens']
+            if token not in final['detail' if role == 'crew' else 'description']]
+    latencies = stats['latencies']
+    print(f"{profile:>12} {stats['saves']:>6} {stats['conflicts']:>5} {stats['merges']:>7} {len(lost):>5} "
+          f"{final['version']:>8} "
+          f"{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.95) * 1000:>8.1f} {wall:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--crew', type=int, default=4, help='crew editor threads')
+    parser.add_argument('--admins', type=int, default=4, help='admin editor threads')
+    parser.add_argument('--edits', type=int, default=10, help='saves per thread')
+    args = parser.parse_args()
+
+    print(f"{'profile':>12} {'saves':>6} {'409':>5} {'merged':>7} {'lost':>5} {'version':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'wall s':>7}")
+    for profile in ('unversioned', 'versioned', 'merged'):
+        run_profile(profile, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: admin dashboard time-to-first-byte and transferred bytes,
+buffered vs streamed rendering, with and without compression.
+
+``buffered`` renders the whole page before sending anything (as
+render_template did); ``streamed`` sends it in STREAM_CHUNK_CHARS chunks as
+the template renders. Each profile is fetched with no Accept-Encoding and
+with ``br, gzip``, and the transfer time of the body is modeled on a slow
+link (bytes / bandwidth; the HTML alone, no photos or assets).
+
+TTFB is the time until the first body chunk leaves the app; with
+buffering it equals the full render time.
+
+Usage:
+    python benchmarks/dashboard_stream.py
+    python benchmarks/dashboard_stream.py --items 2000 --requests 5 --kbps 256
+"""
+import argparse
+import statistics
+import time
+
+from common import make_app, seed_items
+
+
+def fetch(client, accept_encoding):
+    """Return (ttfb, total seconds, body bytes) for one dashboard request."""
+    headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+    started = time.perf_counter()
+    response = client.get('/admin/dashboard', headers=headers, buffered=False)
+    ttfb, size = None, 0
+    for chunk in response.response:
+        if ttfb is None and chunk:
+            ttfb = time.perf_counter() - started
+        size += len(chunk)
+    response.close()
+    return ttfb, time.perf_counter() - started, size
+
+
+def run_profile(name, stream, compress, requests, bytes_per_second):
+    app = make_app(STREAM_PAGES=stream, COMPRESS_RESPONSES=compress)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+    fetch(client, None)  # Warm the template cache
+
+    results = [fetch(client, 'br, gzip' if compress else None) for _ in range(requests)]
+    ttfb = statistics.median(r[0] for r in results) * 1000
+    total = statistics.median(r[1] for r in results) * 1000
+    size = results[0][2]
+    print(f'{name:>20} {ttfb:>9.0f} {total:>9.0f} {size / 1024:>10.1f} {size / bytes_per_second:>11.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--items', type=int, default=2000, help='work items on the dashboard')
+    parser.add_argument('--requests', type=int, default=5, help='requests per profile (median reported)')
+    parser.add_argument('--kbps', type=float, default=256, help='link bandwidth in kbit/s for the transfer model')
+    args = parser.parse_args()
+
+    app = make_app(fresh_database=True)
+    with app.app_context():
+        seed_items(args.items)
+
+    bytes_per_second = args.kbps * 1000 / 8
+    print(f'{args.items} items; transfer modeled at {args.kbps:.0f} kbit/s')
+    print(f"{'profile':>20} {'TTFB ms':>9} {'total ms':>9} {'sent KB':>10} {'transfer s':>11}")
+    run_profile('buffered', False, False, args.requests, bytes_per_second)
+    run_profile('streamed', True, False, args.requests, bytes_per_second)
+    run_profile('buffered+compressed', False, True, args.requests, bytes_per_second)
+    run_profile('streamed+compressed', True, True, args.requests, bytes_per_second)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark: exporting the whole work item table, streamed versus loaded.
+
+Seeds work items with photo and status history rows, then exports them
+as CSV, JSONL and Parquet with app.data_export (one aggregate query read
+with yield_per, written a batch at a time), and as CSV the naive way:
+``WorkItem.query.all()`` with each item's photos and history loaded
+lazily to count them. Reports time, rows/s, output size and the peak
+Python memory of each run.
+
+Usage:
+    python benchmarks/data_export.py
+    python benchmarks/data_export.py --items 100000 --batch-size 5000
+"""
+import argparse
+import csv
+import io
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from common import make_app
+
+
+STATUSES = ['Submitted', 'In Review', 'Completed Review']
+
+
+def seed(count):
+    from app import db
+    from app.models import Photo, StatusHistory, WorkItem
+
+    now = datetime.utcnow()
+    for start in range(0, count, 5000):
+        numbers = range(start, min(start + 5000, count))
+        db.session.execute(WorkItem.__table__.insert(), [
+            {'item_number': f'EXPORT_{n:06d}', 'location': f'Frame {n % 90}, Deck {n % 4}',
+             'ns_equipment': 'N/A', 'description': f'Scope item {n}', 'detail': 'Detailed scope of work. ' * 10,
+             'references': 'P/N 1234-5678' if n % 2 else None, 'status': STATUSES[n % 3],
+             'assigned_to': 'DP', 'needs_revision': False, 'submitter_name': 'DP', 'original_submitter': 'DP',
+             'submitted_at': now, 'last_modified_at': now, 'version': 1}
+            for n in numbers
+        ])
+        db.session.execute(Photo.__table__.insert(), [
+            {'filename': 'bench.jpg', 'caption': f'Photo {p}', 'work_item_id': n + 1}
+            for n in numbers for p in range(2)
+        ])
+        db.session.execute(StatusHistory.__table__.insert(), [
+            {'work_item_id': n + 1, 'old_status': STATUSES[s - 1] if s else None, 'new_status': STATUSES[s],
+             'changed_by': 'DP', 'changed_at': now + timedelta(hours=s)}
+            for n in numbers for s in range(n % 3 + 1)
+        ])
+        db.session.commit()
+
+
+def naive_csv(output):
+    from app import db
+    from app.models import WorkItem
+
+    writer = csv.writer(output)
+    for item in WorkItem.query.order_by(WorkItem.id).all():
+        changes = sorted(h.changed_at for h in item.history)
+        writer.writerow([item.id, item.item_number, item.location, item.description, item.detail,
+                         item.status, item.assigned_to, len(item.photos), len(changes),
+                         changes[0] if changes else '', changes[-1] if changes else ''])
+    db.session.remove()
+
+
+def streamed(fmt, batch_size):
+    from app.data_export import stream_export
+
+    def run(output):
+        for chunk in stream_export(fmt, batch_size=batch_size):
+            output.write(chunk)
+    return run
+
+
+def parquet(batch_size):
+    from app.data_export import iter_batches, write_parquet
+
+    def run(output):
+        write_parquet(iter_batches(batch_size=batch_size), output)
+    return run
+
+
+class CountingWriter:
+    """Discards what is written, counting bytes (the client or file)."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data.encode('utf-8') if isinstance(data, str) else data)
+        return len(data)
+
+
+def measure(run, binary=False):
+    output = io.BytesIO() if binary else CountingWriter()
+    tracemalloc.start()
+    started = time.perf_counter()
+    run(output)
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    size = len(output.getvalue()) if binary else output.size
+    return seconds, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--items', type=int, default=20000, help='work items to seed')
+    parser.add_argument('--batch-size', type=int, help='rows per batch (default EXPORT_BATCH_ROWS)')
+    args = parser.parse_args()
+
+    app = make_app(fresh_database=True)
+    with app.app_context():
+        seed(args.items)
+
+        profiles = [('naive csv', naive_csv, False),
+                    ('csv', streamed('csv', args.batch_size), False),
+                    ('jsonl', streamed('jsonl', args.batch_size), False)]
+        try:
+            import pyarrow  # noqa: F401
+            # Parquet writes to a seekable file; BytesIO counts toward the peak
+            profiles.append(('parquet', parquet(args.batch_size), True))
+        except ImportError:
+            print('pyarrow is not installed; skipping parquet')
+
+        print(f"{'profile':>10} {'rows':>7} {'seconds':>8} {'rows/s':>8} {'size MB':>8} {'peak MB':>8}")
+        for name, run, binary in profiles:
+            seconds, size, peak = measure(run, binary)
+            print(f"{name:>10} {args.items:>7} {seconds:>8.2f} {args.items / seconds:>8.0f} "
+                  f"{size / 1024 / 1024:>8.1f} {peak / 1024 / 1024:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark the combined multi-item .docx export.
+
+Writes packages of increasing size and reports wall time, time per item and
+peak Python allocations, to check that the export scales linearly.
+
+Usage:
+    python benchmarks/docx_combined.py
+    python benchmarks/docx_combined.py --sizes 100 500
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from common import make_app, seed_items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 200, 400, 800])
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        from app.docx_generator import generate_combined_docx
+
+        ids = seed_items(max(args.sizes))
+
+        print(f"{'items':>6} {'seconds':>8} {'ms/item':>8} {'peak KiB':>9} {'size KiB':>9}")
+        for size in args.sizes:
+            with tempfile.TemporaryFile() as output:
+                started = time.perf_counter()
+                generate_combined_docx(ids[:size], output)
+                elapsed = time.perf_counter() - started
+                written = output.tell()
+
+            with tempfile.TemporaryFile() as output:
+                tracemalloc.start()
+                generate_combined_docx(ids[:size], output)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            print(f'{size:>6} {elapsed:>8.2f} {elapsed * 1000 / size:>8.2f} '
+                  f'{peak / 1024:>9.0f} {written / 1024:>9.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark .docx generation: template skeleton engine vs. the run-by-run builder.
+
+Renders the same work items (two photos each) with both renderers and
+reports mean time per document and peak Python allocations per document
+(tracemalloc) for batches of 1, 100 and 1,000 items.
+
+Usage:
+    python benchmarks/docx_render.py
+    python benchmarks/docx_render.py --sizes 1 100
+"""
+import argparse
+import time
+import tracemalloc
+from io import BytesIO
+
+from common import make_app, seed_items
+
+
+def run(renderer, items, traced_items=20):
+    """Render and serialize every item; return (ms per doc, peak KiB per doc).
+
+    Timing and allocation tracing are separate passes so tracemalloc's
+    overhead does not distort the timings.
+    """
+    started = time.perf_counter()
+    for item in items:
+        renderer(item).save(BytesIO())
+    elapsed = time.perf_counter() - started
+
+    peaks = []
+    for item in items[:traced_items]:
+        tracemalloc.start()
+        renderer(item).save(BytesIO())
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return elapsed * 1000 / len(items), max(peaks) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 1000])
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        from app.models import WorkItem
+        from app.docx_generator import build_document, render_document, get_skeleton
+
+        ids = seed_items(max(args.sizes))
+        get_skeleton()  # One-time per-process cost, excluded from the timings
+
+        print(f"{'items':>6} {'renderer':>9} {'ms/doc':>8} {'peak KiB/doc':>13}")
+        for size in args.sizes:
+            items = WorkItem.query.filter(WorkItem.id.in_(ids[:size])).all()
+            for name, renderer in (('builder', build_document), ('template', render_document)):
+                ms, peak = run(renderer, items)
+                print(f'{size:>6} {name:>9} {ms:>8.2f} {peak:>13.0f}')
+
+
+if __name__ == '__main__':
+    main()
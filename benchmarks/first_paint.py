@@ -0,0 +1,82 @@
+"""
+Estimate first-paint time on a slow link: CDN + unversioned static files vs
+the self-hosted fingerprinted bundles.
+
+First paint waits for the HTML and every stylesheet. The page and asset
+sizes are measured from the app (HTML, the bundles as served with
+``Accept-Encoding: br, gzip``). The previous layout's files are measured
+from their sources: Flask served style.css and variables.css uncompressed,
+and the CDN's Bootstrap CSS is taken as its gzip size.
+bootstrap-icons.css is not vendored any more and is counted as 0 bytes, so
+the CDN figures are a lower bound.
+
+The link model: a new origin costs DNS + TCP + TLS (4 round trips), a
+request costs one round trip plus its bytes at the link bandwidth, and
+requests to the same origin run in parallel. Repeat visits reuse cached
+files: unversioned static files are revalidated (a round trip each, and
+style.css @imports variables.css, so two in sequence); immutable bundles
+are not requested at all.
+
+Usage:
+    python benchmarks/first_paint.py
+    python benchmarks/first_paint.py --rtt-ms 700 --kbps 256
+"""
+import argparse
+import gzip
+import os
+
+from common import make_app
+
+
+STATIC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'static')
+NEW_ORIGIN_RTTS = 4  # DNS, TCP, TLS 1.2 (2)
+
+
+def file_size(relative, compress=False):
+    with open(os.path.join(STATIC, relative), 'rb') as f:
+        data = f.read()
+    return len(gzip.compress(data)) if compress else len(data)
+
+
+def transfer(size, rtt, bytes_per_second):
+    return rtt + size / bytes_per_second
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rtt-ms', type=float, default=700, help='round trip time (VSAT ~600-800ms)')
+    parser.add_argument('--kbps', type=float, default=256, help='link bandwidth in kbit/s')
+    args = parser.parse_args()
+    rtt = args.rtt_ms / 1000
+    rate = args.kbps * 1000 / 8
+
+    app = make_app(fresh_database=True)
+    client = app.test_client()
+    html_size = len(client.get('/crew-login').data)
+    with app.app_context():
+        from app.assets import asset_url
+        css_url = asset_url('css/app.css')
+    bundle_size = len(client.get(css_url, headers={'Accept-Encoding': 'br, gzip'}).data)
+
+    html = NEW_ORIGIN_RTTS * rtt + transfer(html_size, rtt, rate)
+
+    # Before: CDN stylesheets in parallel on a new origin; local style.css, then its @import
+    cdn_css = file_size('vendor/bootstrap/bootstrap.min.css', compress=True)
+    cdn = NEW_ORIGIN_RTTS * rtt + transfer(cdn_css, rtt, rate)
+    local = transfer(file_size('css/style.css'), rtt, rate) + transfer(file_size('css/variables.css'), rtt, rate)
+    # The link is shared: the slower chain, but never less than all bytes at full rate
+    before_first = html + max(cdn, local, (cdn_css + file_size('css/style.css') + file_size('css/variables.css')) / rate)
+    before_repeat = html - NEW_ORIGIN_RTTS * rtt + 2 * rtt
+
+    after_first = html + transfer(bundle_size, rtt, rate)
+    after_repeat = html - NEW_ORIGIN_RTTS * rtt
+
+    print(f'link: {args.rtt_ms:.0f}ms RTT, {args.kbps:.0f} kbit/s; HTML {html_size / 1024:.1f} KB')
+    print(f"{'layout':>8} {'CSS KB':>8} {'requests':>9} {'first visit s':>14} {'repeat visit s':>15}")
+    print(f"{'cdn':>8} {(cdn_css + file_size('css/style.css') + file_size('css/variables.css')) / 1024:>8.1f} "
+          f"{4:>9} {before_first:>14.2f} {before_repeat:>15.2f}")
+    print(f"{'bundled':>8} {bundle_size / 1024:>8.1f} {1:>9} {after_first:>14.2f} {after_repeat:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Load test: concurrent crew submissions against two engine profiles.
+
+``baseline`` is the previous engine configuration (default pool, pre-ping
+on every checkout, SQLite in rollback-journal mode); ``tuned`` is the
+current ``config.Config`` profile (pool sized from GUNICORN_THREADS, no
+pre-ping, WAL and busy timeout on SQLite, statement timeouts on Postgres).
+
+Each simulated crew member posts new work items with a photo in a loop.
+Reports request latency (p50/p95/max), time spent waiting for a pooled
+connection, and failed requests.
+
+Point DATABASE_URL at a scratch Postgres database to test against Postgres;
+otherwise a temporary SQLite file is used per profile.
+
+Usage:
+    python benchmarks/load_submissions.py
+    python benchmarks/load_submissions.py --threads 16 --requests 25
+"""
+import argparse
+import threading
+import time
+
+from common import make_app, make_jpeg
+
+
+BASELINE_ENGINE_OPTIONS = {'pool_pre_ping': True, 'pool_recycle': 300}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def instrument_pool(engine, waits):
+    """Record how long each pool checkout takes."""
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            waits.append(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+
+
+def crew_member(app, member, requests, photo, latencies, errors, start_barrier):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['crew_authenticated'] = True
+        session['crew_name'] = f'Load{member}'
+
+    start_barrier.wait()
+    for n in range(requests):
+        data = {
+            'item_number': f'LOAD_{member:03d}_{n:04d}',
+            'location': f'Frame {n}',
+            'description': 'Load test submission',
+            'detail': 'Detail text ' * 20,
+            'photo_captions': ['Load test photo'],
+        }
+        if photo:
+            from io import BytesIO
+            data['photos'] = [(BytesIO(photo), 'photo.jpg')]
+
+        started = time.perf_counter()
+        try:
+            response = client.post('/crew/submit', data=data, content_type='multipart/form-data')
+            ok = response.status_code == 302 and '/crew/success' in response.headers.get('Location', '')
+        except Exception:
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        if not ok:
+            errors.append(member)
+
+
+def run_profile(name, threads, requests, photo, **config):
+    app = make_app(fresh_database=True, **config)
+    waits, latencies, errors = [], [], []
+    with app.app_context():
+        from app import db
+        instrument_pool(db.engine, waits)
+
+    barrier = threading.Barrier(threads + 1)
+    workers = [
+        threading.Thread(target=crew_member, args=(app, member, requests, photo, latencies, errors, barrier))
+        for member in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    print(f'{name:>9} {len(latencies) / elapsed:>7.1f} {percentile(latencies, 0.5) * 1000:>8.1f} '
+          f'{percentile(latencies, 0.95) * 1000:>8.1f} {max(latencies) * 1000:>8.1f} '
+          f'{sum(waits) / len(waits) * 1000:>9.2f} {percentile(waits, 0.95) * 1000:>9.2f} {len(errors):>6}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--threads', type=int, default=8, help='concurrent crew members')
+    parser.add_argument('--requests', type=int, default=20, help='submissions per crew member')
+    parser.add_argument('--no-photo', action='store_true', help='submit without photos')
+    args = parser.parse_args()
+
+    photo = None if args.no_photo else make_jpeg(1024, 768)
+
+    print(f"{'profile':>9} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+          f"{'wait ms':>9} {'p95 wait':>9} {'errors':>6}")
+    run_profile('baseline', args.threads, args.requests, photo,
+                SQLALCHEMY_ENGINE_OPTIONS=BASELINE_ENGINE_OPTIONS, SQLITE_JOURNAL_MODE='')
+    run_profile('tuned', args.threads, args.requests, photo)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: near-duplicate photo lookups with the multi-index hash versus
+a linear scan, and the admin Duplicates page.
+
+Seeds photo rows with perceptual hashes: mostly unrelated photos (random
+64-bit hashes) plus a share of near-copies (an earlier hash with a few
+bits flipped, as re-encoded or re-taken shots give). Reports the time to
+build the per-worker index, the time per upload check (index search
+through ``find_similar`` versus comparing against every hash), and the
+time to group every photo for the Duplicates page.
+
+Usage:
+    python benchmarks/photo_duplicates.py
+    python benchmarks/photo_duplicates.py --photos 10000 50000 --copies 0.1
+"""
+import argparse
+import random
+import time
+
+from common import make_app
+from load_submissions import percentile
+
+
+def seed(count, copies, rng):
+    from app import db
+    from app.models import Photo, WorkItem
+
+    hashes = []
+    for n in range(count):
+        if hashes and rng.random() < copies:
+            value = rng.choice(hashes)
+            for bit in rng.sample(range(64), rng.randint(0, 4)):
+                value ^= 1 << bit
+        else:
+            value = rng.getrandbits(64)
+        hashes.append(value)
+
+    db.session.execute(WorkItem.__table__.insert(), [
+        {'item_number': f'DUP_{n:06d}', 'location': 'Frame 1', 'ns_equipment': 'N/A', 'description': 'Item',
+         'detail': 'Detail', 'status': 'Submitted', 'needs_revision': False, 'submitter_name': 'DP',
+         'original_submitter': 'DP', 'version': 1}
+        for n in range(count)
+    ])
+    db.session.execute(Photo.__table__.insert(), [
+        {'filename': 'bench.jpg', 'caption': 'Photo', 'work_item_id': n + 1, 'perceptual_hash': f'{value:016x}'}
+        for n, value in enumerate(hashes)
+    ])
+    db.session.commit()
+    return hashes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--photos', type=int, nargs='+', default=[10000, 50000], help='photos to index')
+    parser.add_argument('--copies', type=float, default=0.05, help='share of photos that are near-copies')
+    parser.add_argument('--queries', type=int, default=200, help='upload checks per size')
+    args = parser.parse_args()
+
+    print(f"{'photos':>7} {'build ms':>9} {'index p50':>9} {'index p95':>9} {'scan p50':>9} "
+          f"{'matches':>8} {'groups':>7} {'page ms':>8}")
+    for count in args.photos:
+        rng = random.Random(count)
+        app = make_app(fresh_database=True)
+        with app.app_context():
+            from app.photo_index import find_duplicate_groups, find_similar, hamming_distance, reset_index
+
+            hashes = seed(count, args.copies, rng)
+            distance = app.config['PHOTO_DUPLICATE_DISTANCE']
+            reset_index()
+
+            started = time.perf_counter()
+            find_similar(f'{hashes[0]:016x}')  # Builds the index
+            build = time.perf_counter() - started
+
+            queries = [rng.choice(hashes) ^ (1 << rng.randrange(64)) for _ in range(args.queries)]
+            index_times, scan_times, matches = [], [], 0
+            for value in queries:
+                started = time.perf_counter()
+                matches += len(find_similar(f'{value:016x}'))
+                index_times.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                [h for h in hashes if hamming_distance(h, value) <= distance]
+                scan_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            groups = find_duplicate_groups()
+            page = time.perf_counter() - started
+
+        print(f"{count:>7} {build * 1000:>9.0f} {percentile(index_times, 0.5) * 1000:>9.2f} "
+              f"{percentile(index_times, 0.95) * 1000:>9.2f} {percentile(scan_times, 0.5) * 1000:>9.2f} "
+              f"{matches / args.queries:>8.1f} {len(groups):>7} {page * 1000:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: crew submissions with original phone photos vs photos downscaled
+in the browser.
+
+``original`` posts full-size camera JPEGs, which the server decodes,
+resizes to PHOTO_MAX_WIDTH and re-encodes. ``downscaled`` posts what the
+crew photo manager uploads now: JPEGs already at PHOTO_MAX_WIDTH, which
+the server only verifies and stores as-is.
+
+Reports upload bytes and server time per submission.
+
+Usage:
+    python benchmarks/photo_upload.py
+    python benchmarks/photo_upload.py --photos 5 --requests 10 --width 4032
+"""
+import argparse
+import time
+from io import BytesIO
+
+from common import make_app
+
+
+def make_camera_jpeg(width, height, seed):
+    """A textured JPEG about the size of a phone photo (~2.5MB at 4032px)."""
+    from PIL import Image, ImageFilter
+
+    noise = Image.effect_noise((width, height), 60 + seed).filter(ImageFilter.GaussianBlur(1.5))
+    img = Image.merge('RGB', (noise, noise.transpose(Image.Transpose.FLIP_TOP_BOTTOM),
+                              noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def downscale(data, max_width):
+    """What the browser uploads: the photo at max_width, JPEG quality 0.85."""
+    from PIL import Image
+
+    with Image.open(BytesIO(data)) as img:
+        height = round(img.height * max_width / img.width)
+        img = img.resize((max_width, height), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        img.save(buffer, 'JPEG', quality=85)
+        return buffer.getvalue()
+
+
+def run_profile(app, name, photos, requests):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['crew_authenticated'] = True
+        session['crew_name'] = 'Bench'
+
+    request_times = []
+    for n in range(requests):
+        data = {
+            'item_number': f'UPLOAD_{name}_{n:04d}',
+            'location': 'Frame 12',
+            'description': 'Photo upload benchmark',
+            'detail': 'Detail text',
+            # Vary the bytes per request so the blob store cannot deduplicate
+            'photos': [(BytesIO(photo + n.to_bytes(4, 'big')), f'photo{i}.jpg') for i, photo in enumerate(photos)],
+            'photo_captions': ['Photo'] * len(photos),
+        }
+        started = time.perf_counter()
+        response = client.post('/crew/submit', data=data, content_type='multipart/form-data')
+        request_times.append(time.perf_counter() - started)
+        assert response.status_code == 302, response.status_code
+
+    upload_kb = sum(len(photo) for photo in photos) / 1024
+    print(f'{name:>10} {upload_kb:>10.0f} {sum(request_times) / requests * 1000:>10.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--photos', type=int, default=4, help='photos per submission (16MB request limit)')
+    parser.add_argument('--requests', type=int, default=5, help='submissions per profile')
+    parser.add_argument('--width', type=int, default=4032, help='original photo width')
+    args = parser.parse_args()
+
+    app = make_app(fresh_database=True)
+    max_width = app.config['PHOTO_MAX_WIDTH']
+    height = args.width * 3 // 4
+    originals = [make_camera_jpeg(args.width, height, seed) for seed in range(args.photos)]
+    downscaled = [downscale(photo, max_width) for photo in originals]
+
+    print(f"{'profile':>10} {'upload KB':>10} {'ms/submit':>10}")
+    run_profile(app, 'original', originals, args.requests)
+    run_profile(app, 'downscaled', downscaled, args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark the status-history reports.
+
+Seeds work items with several years of status history (a few transitions
+per item), then times the window-function path and the Python fallback and
+checks that both produce the same numbers.
+
+Usage:
+    python benchmarks/reports.py
+    python benchmarks/reports.py --items 50000
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+
+from common import make_app, seed_items
+
+
+REVIEW_PATHS = [
+    ['In Review by DP', 'Completed Review'],
+    ['In Review by AL', 'Needs Revision', 'Submitted', 'In Review by AL', 'Completed Review'],
+    ['In Review by DP', 'Awaiting Photos', 'Submitted', 'In Review by DP'],
+    ['In Review by AL'],
+]
+
+
+def seed_history(ids):
+    from app import db
+    from app.models import StatusHistory, WorkItem
+
+    rng = random.Random(0)
+    rows = []
+    for item_id, submitted_at in db.session.query(WorkItem.id, WorkItem.submitted_at).filter(WorkItem.id.in_(ids)):
+        old_status, changed_at = 'Submitted', submitted_at
+        for new_status in rng.choice(REVIEW_PATHS):
+            changed_at += timedelta(hours=rng.randint(1, 240))
+            rows.append({'work_item_id': item_id, 'old_status': old_status, 'new_status': new_status,
+                         'changed_by': rng.choice(['DP', 'AL', 'Mark']), 'changed_at': changed_at})
+            old_status = new_status
+    for start in range(0, len(rows), 5000):
+        db.session.execute(db.insert(StatusHistory), rows[start:start + 5000])
+    db.session.commit()
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--items', type=int, default=5000)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        from app import db, reports
+
+        ids = []
+        for start in range(0, args.items, 5000):
+            ids.extend(seed_items(min(5000, args.items - start), photos_per_item=0))
+        transitions = seed_history(ids)
+        print(f'{len(ids)} items, {transitions} status changes')
+
+        results = {}
+        for name, supported in (('window', reports._uses_window_functions), ('python', lambda _: False)):
+            reports._uses_window_functions = supported
+            started = time.perf_counter()
+            results[name] = reports.compute_reports(weeks=52)
+            print(f'{name:>7}: {(time.perf_counter() - started) * 1000:8.1f} ms')
+            db.session.rollback()
+
+        for section in ('time_in_status', 'cycle_time', 'throughput'):
+            same = results['window'][section] == results['python'][section]
+            print(f'{section:>15}: {"match" if same else "MISMATCH"}')
+        same = (sorted(results['window']['reviewer_turnaround'], key=lambda r: r['reviewer'])
+                == sorted(results['python']['reviewer_turnaround'], key=lambda r: r['reviewer']))
+        print(f'{"turnaround":>15}: {"match" if same else "MISMATCH"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Slow-client benchmark: threaded vs gevent serving modes.
+
+Starts gunicorn with gunicorn.conf.py in each SERVER_MODE, opens a number of
+slow clients that trickle a form body to the server (a photo upload over a
+ship's satellite link), and meanwhile times ordinary page requests from
+fast clients. In threaded mode every slow client holds one of the
+WEB_CONCURRENCY x GUNICORN_THREADS request threads for the whole transfer;
+in gevent mode it only holds a greenlet.
+
+Reports completed slow uploads, fast-request throughput and latency
+(p50/p95/max), and fast requests that failed or timed out.
+
+Requires gevent (pip install gevent psycogreen) for the gevent profile.
+
+Usage:
+    python benchmarks/slow_clients.py
+    python benchmarks/slow_clients.py --slow 64 --upload-seconds 8
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from load_submissions import percentile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(mode, port, workers, threads):
+    data_dir = tempfile.mkdtemp(prefix='mta-bench-')
+    env = dict(
+        os.environ,
+        SERVER_MODE=mode,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_THREADS=str(threads),
+        DATABASE_URL='sqlite:///' + os.path.join(data_dir, 'bench.db'),
+        UPLOAD_FOLDER=os.path.join(data_dir, 'uploads'),
+        GENERATED_DOCS_FOLDER=os.path.join(data_dir, 'generated_docs'),
+        SECRET_KEY='bench',
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'run:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/crew-login', timeout=1).read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f'gunicorn ({mode}) did not start on port {port}')
+
+
+def slow_upload(port, body_bytes, seconds, completed):
+    """POST a form body in small pieces spread over ``seconds``."""
+    body = b'crew_name=Slow&password=wrong&notes=' + b'x' * body_bytes
+    chunks = 20
+    step = -(-len(body) // chunks)
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=seconds + 30) as sock:
+            sock.sendall(
+                f'POST /crew-login HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                f'Content-Type: application/x-www-form-urlencoded\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode()
+            )
+            for offset in range(0, len(body), step):
+                sock.sendall(body[offset:offset + step])
+                time.sleep(seconds / chunks)
+            if sock.recv(64).startswith(b'HTTP/1.1 200'):
+                completed.append(1)
+    except OSError:
+        pass
+
+
+def fast_client(port, stop, latencies, errors):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/crew-login', timeout=10).read()
+            latencies.append(time.perf_counter() - started)
+        except OSError:
+            errors.append(1)
+
+
+def run_profile(mode, port, args):
+    server = start_server(mode, port, args.workers, args.threads)
+    try:
+        completed, latencies, errors = [], [], []
+        stop = threading.Event()
+
+        slow = [
+            threading.Thread(target=slow_upload, args=(port, args.body_kb * 1024, args.upload_seconds, completed))
+            for _ in range(args.slow)
+        ]
+        fast = [threading.Thread(target=fast_client, args=(port, stop, latencies, errors)) for _ in range(args.fast)]
+
+        for thread in slow:
+            thread.start()
+        time.sleep(0.5)  # Let the slow clients occupy the server first
+        started = time.perf_counter()
+        for thread in fast:
+            thread.start()
+        time.sleep(args.upload_seconds)
+        stop.set()
+        for thread in fast:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        for thread in slow:
+            thread.join()
+
+        print(f'{mode:>9} {len(completed):>5}/{args.slow:<4} {len(latencies) / elapsed:>7.1f} '
+              f'{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.95) * 1000:>8.1f} '
+              f'{max(latencies, default=0) * 1000:>8.1f} {len(errors):>6}')
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=2, help='WEB_CONCURRENCY')
+    parser.add_argument('--threads', type=int, default=4, help='GUNICORN_THREADS (threaded mode)')
+    parser.add_argument('--slow', type=int, default=32, help='concurrent slow uploads')
+    parser.add_argument('--fast', type=int, default=4, help='concurrent fast clients')
+    parser.add_argument('--upload-seconds', type=float, default=5, help='duration of each slow upload')
+    parser.add_argument('--body-kb', type=int, default=256, help='size of each slow upload')
+    parser.add_argument('--port', type=int, default=5101)
+    args = parser.parse_args()
+
+    print(f"{'mode':>9} {'slow ok':>10} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'errors':>6}")
+    run_profile('threaded', args.port, args)
+    run_profile('gevent', args.port + 1, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark: rejecting oversized and disguised uploads from their headers,
+and decoding large JPEGs with Image.draft.
+
+Posts crafted files to /crew/submit: a real 8000x8000 PNG "bomb" (64 MP of
+zeros, ~60KB compressed), a JPEG whose header claims 10000x10000 (100 MP)
+but carries a tiny image, a text file named .jpg (bad magic number), and
+four headers claiming 7000x6000 each (under PHOTO_MAX_PIXELS, but together
+past PHOTO_REQUEST_MAX_PIXELS). Each must be rejected for its own reason
+with nothing stored, which is asserted; the time to reject is compared
+with decoding and resizing the PNG bomb, which is what the server did
+with it before the header check.
+
+Then posts a /crew/sync batch whose submissions each stay under
+PHOTO_REQUEST_MAX_PIXELS but together exceed it, and asserts every one is
+created (the total applies per submission), while a submission over it
+on its own is rejected.
+
+Then resizes a phone-size JPEG with the decoder's DCT scaling
+(``Image.draft``, as resize_image does now) and with a full decode.
+
+Usage:
+    python benchmarks/upload_guard.py
+    python benchmarks/upload_guard.py --width 6000 --repeat 10
+"""
+import argparse
+import os
+import shutil
+import struct
+import tempfile
+import time
+from io import BytesIO
+
+from common import make_app, make_jpeg
+from photo_upload import make_camera_jpeg
+
+
+def png_bomb(size):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('L', (size, size)).save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def jpeg_with_claimed_size(width, height):
+    """A small JPEG whose SOF header is rewritten to claim ``width``x``height``."""
+    data = bytearray(make_jpeg())
+    sof = data.index(b'\xff\xc0')
+    struct.pack_into('>HH', data, sof + 5, height, width)
+    return bytes(data)
+
+
+def post_sync(client, submissions):
+    """POST a /crew/sync batch; ``submissions`` is a list of photo byte lists."""
+    import json
+
+    manifest, data = {'submissions': []}, {}
+    for n, photos in enumerate(submissions):
+        refs = []
+        for i, body in enumerate(photos):
+            field = f'photo-{n}-{i}'
+            data[field] = (BytesIO(body), f'{field}.jpg')
+            refs.append({'field': field, 'caption': 'Photo'})
+        manifest['submissions'].append({'client_id': f'guard-sync-{n}', 'location': 'Frame 12',
+                                        'description': 'Upload guard sync', 'detail': 'Detail text',
+                                        'photos': refs})
+    data['manifest'] = json.dumps(manifest)
+    response = client.post('/crew/sync', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200, response.status_code
+    return [result['status'] for result in response.get_json()['results']]
+
+
+def post(client, name, files):
+    data = {
+        'item_number': f'GUARD_{name}',
+        'location': 'Frame 12',
+        'description': 'Upload guard benchmark',
+        'detail': 'Detail text',
+        'photos': [(BytesIO(body), filename) for filename, body in files],
+        'photo_captions': ['Photo'] * len(files),
+    }
+    started = time.perf_counter()
+    response = client.post('/crew/submit', data=data, content_type='multipart/form-data')
+    elapsed = time.perf_counter() - started
+    with client.session_transaction() as session:
+        flashes = session.pop('_flashes', [])
+    return response.status_code, flashes, elapsed
+
+
+def resize_seconds(data, name, max_width, draft):
+    from PIL import Image, ImageOps
+    from app.utils import resize_image
+
+    directory = tempfile.mkdtemp(prefix='mta-bench-')
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    started = time.perf_counter()
+    try:
+        if draft:
+            resize_image(path, max_width)
+        else:
+            # resize_image before Image.draft: decode every pixel, then resize
+            with Image.open(path) as img:
+                img = ImageOps.exif_transpose(img).convert('RGB')
+                img = img.resize((max_width, int(img.height * max_width / img.width)), Image.Resampling.LANCZOS)
+                img.save(path, 'JPEG', quality=85, optimize=True)
+    finally:
+        shutil.rmtree(directory)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--width', type=int, default=4032, help='phone photo width for the draft comparison')
+    parser.add_argument('--repeat', type=int, default=5, help='resizes per draft profile')
+    args = parser.parse_args()
+
+    app = make_app(fresh_database=True)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['crew_authenticated'] = True
+        session['crew_name'] = 'Bench'
+
+    max_width = app.config['PHOTO_MAX_WIDTH']
+    bomb = png_bomb(8000)
+    phone = make_camera_jpeg(args.width, args.width * 3 // 4, 0)
+    # (name, files, text the rejection message must contain)
+    cases = [
+        ('png bomb', [('bomb.png', bomb)], '8000x8000 pixels'),
+        ('100 MP header', [('fake.jpg', jpeg_with_claimed_size(10000, 10000))], '10000x10000 pixels'),
+        ('bad magic', [('notes.jpg', b'Just some text, not a photo\n' * 100)], 'not a JPEG, PNG or HEIC image'),
+        ('4 x 42 MP', [(f'p{i}.jpg', jpeg_with_claimed_size(7000, 6000)) for i in range(4)],
+         'photos in this upload total more than'),
+    ]
+
+    print(f"{'upload':>13} {'KB':>8} {'status':>7} {'ms':>8}  message")
+    for name, files, expected in cases:
+        status, flashes, elapsed = post(client, name.replace(' ', '_'), files)
+        message = flashes[0][1] if flashes else ''
+        print(f"{name:>13} {sum(len(body) for _, body in files) / 1024:>8.0f} {status:>7} "
+              f"{elapsed * 1000:>8.1f}  {message[:90]}")
+        assert status == 302 and flashes and flashes[0][0] == 'danger', f'{name}: not rejected ({status}, {flashes})'
+        assert expected in message, f'{name}: rejected for the wrong reason: {message}'
+
+    with app.app_context():
+        from app.models import Photo, WorkItem
+        assert Photo.query.count() == 0 and WorkItem.query.count() == 0, 'a rejected upload was stored'
+        unguarded = resize_seconds(bomb, 'bomb.png', max_width, draft=False)
+    print(f"\ndecoding and resizing the PNG bomb instead: {unguarded * 1000:.0f} ms")
+
+    # Budget of two small photos per submission; four submissions of two fit, one of three does not
+    photo = make_jpeg()
+    app.config['PHOTO_REQUEST_MAX_PIXELS'] = 2 * 576 * 432
+    statuses = post_sync(client, [[photo, photo]] * 4 + [[photo] * 3])
+    print(f"sync batch under a {app.config['PHOTO_REQUEST_MAX_PIXELS'] / 1e6:g} MP budget: {', '.join(statuses)}")
+    assert statuses == ['created'] * 4 + ['rejected'], statuses
+
+    print(f"\n{'decode':>12} {'photo':>11} {'ms/resize':>10}")
+    with app.app_context():
+        for name, draft in (('full', False), ('draft', True)):
+            seconds = sum(resize_seconds(phone, 'phone.jpg', max_width, draft) for _ in range(args.repeat))
+            print(f"{name:>12} {args.width:>5}x{args.width * 3 // 4:<5} {seconds / args.repeat * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Build the fingerprinted, minified and precompressed static bundles.
+
+Writes app/static/dist/ and its manifest.json (see app/assets.py). The app
+also rebuilds on startup when the sources changed, so running this is only
+needed to build ahead of time (e.g. in the deploy build step).
+
+Usage:
+    python build_assets.py             # build app/static/dist
+    python build_assets.py --vendor    # re-download the pinned Bootstrap files first
+"""
+
+import argparse
+import os
+from app.assets import DIST_DIR, VENDOR_SOURCES, build_assets, vendor_assets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build fingerprinted static asset bundles.')
+    parser.add_argument('--vendor', action='store_true',
+                        help='download the pinned upstream files into app/static/vendor first')
+    args = parser.parse_args()
+
+    if args.vendor:
+        vendor_assets()
+        for name, url in VENDOR_SOURCES.items():
+            print(f"✓ Vendored {name} from {url}")
+
+    manifest = build_assets()
+    for name, hashed_name in manifest['assets'].items():
+        path = os.path.join(DIST_DIR, hashed_name)
+        sizes = [f"{os.path.getsize(path) / 1024:.1f} KB"]
+        for suffix in ('.gz', '.br'):
+            if os.path.exists(path + suffix):
+                sizes.append(f"{suffix[1:]} {os.path.getsize(path + suffix) / 1024:.1f} KB")
+        print(f"✓ {name} -> {hashed_name} ({', '.join(sizes)})")
+
+
+if __name__ == '__main__':
+    main()
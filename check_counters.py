@@ -0,0 +1,40 @@
+"""
+Verify the maintained work item counters against a fresh count.
+
+Usage:
+    python check_counters.py             # report mismatches
+    python check_counters.py --rebuild   # recount everything and replace the counters
+    railway run python check_counters.py
+"""
+
+import argparse
+import sys
+from app import create_app
+from app.counters import check_counters, rebuild_counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check or rebuild the work item counters.')
+    parser.add_argument('--rebuild', action='store_true', help='replace the counters with a fresh count')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.rebuild:
+            counts = rebuild_counters()
+            print(f"✓ Rebuilt {len(counts)} counters")
+            return
+
+        mismatches = check_counters()
+        if not mismatches:
+            print("✓ Counters are consistent")
+            return
+
+        for (dimension, key), (stored, expected) in sorted(mismatches.items()):
+            print(f"  ! {dimension}:{key or '-'} stored {stored}, expected {expected}")
+        print(f"{len(mismatches)} mismatched counters; run with --rebuild to fix")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
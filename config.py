@@ -2,6 +2,52 @@ import os
 from datetime import timedelta
 
 
+def _engine_options(database_url, threads):
+    """SQLAlchemy engine options for the configured database and process layout.
+
+    Each gunicorn worker process has its own pool, so the pool is sized for
+    one process: a connection per request thread (or a fixed budget shared
+    by a gevent worker's greenlets), plus overflow for the export worker
+    thread and its progress connection. The database must allow
+    WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+    """
+    pre_ping = os.environ.get('DB_POOL_PRE_PING', 'false').lower() == 'true'
+
+    if database_url.startswith('sqlite'):
+        # WAL and synchronous=NORMAL are set per connection in app/database.py
+        return {
+            'pool_pre_ping': pre_ping,
+            'connect_args': {'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000},
+        }
+
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', threads)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 2)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 300)),
+        # Without pre-ping a connection dropped by the server fails one
+        # request and the pool is refreshed; LIFO lets surplus connections
+        # sit idle until pool_recycle retires them
+        'pool_pre_ping': pre_ping,
+        'pool_use_lifo': True,
+    }
+
+    if database_url.startswith('postgresql'):
+        statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+        connect_args = {
+            'application_name': os.environ.get('DB_APPLICATION_NAME', 'ship-mta'),
+            'options': f'-c statement_timeout={statement_timeout} '
+                       f'-c idle_in_transaction_session_timeout={statement_timeout * 2}',
+        }
+        if database_url.startswith('postgresql+psycopg:'):
+            # psycopg 3 prepares statements server-side after this many executions;
+            # psycopg2 has no server-side prepared statements
+            connect_args['prepare_threshold'] = int(os.environ.get('DB_PREPARE_THRESHOLD', 5))
+        options['connect_args'] = connect_args
+
+    return options
+
+
 class Config:
     # Flask Environment
     FLASK_ENV = os.environ.get('FLASK_ENV', 'development')
@@ -21,12 +67,43 @@ class Config:
     if database_url.startswith('postgres://'):
         database_url = database_url.replace('postgres://', 'postgresql://', 1)
 
+    # DB_DRIVER=psycopg switches Postgres to psycopg 3 (pip install "psycopg[binary]")
+    # for server-side prepared statements
+    if os.environ.get('DB_DRIVER') == 'psycopg' and database_url.startswith('postgresql://'):
+        database_url = database_url.replace('postgresql://', 'postgresql+psycopg://', 1)
+
+    # Process layout, shared with gunicorn.conf.py: 'threaded' (gthread) or 'gevent'
+    SERVER_MODE = os.environ.get('SERVER_MODE', 'threaded').lower()
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 2))
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+    # Greenlets beyond this many wait for a connection (DB_POOL_TIMEOUT)
+    GEVENT_DB_POOL_SIZE = int(os.environ.get('GEVENT_DB_POOL_SIZE', 10))
+
     SQLALCHEMY_DATABASE_URI = database_url
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-    }
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(
+        database_url, GEVENT_DB_POOL_SIZE if SERVER_MODE == 'gevent' else GUNICORN_THREADS
+    )
+
+    # Optional read replica for read-only views (see app/database.py); it gets
+    # its own pool of the same size in each worker process
+    replica_url = os.environ.get('READ_REPLICA_URL')
+    if replica_url and replica_url.startswith('postgres://'):
+        replica_url = replica_url.replace('postgres://', 'postgresql://', 1)
+    if replica_url and os.environ.get('DB_DRIVER') == 'psycopg' and replica_url.startswith('postgresql://'):
+        replica_url = replica_url.replace('postgresql://', 'postgresql+psycopg://', 1)
+    SQLALCHEMY_BINDS = {
+        'replica': {
+            'url': replica_url,
+            **_engine_options(replica_url, GEVENT_DB_POOL_SIZE if SERVER_MODE == 'gevent' else GUNICORN_THREADS),
+        }
+    } if replica_url else {}
+    # After a user's own commit their reads stay on the primary this long,
+    # so they see their change even while the replica lags
+    READ_REPLICA_STICKY_SECONDS = float(os.environ.get('READ_REPLICA_STICKY_SECONDS', 5))
+
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
 
     # File Upload Configuration
     # Railway allows only ONE volume per service
@@ -36,11 +113,65 @@ class Config:
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(DATA_DIR, 'uploads')
     GENERATED_DOCS_FOLDER = os.environ.get('GENERATED_DOCS_FOLDER') or os.path.join(DATA_DIR, 'generated_docs')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+
+    # Rebuild app/static/dist on startup when the asset sources changed
+    # (python build_assets.py builds ahead of time)
+    ASSET_BUILD_ON_START = os.environ.get('ASSET_BUILD_ON_START', 'true').lower() == 'true'
+
+    # Stream the long list pages (admin dashboard, crew form) as they render
+    STREAM_PAGES = os.environ.get('STREAM_PAGES', 'true').lower() == 'true'
+    STREAM_CHUNK_CHARS = int(os.environ.get('STREAM_CHUNK_CHARS', 16384))
+
+    # Compress HTML/JSON/CSV responses with brotli (if installed) or gzip;
+    # bodies smaller than COMPRESS_MIN_BYTES are sent as they are
+    COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'true').lower() == 'true'
+    COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+
+    # Storage backend for photos and generated docs: 'local' or 's3'
+    # With 's3', S3_ENDPOINT_URL may point at MinIO or another S3-compatible service
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local').lower()
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY')
+    S3_UPLOAD_PREFIX = os.environ.get('S3_UPLOAD_PREFIX', 'uploads/')
+    S3_DOCS_PREFIX = os.environ.get('S3_DOCS_PREFIX', 'generated_docs/')
+    S3_PRESIGN_SECONDS = int(os.environ.get('S3_PRESIGN_SECONDS', 900))
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'heic', 'heif'}
 
     PHOTO_MAX_WIDTH = 576
+    # JPEGs the browser already downscaled to PHOTO_MAX_WIDTH are stored
+    # without re-encoding if they are at most this large
+    PHOTO_PASSTHROUGH_MAX_BYTES = int(os.environ.get('PHOTO_PASSTHROUGH_MAX_BYTES', 300 * 1024))
+    # Uploads are checked from their headers before decoding: photos over
+    # PHOTO_MAX_PIXELS, or submissions whose photos together exceed
+    # PHOTO_REQUEST_MAX_PIXELS, are rejected
+    PHOTO_MAX_PIXELS = int(os.environ.get('PHOTO_MAX_PIXELS', 50 * 1000 * 1000))
+    PHOTO_REQUEST_MAX_PIXELS = int(os.environ.get('PHOTO_REQUEST_MAX_PIXELS', 150 * 1000 * 1000))
+    # Largest perceptual hash distance (bits of 64) at which two photos are
+    # reported as likely duplicates (upload warnings, admin Duplicates page)
+    PHOTO_DUPLICATE_DISTANCE = int(os.environ.get('PHOTO_DUPLICATE_DISTANCE', 6))
     PHOTO_MIN_COUNT = 0
     PHOTO_MAX_COUNT = 6
+    # Threads per process used to resize a request's photos concurrently
+    PHOTO_INGEST_WORKERS = int(os.environ.get('PHOTO_INGEST_WORKERS', 4))
+
+    # Comments / status history entries per page on the item views
+    ITEM_ACTIVITY_PAGE_SIZE = int(os.environ.get('ITEM_ACTIVITY_PAGE_SIZE', 20))
+
+    # Bulk import (python import_items.py, admin Import page): rows per
+    # INSERT ... ON CONFLICT statement and commit
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+
+    # Data export (python export_items.py, admin Export Jobs page): rows
+    # fetched from the cursor and written per batch
+    EXPORT_BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', 1000))
+
+    # Offline sync: maximum queued submissions accepted in one /crew/sync batch
+    SYNC_MAX_BATCH = int(os.environ.get('SYNC_MAX_BATCH', 50))
 
     CREW_PASSWORD = os.environ.get('CREW_PASSWORD') or 'crew350'
 
@@ -104,6 +235,32 @@ class Config:
         'DRAFT_0019 - Add Smoke Detector/Phone to Conference',
     ]
 
+    # .docx generation: 'template' clones a skeleton built once per process,
+    # 'builder' constructs every document from an empty Document()
+    DOCX_RENDERER = os.environ.get('DOCX_RENDERER', 'template')
+    # Optional .docx with the same {placeholders} to use instead of the built-in skeleton
+    DOCX_TEMPLATE_PATH = os.environ.get('DOCX_TEMPLATE_PATH')
+    # Photos are embedded as print renditions sized for 4 inches at this DPI.
+    # Renditions are cached per DPI, so changing the quality only affects new ones.
+    DOCX_PHOTO_DPI = int(os.environ.get('DOCX_PHOTO_DPI', 150))
+    DOCX_PHOTO_QUALITY = int(os.environ.get('DOCX_PHOTO_QUALITY', 75))
+    # Per-process memory for parsed images reused across documents
+    DOCX_IMAGE_CACHE_MB = int(os.environ.get('DOCX_IMAGE_CACHE_MB', 64))
+
+    # Export jobs: run by a thread in each web process, or, with
+    # EXPORT_WORKER_EMBEDDED=false, by `python worker.py` as its own service
+    # (which must share the database and the generated docs storage).
+    # Off by default under gevent, where document generation competes with
+    # every request in the process; run worker.py alongside instead.
+    EXPORT_WORKER_EMBEDDED = os.environ.get(
+        'EXPORT_WORKER_EMBEDDED', 'false' if SERVER_MODE == 'gevent' else 'true'
+    ).lower() == 'true'
+    EXPORT_WORKER_POLL_SECONDS = float(os.environ.get('EXPORT_WORKER_POLL_SECONDS', 2))
+    EXPORT_JOB_RETENTION_HOURS = int(os.environ.get('EXPORT_JOB_RETENTION_HOURS', 24))
+    # Running jobs without a progress report for this long are re-queued
+    EXPORT_JOB_TIMEOUT_SECONDS = int(os.environ.get('EXPORT_JOB_TIMEOUT_SECONDS', 1800))
+    EXPORT_JOB_MAX_ATTEMPTS = int(os.environ.get('EXPORT_JOB_MAX_ATTEMPTS', 3))
+
     PERMANENT_SESSION_LIFETIME = timedelta(hours=8)
     
     # Status workflow options
@@ -123,6 +280,8 @@ class Config:
     TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
     TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
     TWILIO_FROM_NUMBER = os.environ.get('TWILIO_FROM_NUMBER')
+    # Seconds before an SMS request to Twilio is abandoned
+    TWILIO_TIMEOUT = float(os.environ.get('TWILIO_TIMEOUT', 10))
 
     # Base URL for crew login page (used in SMS messages)
     CREW_LOGIN_URL = os.environ.get('CREW_LOGIN_URL', 'http://localhost:5000/crew/login')
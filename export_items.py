@@ -0,0 +1,62 @@
+"""
+Export every work item (with photo counts and status history timestamps)
+as CSV, JSON Lines or Parquet, without loading the table into memory.
+
+CSV and JSONL go to stdout unless --output is given; Parquet needs
+--output and pyarrow.
+
+Usage:
+    python export_items.py > work_items.csv
+    python export_items.py --format jsonl --status "Completed Review" --output done.jsonl
+    python export_items.py --format parquet --output work_items.parquet
+    railway run python export_items.py --format parquet --output work_items.parquet
+"""
+
+import argparse
+import sys
+import time
+from app import create_app
+from app.data_export import FORMATS, STREAMED_FORMATS, ExportFormatError, iter_batches, stream_export, write_parquet
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export work items as CSV, JSON Lines or Parquet.')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv', help='output format (default csv)')
+    parser.add_argument('--output', help='output file (default stdout; required for parquet)')
+    parser.add_argument('--status', help='only items with this status')
+    parser.add_argument('--batch-size', type=int, help='rows per batch (default EXPORT_BATCH_ROWS)')
+    args = parser.parse_args()
+
+    if args.format not in STREAMED_FORMATS and not args.output:
+        parser.error(f'--output is required for {args.format}')
+
+    # The summary goes to stderr so it never ends up in a redirected export
+    log = sys.stderr if not args.output else sys.stdout
+    started = time.perf_counter()
+
+    app = create_app()
+    with app.app_context():
+        try:
+            if args.format in STREAMED_FORMATS:
+                out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+                try:
+                    for chunk in stream_export(args.format, args.status, args.batch_size):
+                        out.write(chunk)
+                finally:
+                    if args.output:
+                        out.close()
+                rows = None
+            else:
+                with open(args.output, 'wb') as out:
+                    rows = write_parquet(iter_batches(args.status, args.batch_size), out)
+        except ExportFormatError as e:
+            print(f"✗ {e}", file=log)
+            sys.exit(1)
+
+    seconds = time.perf_counter() - started
+    counted = f"{rows} rows " if rows is not None else ''
+    print(f"✓ Exported {counted}as {args.format} to {args.output or 'stdout'} in {seconds:.1f}s", file=log)
+
+
+if __name__ == '__main__':
+    main()
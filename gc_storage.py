@@ -0,0 +1,41 @@
+"""
+Reclaim space on the upload volume by removing orphaned photos and stale
+generated documents.
+
+Usage:
+    python gc_storage.py                 # delete orphans
+    python gc_storage.py --dry-run       # only report what would be freed
+    railway run python gc_storage.py     # run against production
+"""
+
+import argparse
+from app import create_app
+from app.storage_gc import collect_garbage
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Remove orphaned uploads and stale documents.')
+    parser.add_argument('--dry-run', action='store_true', help='report without deleting anything')
+    parser.add_argument('--batch-size', type=int, default=500, help='files checked per database query')
+    parser.add_argument('--min-age-minutes', type=int, default=60,
+                        help='skip files younger than this (may belong to in-flight uploads)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        result = collect_garbage(
+            batch_size=args.batch_size,
+            min_age_seconds=args.min_age_minutes * 60,
+            dry_run=args.dry_run
+        )
+
+    verb = 'Would free' if result['dry_run'] else 'Freed'
+    for report in result['reports']:
+        print(f"{report['store']}")
+        print(f"  scanned: {report['files_scanned']}  removed: {report['files_removed']}  "
+              f"bytes: {report['bytes_freed']}  errors: {report['errors']}")
+    print(f"✓ {verb} {result['bytes_freed'] / (1024 * 1024):.1f} MB in {result['elapsed_seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
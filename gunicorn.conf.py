@@ -0,0 +1,56 @@
+"""
+Gunicorn settings, selected by SERVER_MODE.
+
+* ``threaded`` (default) - sync workers with a thread pool:
+  WEB_CONCURRENCY processes x GUNICORN_THREADS threads. Every slow client
+  (a photo upload over satellite, a large download) holds a thread for the
+  whole transfer.
+* ``gevent`` - cooperative workers: each process serves up to
+  GEVENT_WORKER_CONNECTIONS concurrent requests on greenlets, so slow
+  clients only cost memory while they wait on the network. Requires
+  ``pip install gevent psycogreen``. The standard library is
+  monkey-patched by the worker, psycopg2 is made cooperative with
+  psycogreen, and the Twilio client (requests) becomes cooperative through
+  the patched sockets. CPU-bound photo processing runs on gevent's native
+  thread pool (see app/photo_ingest.py). Document exports are not run
+  in the web process by default in this mode; run ``python worker.py``
+  as a separate service (see DEPLOYMENT.md).
+
+Usage:
+    gunicorn --config gunicorn.conf.py run:app
+    SERVER_MODE=gevent gunicorn --config gunicorn.conf.py run:app
+"""
+import os
+
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'threaded').lower()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+keepalive = 5
+
+if SERVER_MODE == 'gevent':
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        raise RuntimeError('SERVER_MODE=gevent requires gevent: pip install gevent psycogreen')
+
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GEVENT_WORKER_CONNECTIONS', 200))
+elif SERVER_MODE == 'threaded':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+else:
+    raise RuntimeError(f"Unknown SERVER_MODE '{SERVER_MODE}' (expected 'threaded' or 'gevent')")
+
+
+def post_fork(server, worker):
+    if SERVER_MODE != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning('psycogreen not installed; Postgres queries will block the gevent worker')
+        return
+    patch_psycopg()
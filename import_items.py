@@ -0,0 +1,45 @@
+"""
+Bulk import work items from a CSV or XLSX file (upsert on item_number).
+
+The first row names the columns: item_number, location, description and
+detail are required; ns_equipment, references (or OFM), status,
+assigned_to and submitter_name are optional. XLSX needs openpyxl.
+
+Usage:
+    python import_items.py scope.csv
+    python import_items.py scope.xlsx --submitter DP --chunk-size 2000
+    railway run python import_items.py scope.csv
+"""
+
+import argparse
+import sys
+from app import create_app
+from app.importer import ImportFileError, import_items
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import work items from CSV or XLSX.')
+    parser.add_argument('path', help='.csv or .xlsx file')
+    parser.add_argument('--submitter', default='Import', help='submitter for rows without a submitter_name')
+    parser.add_argument('--chunk-size', type=int, help='rows per upsert statement (default IMPORT_CHUNK_SIZE)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        try:
+            with open(args.path, 'rb') as f:
+                result = import_items(f, args.path, args.submitter, chunk_size=args.chunk_size)
+        except ImportFileError as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+
+    for line_number, message in result['errors']:
+        print(f"  ! line {line_number}: {message}")
+    if result['skipped'] > len(result['errors']):
+        print(f"  ! ... {result['skipped'] - len(result['errors'])} more invalid rows")
+    print(f"✓ {result['rows']} rows: {result['created']} created, {result['updated']} updated, "
+          f"{result['skipped']} skipped in {result['seconds']:.1f}s ({result['rows_per_second']:.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
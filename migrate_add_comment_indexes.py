@@ -0,0 +1,35 @@
+"""
+Migration script to add the comments index used by the item view.
+Run this script once to update an existing database.
+"""
+from app import create_app, db
+
+
+INDEXES = {
+    'ix_comments_item_created': 'comments (work_item_id, created_at)',
+}
+
+
+def migrate():
+    app = create_app()
+    with app.app_context():
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+        existing = {index['name'] for index in inspector.get_indexes('comments')}
+
+        missing = [name for name in INDEXES if name not in existing]
+        if not missing:
+            print("Indexes already exist. No migration needed.")
+            return
+
+        with db.engine.connect() as conn:
+            for name in missing:
+                conn.execute(db.text(f'CREATE INDEX {name} ON {INDEXES[name]}'))
+                print(f"✓ Added {name}")
+            conn.commit()
+
+        print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
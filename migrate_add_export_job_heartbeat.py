@@ -0,0 +1,36 @@
+"""
+Migration script to add the heartbeat column to export_jobs.
+
+Workers now stamp export_jobs.heartbeat_at whenever a running job reports
+progress, and stale jobs are re-queued by heartbeat rather than by start
+time. Jobs without a heartbeat fall back to their start time. Safe to
+re-run.
+
+Usage:
+    python migrate_add_export_job_heartbeat.py
+    railway run python migrate_add_export_job_heartbeat.py
+"""
+from app import create_app, db
+
+
+def migrate():
+    app = create_app()
+    with app.app_context():
+        from sqlalchemy import inspect
+
+        inspector = inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('export_jobs')]
+        if 'heartbeat_at' in columns:
+            print("Column already exists. No migration needed.")
+            return
+
+        print("Adding heartbeat_at column to export_jobs table...")
+        with db.engine.connect() as conn:
+            conn.execute(db.text('ALTER TABLE export_jobs ADD COLUMN heartbeat_at TIMESTAMP'))
+            conn.commit()
+        print("✓ Added heartbeat_at column")
+        print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
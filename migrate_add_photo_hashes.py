@@ -0,0 +1,83 @@
+"""
+Migration script to add perceptual hashes to photos and backfill them.
+
+Adds the photos.perceptual_hash column if needed, then reads every stored
+blob that has photos without a hash once (identical photos share a blob)
+and sets the hash on all its photos, so the admin Duplicates page and the
+upload warnings cover photos stored before hashing. Safe to re-run;
+photos that already have a hash are skipped. Running web workers load the
+new hashes when they restart. Works with either STORAGE_BACKEND.
+
+Usage:
+    python migrate_add_photo_hashes.py
+    railway run python migrate_add_photo_hashes.py
+"""
+from io import BytesIO
+from app import create_app, db
+from app.storage import get_upload_storage
+from app.utils import perceptual_hash
+
+BATCH_SIZE = 200
+
+
+def migrate():
+    app = create_app()
+    with app.app_context():
+        from sqlalchemy import inspect
+        from app.models import Photo
+
+        inspector = inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('photos')]
+        if 'perceptual_hash' not in columns:
+            print("Adding perceptual_hash column to photos table...")
+            with db.engine.connect() as conn:
+                conn.execute(db.text('ALTER TABLE photos ADD COLUMN perceptual_hash VARCHAR(16)'))
+                conn.commit()
+            print("✓ Added perceptual_hash column")
+
+        storage = get_upload_storage()
+        updated = missing = failed = 0
+        last_key = ''
+
+        while True:
+            # One row per blob; every photo of a blob gets the same hash
+            keys = db.session.execute(
+                db.select(Photo.filename)
+                .where(Photo.perceptual_hash.is_(None), Photo.filename > last_key)
+                .group_by(Photo.filename)
+                .order_by(Photo.filename)
+                .limit(BATCH_SIZE)
+            ).scalars().all()
+            if not keys:
+                break
+            last_key = keys[-1]
+
+            for key in keys:
+                if not storage.exists(key):
+                    missing += 1
+                    print(f"  ! Missing file: {key}")
+                    continue
+                try:
+                    hash_hex = perceptual_hash(BytesIO(storage.read_bytes(key)))
+                except Exception as e:
+                    failed += 1
+                    print(f"  ! Could not read {key}: {e}")
+                    continue
+
+                result = db.session.execute(
+                    db.update(Photo)
+                    .where(Photo.filename == key, Photo.perceptual_hash.is_(None))
+                    .values(perceptual_hash=hash_hex)
+                    .execution_options(synchronize_session=False)
+                )
+                updated += result.rowcount
+
+            db.session.commit()
+            print(f"✓ Hashed photos up to {last_key}")
+
+        print(f"\nHashed {updated} photos ({missing} files missing, {failed} unreadable)")
+        print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,96 @@
+"""
+Migration script to add image metadata columns to photos and backfill them.
+
+Adds photos.width, height, byte_size and placeholder if needed, then reads
+every stored blob that has photos without metadata once (identical photos
+share a blob) and fills in the columns of all its photos. Safe to re-run;
+photos that already have metadata are skipped, and photos whose file is
+missing are reported and left empty (pages then fall back to sizing the
+image after it loads). Works with either STORAGE_BACKEND.
+
+Usage:
+    python migrate_add_photo_metadata.py
+    railway run python migrate_add_photo_metadata.py
+"""
+from io import BytesIO
+from PIL import Image
+from app import create_app, db
+from app.storage import get_upload_storage
+from app.utils import make_placeholder
+
+BATCH_SIZE = 200
+
+COLUMNS = [
+    ('width', 'INTEGER'),
+    ('height', 'INTEGER'),
+    ('byte_size', 'INTEGER'),
+    ('placeholder', 'TEXT'),
+]
+
+
+def migrate():
+    app = create_app()
+    with app.app_context():
+        from sqlalchemy import inspect
+        from app.models import Photo
+
+        inspector = inspect(db.engine)
+        existing = [col['name'] for col in inspector.get_columns('photos')]
+        missing_columns = [(name, type_) for name, type_ in COLUMNS if name not in existing]
+        if missing_columns:
+            print("Adding image metadata columns to photos table...")
+            with db.engine.connect() as conn:
+                for name, type_ in missing_columns:
+                    conn.execute(db.text(f'ALTER TABLE photos ADD COLUMN {name} {type_}'))
+                    print(f"✓ Added {name} column")
+                conn.commit()
+
+        storage = get_upload_storage()
+        updated = missing = failed = 0
+        last_key = ''
+
+        while True:
+            # One row per blob; every photo of a blob gets the same metadata
+            keys = db.session.execute(
+                db.select(Photo.filename)
+                .where(Photo.width.is_(None), Photo.filename > last_key)
+                .group_by(Photo.filename)
+                .order_by(Photo.filename)
+                .limit(BATCH_SIZE)
+            ).scalars().all()
+            if not keys:
+                break
+            last_key = keys[-1]
+
+            for key in keys:
+                if not storage.exists(key):
+                    missing += 1
+                    print(f"  ! Missing file: {key}")
+                    continue
+                try:
+                    data = storage.read_bytes(key)
+                    with Image.open(BytesIO(data)) as img:
+                        width, height = img.size
+                    placeholder = make_placeholder(BytesIO(data))
+                except Exception as e:
+                    failed += 1
+                    print(f"  ! Could not read {key}: {e}")
+                    continue
+
+                result = db.session.execute(
+                    db.update(Photo)
+                    .where(Photo.filename == key, Photo.width.is_(None))
+                    .values(width=width, height=height, byte_size=len(data), placeholder=placeholder)
+                    .execution_options(synchronize_session=False)
+                )
+                updated += result.rowcount
+
+            db.session.commit()
+            print(f"✓ Backfilled photos up to {last_key}")
+
+        print(f"\nBackfilled {updated} photos ({missing} files missing, {failed} unreadable)")
+        print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,36 @@
+"""
+Migration script to add the status_history indexes used by the reports.
+Run this script once to update an existing database.
+"""
+from app import create_app, db
+
+
+INDEXES = {
+    'ix_status_history_item_changed': 'status_history (work_item_id, changed_at)',
+    'ix_status_history_status_changed': 'status_history (new_status, changed_at)',
+}
+
+
+def migrate():
+    app = create_app()
+    with app.app_context():
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+        existing = {index['name'] for index in inspector.get_indexes('status_history')}
+
+        missing = [name for name in INDEXES if name not in existing]
+        if not missing:
+            print("Indexes already exist. No migration needed.")
+            return
+
+        with db.engine.connect() as conn:
+            for name in missing:
+                conn.execute(db.text(f'CREATE INDEX {name} ON {INDEXES[name]}'))
+                print(f"✓ Added {name}")
+            conn.commit()
+
+        print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
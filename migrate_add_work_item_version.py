@@ -0,0 +1,30 @@
+"""
+Migration script to add the optimistic locking version column to work_items.
+Run this script once to update an existing database.
+"""
+from app import create_app, db
+
+
+def migrate():
+    app = create_app()
+    with app.app_context():
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('work_items')]
+
+        if 'version' in columns:
+            print("Column already exists. No migration needed.")
+            return
+
+        print("Adding version column to work_items table...")
+        with db.engine.connect() as conn:
+            # Existing rows start at version 1, like new ones
+            conn.execute(db.text('ALTER TABLE work_items ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
+            print("✓ Added version column")
+            conn.commit()
+
+        print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
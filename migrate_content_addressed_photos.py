@@ -0,0 +1,116 @@
+"""
+Migration script to move existing photos into the content-addressed blob store.
+
+Adds the photos.content_hash column if needed, then for every photo still
+stored under a flat UUID filename: hashes the file, links it into its
+sharded blob path (identical photos collapse into one blob), rewrites
+Photo.filename and removes the old file once the batch has committed.
+Safe to re-run; already migrated photos are skipped. Operates on the local
+UPLOAD_FOLDER, so run it before switching STORAGE_BACKEND to s3. Reads and
+writes only the columns it needs, so it runs whether or not the photo
+columns added by later migrations exist yet.
+
+Usage:
+    python migrate_content_addressed_photos.py
+    railway run python migrate_content_addressed_photos.py
+"""
+import os
+import shutil
+from app import create_app, db
+from app.blob_store import blob_key, blob_path, hash_file
+
+BATCH_SIZE = 200
+
+
+def _link_or_copy(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def migrate():
+    app = create_app()
+    with app.app_context():
+        from sqlalchemy import inspect
+        from app.models import Photo
+
+        inspector = inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('photos')]
+        if 'content_hash' not in columns:
+            print("Adding content_hash column to photos table...")
+            with db.engine.connect() as conn:
+                conn.execute(db.text('ALTER TABLE photos ADD COLUMN content_hash VARCHAR(64)'))
+                conn.execute(db.text('CREATE INDEX IF NOT EXISTS ix_photos_content_hash ON photos (content_hash)'))
+                conn.execute(db.text('CREATE INDEX IF NOT EXISTS ix_photos_filename ON photos (filename)'))
+                conn.commit()
+            print("✓ Added content_hash column")
+
+        upload_folder = app.config['UPLOAD_FOLDER']
+        migrated = missing = bytes_before = bytes_after = 0
+        last_id = 0
+
+        photos_table = Photo.__table__
+        while True:
+            photos = db.session.execute(
+                db.select(Photo.id, Photo.filename)
+                .where(Photo.id > last_id, ~Photo.filename.contains('/'))
+                .order_by(Photo.id)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not photos:
+                break
+            last_id = photos[-1].id
+
+            replaced = []
+            for photo in photos:
+                old_path = os.path.join(upload_folder, photo.filename)
+                if not os.path.exists(old_path):
+                    missing += 1
+                    print(f"  ! Missing file for photo {photo.id}: {photo.filename}")
+                    continue
+
+                content_hash = hash_file(old_path)
+                key = blob_key(content_hash, photo.filename.rsplit('.', 1)[1].lower())
+                new_path = blob_path(upload_folder, key)
+                bytes_before += os.path.getsize(old_path)
+                if not os.path.exists(new_path):
+                    _link_or_copy(old_path, new_path)
+                    bytes_after += os.path.getsize(new_path)
+
+                db.session.execute(
+                    photos_table.update()
+                    .where(photos_table.c.id == photo.id)
+                    .values(filename=key, content_hash=content_hash)
+                )
+                replaced.append(old_path)
+                migrated += 1
+
+            db.session.commit()
+
+            # Old names were unique per photo, so nothing references them now
+            for old_path in replaced:
+                os.remove(old_path)
+            print(f"✓ Migrated photos up to id {last_id}")
+
+        # Fill in hashes for photos stored by the new ingestion path before this ran
+        unhashed = db.session.execute(
+            db.select(Photo.id, Photo.filename)
+            .where(Photo.content_hash.is_(None), Photo.filename.contains('/'))
+        ).all()
+        for photo in unhashed:
+            db.session.execute(
+                photos_table.update()
+                .where(photos_table.c.id == photo.id)
+                .values(content_hash=os.path.basename(photo.filename).rsplit('.', 1)[0])
+            )
+        db.session.commit()
+
+        print(f"\nMigrated {migrated} photos ({missing} missing on disk)")
+        print(f"Storage: {bytes_before / (1024 * 1024):.1f} MB -> {bytes_after / (1024 * 1024):.1f} MB")
+        print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
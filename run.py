@@ -1,8 +1,10 @@
 from app import create_app
+from app.export_jobs import start_embedded_worker
 import os
 
 
 app = create_app()
+start_embedded_worker(app)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,43 @@
+"""
+Process queued document export jobs (see app/export_jobs.py).
+
+Web processes run an embedded worker by default with SERVER_MODE=threaded;
+with SERVER_MODE=gevent they do not, and this script is required. To
+process exports in a separate service, set EXPORT_WORKER_EMBEDDED=false on
+the web service (the gevent default) and run this script in a service that shares its DATABASE_URL and
+generated docs storage (the same volume, or STORAGE_BACKEND=s3). Any number
+of workers may share the database.
+
+Usage:
+    python worker.py             # poll for jobs until stopped
+    python worker.py --once      # drain the queue, then exit
+    railway run python worker.py
+"""
+
+import argparse
+import logging
+import signal
+import threading
+from app import create_app
+from app.export_jobs import run_worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Process queued document export jobs.')
+    parser.add_argument('--once', action='store_true', help='exit when the queue is empty')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    app = create_app()
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    print("✓ Export worker started")
+    run_worker(app, once=args.once, stop_event=stop_event)
+    print("✓ Export worker stopped")
+
+
+if __name__ == '__main__':
+    main()